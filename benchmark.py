@@ -0,0 +1,253 @@
+"""
+Benchmark các hàm nóng của schedule-v7.py trên dữ liệu sinh bởi generate_instance
+
+Cách dùng:
+    python benchmark.py                               # small, medium, large -> benchmark_results.json
+    python benchmark.py --sizes small --ops fitness,hill_climb
+    python benchmark.py --compare baseline.json       # báo hàm chậm/tốn bộ nhớ hơn ngưỡng, exit 1 nếu có
+
+Mỗi hàm được chạy lặp tới khi đủ --min-time giây (ít nhất 1 lần, nhiều nhất --max-runs lần)
+để đo thời gian, sau đó chạy thêm 1 lần dưới tracemalloc để đo bộ nhớ đỉnh và số block
+còn giữ lại sau khi chạy. Bộ "large" (~10.000 nhân viên) mất vài phút.
+"""
+
+import argparse
+import contextlib
+import copy
+import gc
+import hashlib
+import importlib.util
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+# Import từ file schedule-v7.py
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ENGINE_FILE = os.path.join(BASE_DIR, "schedule-v7.py")
+spec = importlib.util.spec_from_file_location("ga_module", ENGINE_FILE)
+ga_module = importlib.util.module_from_spec(spec)
+sys.modules["ga_module"] = ga_module
+spec.loader.exec_module(ga_module)
+
+
+# =====================================================
+# CẤU HÌNH BENCHMARK
+# =====================================================
+# Tham số generate_instance cho từng cỡ dữ liệu (cố định để kết quả so sánh được giữa các nhánh)
+SIZES = {
+    'small': dict(),
+    'medium': dict(num_departments=20, leave_density=0.05),
+    'large': dict(num_departments=60, doctors_per_department=60, nurses_per_department=100,
+                  leave_density=0.05),
+}
+
+DEFAULT_OUTPUT = "benchmark_results.json"
+DEFAULT_THRESHOLD = 0.10     # Chậm hơn / tốn bộ nhớ hơn 10% so với baseline = hồi quy
+
+
+class BenchContext:
+    """Dữ liệu dùng chung cho các phép đo trên 1 cỡ dữ liệu"""
+    def __init__(self, size, hill_steps):
+        self.size = size
+        self.hill_steps = hill_steps
+        self.employees, self.dept_to_rooms, self.shifts, self.days = \
+            ga_module.generate_instance(**SIZES[size])
+
+        random.seed(0)
+        self.a = ga_module.create_individual(self.employees, self.dept_to_rooms, self.shifts, self.days)
+        self.b = ga_module.create_individual(self.employees, self.dept_to_rooms, self.shifts, self.days)
+        # Các toán tử đột biến sửa tại chỗ nên dùng bản sao riêng
+        self.work = copy.deepcopy(self.a)
+        self.out_dir = tempfile.mkdtemp(prefix=f"bench_{size}_")
+
+    def args(self):
+        return self.employees, self.dept_to_rooms, self.shifts, self.days
+
+
+# Mỗi phép đo: ctx -> hàm không tham số được gọi lặp lại
+OPS = {
+    'create_individual': lambda c: lambda: ga_module.create_individual(*c.args()),
+    'fitness': lambda c: lambda: ga_module.fitness(c.a, *c.args()),
+    'check_constraints_detailed': lambda c: lambda: ga_module.check_constraints_detailed(c.a, *c.args()),
+    'crossover_uniform': lambda c: lambda: ga_module.crossover_uniform(c.a, c.b, c.employees,
+                                                                       c.dept_to_rooms),
+    'mutate_scramble': lambda c: lambda: ga_module.mutate_scramble(c.work, *c.args(), rate=1.0),
+    'mutate_balance_hours': lambda c: lambda: ga_module.mutate_balance_hours(c.work, *c.args(), rate=1.0),
+    'hill_climb': lambda c: lambda: ga_module.hill_climb(c.a, *c.args(), steps=c.hill_steps),
+    'export_calendar': lambda c: lambda: ga_module.export_calendar_to_excel_fast(
+        c.a, *c.args(), filename=os.path.join(c.out_dir, "calendar.xlsx")),
+    'export_hours': lambda c: lambda: ga_module.export_employee_hours_to_excel_fast(
+        c.a, *c.args(), filename=os.path.join(c.out_dir, "hours.xlsx"), details="long"),
+    'export_columnar': lambda c: lambda: ga_module.export_columnar(
+        c.a, *c.args(), out_dir=os.path.join(c.out_dir, "columnar")),
+}
+
+
+# =====================================================
+# ĐO
+# =====================================================
+def measure(fn, min_time, max_runs):
+    """Đo thời gian (nhiều lần) rồi bộ nhớ (1 lần dưới tracemalloc)"""
+    random.seed(0)
+    times = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        gc.collect()
+        start = time.perf_counter()
+        while True:
+            t = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - t)
+            if len(times) >= max_runs or time.perf_counter() - start >= min_time:
+                break
+
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        result = fn()
+        _, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        del result
+
+    net_blocks = sum(stat.count_diff for stat in after.compare_to(before, 'filename'))
+    median = statistics.median(times)
+    return {
+        'runs': len(times),
+        'min_s': min(times),
+        'median_s': median,
+        'mean_s': statistics.fmean(times),
+        'ops_per_sec': 1 / median if median > 0 else None,
+        'peak_kib': (peak - base) / 1024,
+        'net_blocks': net_blocks,
+    }
+
+
+def run_metadata():
+    """Thông tin máy, phiên bản và commit để so sánh kết quả giữa các nhánh"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR,
+                                capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+
+    with open(ENGINE_FILE, 'rb') as f:
+        engine_hash = hashlib.sha1(f.read()).hexdigest()[:12]
+
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': commit,
+        'engine_sha1': engine_hash,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'machine': platform.machine(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def run_benchmarks(sizes, ops, min_time, max_runs, hill_steps):
+    results = []
+    for size in sizes:
+        t = time.perf_counter()
+        ctx = BenchContext(size, hill_steps)
+        print(f"\n[{size}] {len(ctx.employees)} nhân viên, {len(ctx.dept_to_rooms)} khoa, "
+              f"{len(ctx.days)} ngày (tạo dữ liệu {time.perf_counter() - t:.1f}s)")
+
+        for op in ops:
+            stats = measure(OPS[op](ctx), min_time, max_runs)
+            stats.update(size=size, op=op, staff=len(ctx.employees))
+            results.append(stats)
+            print(f"   {op:28s} {stats['median_s'] * 1000:10.2f} ms  "
+                  f"{stats['ops_per_sec']:10.2f} ops/s  peak {stats['peak_kib']:10.0f} KiB  "
+                  f"({stats['runs']} lần)")
+    return results
+
+
+def compare(results, baseline, threshold):
+    """In tỷ lệ so với baseline, trả về danh sách hồi quy"""
+    old = {(r['size'], r['op']): r for r in baseline['results']}
+    regressions = []
+
+    print(f"\nSo sánh với baseline {baseline['meta'].get('commit')} ({baseline['meta'].get('timestamp')}):")
+    for r in results:
+        prev = old.get((r['size'], r['op']))
+        if prev is None:
+            continue
+        time_ratio = r['median_s'] / prev['median_s'] if prev['median_s'] else float('inf')
+        mem_ratio = r['peak_kib'] / prev['peak_kib'] if prev['peak_kib'] > 0 else 1.0
+
+        flags = []
+        if time_ratio > 1 + threshold:
+            flags.append("CHẬM HƠN")
+        if mem_ratio > 1 + threshold:
+            flags.append("TỐN BỘ NHỚ HƠN")
+        if flags:
+            regressions.append((r['size'], r['op'], time_ratio, mem_ratio))
+
+        print(f"   [{r['size']}] {r['op']:28s} thời gian x{time_ratio:5.2f}  bộ nhớ x{mem_ratio:5.2f}  "
+              f"{' '.join(flags)}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark các hàm nóng của schedule-v7.py")
+    parser.add_argument("--sizes", default=",".join(SIZES),
+                        help=f"Cỡ dữ liệu, cách nhau dấu phẩy ({', '.join(SIZES)})")
+    parser.add_argument("--ops", default=",".join(OPS),
+                        help="Các hàm cần đo, cách nhau dấu phẩy")
+    parser.add_argument("--min-time", type=float, default=1.0,
+                        help="Thời gian đo tối thiểu cho mỗi hàm (giây)")
+    parser.add_argument("--max-runs", type=int, default=50,
+                        help="Số lần chạy tối đa cho mỗi hàm")
+    parser.add_argument("--hill-steps", type=int, default=ga_module.HILL_CLIMB_STEPS,
+                        help="Số bước hill_climb mỗi lần đo")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="File JSON kết quả")
+    parser.add_argument("--compare", metavar="BASELINE", help="File JSON kết quả cũ để so sánh")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Ngưỡng hồi quy (0.1 = chậm hơn 10%%)")
+    args = parser.parse_args()
+
+    sizes = [s.strip() for s in args.sizes.split(",") if s.strip()]
+    ops = [o.strip() for o in args.ops.split(",") if o.strip()]
+    unknown = [s for s in sizes if s not in SIZES] + [o for o in ops if o not in OPS]
+    if unknown:
+        parser.error(f"Không rõ: {', '.join(unknown)}")
+
+    results = run_benchmarks(sizes, ops, args.min_time, args.max_runs, args.hill_steps)
+
+    report = {
+        'meta': run_metadata(),
+        'settings': {'sizes': {s: SIZES[s] for s in sizes}, 'min_time': args.min_time,
+                     'max_runs': args.max_runs, 'hill_steps': args.hill_steps},
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nĐã lưu kết quả: {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n⚠️ {len(regressions)} hồi quy vượt ngưỡng {args.threshold:.0%}")
+            sys.exit(1)
+        print("\n✅ Không có hồi quy")
+
+
+if __name__ == "__main__":
+    main()
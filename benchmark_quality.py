@@ -0,0 +1,335 @@
+"""
+Benchmark chất lượng lời giải theo thời gian (anytime) trên thư viện dữ liệu cố định
+
+Cách dùng:
+    python benchmark_quality.py                                  # mọi bộ dữ liệu, GA cấu hình mặc định
+    python benchmark_quality.py --instances base,heavy_leave --engines ga,random_restart \\
+        --configs default,small_pop --seeds 0,1,2 --budget 30
+    python benchmark_quality.py --export-library thu_vien_v1    # ghi thư viện ra đĩa (CSV + meta)
+    python benchmark_quality.py --library thu_vien_v1           # chạy trên thư viện đã ghi
+
+Mỗi lần chạy (bộ dữ liệu x engine x cấu hình x seed) có cùng ngân sách thời gian thực và ghi
+lại đường cong (t, fitness tốt nhất, phạt cứng, phạt mềm) mỗi khi lời giải tốt nhất cải thiện.
+Kết quả: JSON gồm đường cong + thống kê tại các mốc thời gian, và ảnh PNG đường cong trung vị.
+"""
+
+import argparse
+import contextlib
+import hashlib
+import importlib.util
+import io
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+import pandas as pd
+
+# Import từ file schedule-v7.py
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+spec = importlib.util.spec_from_file_location("ga_module", os.path.join(BASE_DIR, "schedule-v7.py"))
+ga_module = importlib.util.module_from_spec(spec)
+sys.modules["ga_module"] = ga_module
+spec.loader.exec_module(ga_module)
+
+
+# =====================================================
+# THƯ VIỆN DỮ LIỆU BENCHMARK
+# =====================================================
+# Tăng version khi thay đổi bất kỳ bộ dữ liệu nào (hoặc khi generate_instance sinh khác đi):
+# kết quả của 2 version khác nhau không được so sánh với nhau.
+INSTANCE_LIBRARY_VERSION = 1
+
+INSTANCES = {
+    'base': dict(seed=101),
+    'medium': dict(num_departments=10, seed=102),
+    'large': dict(num_departments=20, doctors_per_department=40, nurses_per_department=60, seed=103),
+    'heavy_leave': dict(leave_density=0.25, leave_clustering=0.6, seed=104),
+    'scarce_seniors': dict(senior_doctor_ratio=0.08, senior_nurse_ratio=0.06, seed=105),
+    'long_horizon': dict(num_days=90, leave_density=0.05, seed=106),
+}
+
+# Ghi đè tham số GA; tournament_selection cần quần thể >= 40
+CONFIGS = {
+    'default': {},
+    'small_pop': {'POPULATION_SIZE': 40, 'ELITE_SIZE': 4},
+    'high_mutation': {'MUTATION_RATE': 0.4},
+    'eager_hill_climb': {'STAGNATION_LIMIT': 2},
+}
+
+CHECKPOINTS = (0.1, 0.25, 0.5, 1.0)    # Mốc thống kê, tính theo tỷ lệ ngân sách thời gian
+DEFAULT_OUTPUT = "benchmark_quality.json"
+
+
+def instance_fingerprint(employees, dept_to_rooms, shifts, days):
+    """Mã băm nội dung bộ dữ liệu, dùng để phát hiện dữ liệu đổi mà version không đổi"""
+    data = {
+        'employees': [(e.id, e.name, e.role, e.department, sorted(e.days_off), e.years_exp)
+                      for e in employees],
+        'dept_to_rooms': dept_to_rooms,
+        'shifts': [(s.name, s.start, s.end, s.hours) for s in shifts],
+        'days': list(days),
+    }
+    return hashlib.sha1(json.dumps(data, ensure_ascii=False).encode('utf-8')).hexdigest()[:16]
+
+
+def generate_library_instance(name):
+    return ga_module.generate_instance(**INSTANCES[name])
+
+
+def export_library(out_dir, names):
+    """Ghi thư viện ra đĩa: roster/leave CSV (định dạng import_roster/import_leave) + meta JSON"""
+    os.makedirs(out_dir, exist_ok=True)
+    meta = {'version': INSTANCE_LIBRARY_VERSION, 'instances': {}}
+    for name in names:
+        employees, dept_to_rooms, shifts, days = generate_library_instance(name)
+        pd.DataFrame({
+            'id': [e.id for e in employees],
+            'name': [e.name for e in employees],
+            'role': [e.role for e in employees],
+            'department': [e.department for e in employees],
+            'years_exp': [e.years_exp for e in employees],
+        }).to_csv(os.path.join(out_dir, f"{name}_roster.csv"), index=False)
+        pd.DataFrame([(e.id, d) for e in employees for d in sorted(e.days_off)],
+                     columns=['employee_id', 'date']
+                     ).to_csv(os.path.join(out_dir, f"{name}_leave.csv"), index=False)
+        meta['instances'][name] = {
+            'params': INSTANCES[name],
+            'dept_to_rooms': dept_to_rooms,
+            'shifts': [(s.name, s.start, s.end, s.hours) for s in shifts],
+            'num_days': len(days),
+            'fingerprint': instance_fingerprint(employees, dept_to_rooms, shifts, days),
+        }
+    with open(os.path.join(out_dir, "library.json"), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    print(f"Đã ghi thư viện v{INSTANCE_LIBRARY_VERSION} ({len(names)} bộ dữ liệu) vào: {out_dir}")
+
+
+def load_library_instance(library_dir, name):
+    """Đọc 1 bộ dữ liệu đã ghi bởi export_library và kiểm tra fingerprint"""
+    with open(os.path.join(library_dir, "library.json"), encoding='utf-8') as f:
+        meta = json.load(f)
+    info = meta['instances'][name]
+
+    dept_to_rooms = info['dept_to_rooms']
+    shifts = [ga_module.Shift(*s) for s in info['shifts']]
+    days = list(range(info['num_days']))
+    employees, errors = ga_module.import_roster(os.path.join(library_dir, f"{name}_roster.csv"),
+                                                dept_to_rooms)
+    _, leave_errors = ga_module.import_leave(os.path.join(library_dir, f"{name}_leave.csv"),
+                                             employees, days)
+    if errors or leave_errors:
+        raise ValueError(f"Thư viện hỏng ở bộ '{name}': {(errors + leave_errors)[:5]}")
+
+    fingerprint = instance_fingerprint(employees, dept_to_rooms, shifts, days)
+    if fingerprint != info['fingerprint']:
+        raise ValueError(f"Fingerprint của bộ '{name}' không khớp library.json")
+    return (employees, dept_to_rooms, shifts, days), meta['version'], fingerprint
+
+
+# =====================================================
+# ENGINES
+# =====================================================
+def run_engine_ga(instance, config, budget, hard_floor, on_sample):
+    """GA của schedule-v7.py (run_ga), dừng theo ngân sách thời gian
+
+    run_ga kiểm tra time_limit sau từng cá thể nên có thể vượt ngân sách 1 lần tính fitness;
+    mẫu được ghi tại min(elapsed, budget) để kết quả cuối luôn nằm trong ngân sách.
+    """
+    employees, dept_to_rooms, shifts, days = instance
+    config = dict(config, GENERATIONS=10**9)
+    policy = ga_module.TerminationPolicy(time_limit=budget, hard_floor=hard_floor)
+
+    def record(r):
+        on_sample(min(r['elapsed'], budget), r['best_fit'], r['best_hard'])
+
+    best_schedule, best_fit, _, _ = ga_module.run_ga(
+        employees, dept_to_rooms, shifts, days, config=config, policy=policy, on_generation=record)
+    return best_schedule
+
+
+def run_engine_random_restart(instance, config, budget, hard_floor, on_sample):
+    """Mốc so sánh: tạo lịch ngẫu nhiên liên tục, giữ lịch tốt nhất"""
+    employees, dept_to_rooms, shifts, days = instance
+    start = time.time()
+    best_schedule, best_fit = None, float("inf")
+    while time.time() - start < budget:
+        ind = ga_module.create_individual(employees, dept_to_rooms, shifts, days)
+        fit, hard, _, _ = ga_module.fitness(ind, employees, dept_to_rooms, shifts, days, log=True)
+        if fit < best_fit:
+            best_schedule, best_fit = ind, fit
+            on_sample(time.time() - start, fit, ga_module.hard_penalty(hard))
+    return best_schedule
+
+
+ENGINES = {
+    'ga': run_engine_ga,
+    'random_restart': run_engine_random_restart,
+}
+
+
+# =====================================================
+# CHẠY VÀ THỐNG KÊ
+# =====================================================
+def run_once(instance, engine, config, seed, budget, hard_floor):
+    """1 lần chạy: đường cong cải thiện và phân tách cứng/mềm của lịch cuối cùng"""
+    random.seed(seed)
+    curve = []
+
+    def on_sample(t, best_fit, best_hard):
+        if not curve or best_fit < curve[-1]['best_fit']:
+            soft = best_fit - best_hard if best_hard is not None else None
+            curve.append({'t': t, 'best_fit': best_fit, 'hard': best_hard, 'soft': soft})
+
+    start = time.time()
+    with contextlib.redirect_stdout(io.StringIO()):
+        best_schedule = ENGINES[engine](instance, config, budget, hard_floor, on_sample)
+    elapsed = time.time() - start
+
+    final = None
+    if best_schedule is not None:
+        employees, dept_to_rooms, shifts, days = instance
+        fit, hard, soft, fairness = ga_module.fitness(best_schedule, employees, dept_to_rooms,
+                                                      shifts, days, log=True)
+        final = {'fitness': fit, 'hard_penalty': ga_module.hard_penalty(hard),
+                 'hard': dict(hard), 'soft': dict(soft), 'fairness': fairness}
+
+    reached = next((p['t'] for p in curve if p['hard'] is not None and p['hard'] <= hard_floor), None)
+    return {'seed': seed, 'elapsed': elapsed, 'curve': curve, 'final': final,
+            'time_to_hard_floor': reached}
+
+
+def value_at(curve, t):
+    """Fitness tốt nhất đạt được tới thời điểm t (đường cong dạng bậc thang)"""
+    value = None
+    for point in curve:
+        if point['t'] > t:
+            break
+        value = point['best_fit']
+    return value
+
+
+def summarize(runs, budget):
+    """Thống kê qua các seed tại mỗi mốc thời gian"""
+    summary = {'checkpoints': {}}
+    for frac in CHECKPOINTS:
+        values = [v for v in (value_at(r['curve'], frac * budget) for r in runs) if v is not None]
+        summary['checkpoints'][f"{frac:g}"] = {
+            'solved_runs': len(values),
+            'median': statistics.median(values) if values else None,
+            'mean': statistics.fmean(values) if values else None,
+            'min': min(values) if values else None,
+            'max': max(values) if values else None,
+            'stdev': statistics.stdev(values) if len(values) > 1 else 0.0,
+        }
+    reached = [r['time_to_hard_floor'] for r in runs if r['time_to_hard_floor'] is not None]
+    summary['hard_floor_reached'] = f"{len(reached)}/{len(runs)}"
+    summary['median_time_to_hard_floor'] = statistics.median(reached) if reached else None
+    return summary
+
+
+def plot_curves(results, filename, budget):
+    """Vẽ đường cong trung vị (qua các seed) cho từng bộ dữ liệu"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    names = list(dict.fromkeys(r['instance'] for r in results))
+    fig, axes = plt.subplots(len(names), 1, figsize=(9, 3.5 * len(names)), squeeze=False)
+    grid = [budget * k / 100 for k in range(1, 101)]
+
+    for ax, name in zip(axes[:, 0], names):
+        group = [r for r in results if r['instance'] == name]
+        for r in group:
+            points = []
+            for t in grid:
+                values = [v for v in (value_at(run['curve'], t) for run in r['runs']) if v is not None]
+                if values:
+                    points.append((t, statistics.median(values)))
+            if points:
+                ax.step(*zip(*points), where='post', label=f"{r['engine']} / {r['config']}")
+        ax.set_title(f"{name} (cận dưới cứng {group[0]['hard_floor']:,.0f})")
+        ax.set_xlabel("Thời gian (s)")
+        ax.set_ylabel("Fitness tốt nhất (trung vị)")
+        ax.set_yscale('symlog')
+        ax.grid(True, alpha=0.3)
+        ax.legend(fontsize=8)
+
+    fig.tight_layout()
+    fig.savefig(filename, dpi=120)
+    plt.close(fig)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chất lượng lời giải theo thời gian")
+    parser.add_argument("--instances", default=",".join(INSTANCES),
+                        help=f"Bộ dữ liệu, cách nhau dấu phẩy ({', '.join(INSTANCES)})")
+    parser.add_argument("--engines", default="ga", help=f"Engine ({', '.join(ENGINES)})")
+    parser.add_argument("--configs", default="default", help=f"Cấu hình GA ({', '.join(CONFIGS)})")
+    parser.add_argument("--seeds", default="0,1,2", help="Các seed, cách nhau dấu phẩy")
+    parser.add_argument("--budget", type=float, default=20.0, help="Ngân sách thời gian mỗi lần chạy (giây)")
+    parser.add_argument("--library", metavar="DIR", help="Đọc dữ liệu từ thư viện đã ghi thay vì sinh lại")
+    parser.add_argument("--export-library", metavar="DIR", help="Ghi thư viện dữ liệu ra DIR rồi thoát")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="File JSON kết quả")
+    parser.add_argument("--plot", default="benchmark_quality.png", help="Ảnh đường cong ('' = không vẽ)")
+    args = parser.parse_args()
+
+    split = lambda text: [x.strip() for x in text.split(",") if x.strip()]
+    names, engines, configs = split(args.instances), split(args.engines), split(args.configs)
+    seeds = [int(s) for s in split(args.seeds)]
+    unknown = ([n for n in names if n not in INSTANCES] + [e for e in engines if e not in ENGINES]
+               + [c for c in configs if c not in CONFIGS])
+    if unknown:
+        parser.error(f"Không rõ: {', '.join(unknown)}")
+
+    if args.export_library:
+        export_library(args.export_library, names)
+        return
+
+    results = []
+    for name in names:
+        if args.library:
+            instance, version, fingerprint = load_library_instance(args.library, name)
+        else:
+            instance, version = generate_library_instance(name), INSTANCE_LIBRARY_VERSION
+            fingerprint = instance_fingerprint(*instance)
+
+        report = ga_module.analyze_feasibility(*instance)
+        hard_floor = report['hard_lower_bound']
+        print(f"\n[{name}] {len(instance[0])} nhân viên, {len(instance[3])} ngày, "
+              f"cận dưới cứng {hard_floor:,.0f}")
+
+        for engine in engines:
+            # Cấu hình GA không áp dụng cho engine khác
+            for config in (configs if engine == 'ga' else ['default']):
+                runs = [run_once(instance, engine, CONFIGS[config], seed, args.budget, hard_floor)
+                        for seed in seeds]
+                empty = [r['seed'] for r in runs if value_at(r['curve'], args.budget) is None]
+                if empty:
+                    print(f"   ⚠️ {engine}/{config}: seed {', '.join(map(str, empty))} không có kết quả "
+                          f"trong ngân sách {args.budget:g}s, bị loại khỏi thống kê")
+                summary = summarize(runs, args.budget)
+                results.append({'instance': name, 'library_version': version,
+                                'fingerprint': fingerprint, 'hard_floor': hard_floor,
+                                'engine': engine, 'config': config, 'config_params': CONFIGS[config],
+                                'summary': summary, 'runs': runs})
+
+                final = summary['checkpoints']["1"]
+                median = f"{final['median']:,.0f}" if final['median'] is not None else "-"
+                print(f"   {engine:15s} {config:17s} trung vị cuối = {median:>14s}  "
+                      f"đạt cận dưới cứng: {summary['hard_floor_reached']}")
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({'budget': args.budget, 'seeds': seeds, 'checkpoints': CHECKPOINTS,
+                   'results': results}, f, ensure_ascii=False, indent=2)
+    print(f"\nĐã lưu kết quả: {args.output}")
+
+    if args.plot:
+        plot_curves(results, args.plot, args.budget)
+        print(f"Đã vẽ đường cong: {args.plot}")
+
+
+if __name__ == "__main__":
+    main()
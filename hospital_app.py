@@ -5,30 +5,520 @@ Sử dụng thuật toán GA từ schedule-v7.py
 
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext, filedialog
+import tkinter.font as tkfont
 import sys
 import os
 import importlib.util
+import multiprocessing
 import threading
 import queue
-import copy
-from collections import defaultdict
-
-# Import matplotlib cho biểu đồ
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from matplotlib.figure import Figure
-
-# Import openpyxl cho Excel export
-import openpyxl
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+import time
+from collections import defaultdict, deque
+from bisect import bisect_right
 
 # Import từ file schedule-v7.py
 import importlib.util
 spec = importlib.util.spec_from_file_location("ga_module", 
                                                os.path.join(os.path.dirname(__file__), "schedule-v7.py"))
 ga_module = importlib.util.module_from_spec(spec)
+# Đăng ký để pickle được Employee/Shift và ga_worker khi gửi sang tiến trình con
+sys.modules["ga_module"] = ga_module
 spec.loader.exec_module(ga_module)
 
+# Console tab "Chạy và theo dõi": số dòng tối đa giữ lại, chu kỳ đọc queue (ms)
+CONSOLE_MAX_LINES = 5000
+POLL_MIN_MS = 30
+POLL_MAX_MS = 500
+
+# Xuất file nền: workbook từ ngần này sheet trở lên chạy trong tiến trình con, ít hơn dùng thread
+EXPORT_PROCESS_MIN_SHEETS = 20
+
+
+class ScheduleGrid:
+    """Bảng lịch trực vẽ trực tiếp trên Canvas, chỉ tạo item cho các ô đang hiển thị
+    
+    Hàng = ca trực, cột = ngày. Nội dung và số dòng của từng ô được tính sẵn trong
+    set_data; khi đổi bộ lọc các ô đang hiện được cập nhật tại chỗ thay vì vẽ lại.
+    """
+    ROW_HEADER_WIDTH = 130
+    COL_WIDTH = 180
+    HEADER_HEIGHT = 40
+    LINE_HEIGHT = 14
+    PADDING = 5
+    
+    def __init__(self, canvas):
+        self.canvas = canvas
+        self.font = tkfont.Font(family='Arial', size=8)
+        self.header_font = ('Arial', 10, 'bold')
+        self.line_cache = {}        # dòng -> số dòng sau khi ngắt theo độ rộng ô
+        
+        self.rows = []              # [(nhãn hàng, màu nền ô có dữ liệu)]
+        self.columns = []           # [nhãn cột]
+        self.texts = {}             # (hàng, cột) -> nội dung ô
+        self.row_top = [0]          # tọa độ y của từng hàng (không tính header)
+        
+        self.cells = {}             # (hàng, cột) -> (rect, text) đang vẽ
+        self.col_headers = {}       # cột -> (rect, text)
+        self.row_headers = {}       # hàng -> (rect, text)
+        self.corner = None
+        self.message = None
+    
+    # ----- Dữ liệu -----
+    def _line_count(self, text):
+        """Số dòng hiển thị của 1 ô, có cache theo từng dòng"""
+        width = self.COL_WIDTH - 2 * self.PADDING
+        total = 0
+        for line in text.split("\n"):
+            n = self.line_cache.get(line)
+            if n is None:
+                n = max(1, -(-self.font.measure(line) // width))
+                self.line_cache[line] = n
+            total += n
+        return total
+    
+    def set_data(self, rows, columns, texts):
+        """Gán dữ liệu mới. texts[(hàng, cột)] = nội dung, ô thiếu hiển thị '-'"""
+        self.clear_message()
+        self.rows = rows
+        self.columns = columns
+        self.texts = texts
+        
+        heights = [0] * len(rows)
+        for (r, c), text in texts.items():
+            heights[r] = max(heights[r], self._line_count(text))
+        self.row_top = [0]
+        for h in heights:
+            self.row_top.append(self.row_top[-1] + max(h, 2) * self.LINE_HEIGHT + 2 * self.PADDING)
+        
+        # Bỏ các ô nằm ngoài kích thước mới, ô còn lại được cập nhật trong render()
+        for key in [k for k in self.cells if k[0] >= len(rows) or k[1] >= len(columns)]:
+            self._delete(self.cells.pop(key))
+        for c in [c for c in self.col_headers if c >= len(columns)]:
+            self._delete(self.col_headers.pop(c))
+        for r in [r for r in self.row_headers if r >= len(rows)]:
+            self._delete(self.row_headers.pop(r))
+        
+        self.canvas.configure(scrollregion=(0, 0,
+                                            self.ROW_HEADER_WIDTH + len(columns) * self.COL_WIDTH,
+                                            self.HEADER_HEIGHT + self.row_top[-1]))
+        self.render(refresh=True)
+    
+    def show_message(self, text):
+        """Xóa bảng và hiện 1 thông báo"""
+        self.rows, self.columns, self.texts, self.row_top = [], [], {}, [0]
+        self.canvas.delete("all")
+        self.cells.clear()
+        self.col_headers.clear()
+        self.row_headers.clear()
+        self.corner = None
+        self.canvas.configure(scrollregion=(0, 0, 0, 0))
+        self.canvas.xview_moveto(0)
+        self.canvas.yview_moveto(0)
+        self.message = self.canvas.create_text(20, 50, text=text, anchor='nw',
+                                               font=('Arial', 12), fill='gray')
+    
+    def clear_message(self):
+        if self.message is not None:
+            self.canvas.delete(self.message)
+            self.message = None
+    
+    # ----- Vẽ -----
+    def _delete(self, items):
+        for item in items:
+            self.canvas.delete(item)
+    
+    def _cell_box(self, r, c):
+        x = self.ROW_HEADER_WIDTH + c * self.COL_WIDTH
+        y = self.HEADER_HEIGHT + self.row_top[r]
+        return x, y, x + self.COL_WIDTH, self.HEADER_HEIGHT + self.row_top[r + 1]
+    
+    def _cell_style(self, r, c):
+        text = self.texts.get((r, c))
+        if text:
+            return text, self.rows[r][1]
+        return "-", 'white'
+    
+    def _place(self, items, box, text, fill):
+        """Cập nhật tọa độ, nội dung, màu của 1 ô đã có"""
+        rect, label = items
+        x0, y0, x1, y1 = box
+        self.canvas.coords(rect, x0, y0, x1, y1)
+        self.canvas.itemconfigure(rect, fill=fill)
+        self.canvas.coords(label, x0 + self.PADDING, y0 + self.PADDING)
+        self.canvas.itemconfigure(label, text=text)
+    
+    def _create(self, box, text, fill, font, anchor='nw', color='black', tag='cell'):
+        x0, y0, x1, y1 = box
+        rect = self.canvas.create_rectangle(x0, y0, x1, y1, fill=fill, outline='#B0BEC5', tags=tag)
+        label = self.canvas.create_text(x0 + self.PADDING, y0 + self.PADDING, text=text,
+                                        anchor=anchor, font=font, fill=color, tags=tag,
+                                        width=x1 - x0 - 2 * self.PADDING)
+        return rect, label
+    
+    def _visible_range(self):
+        width = self.canvas.winfo_width()
+        height = self.canvas.winfo_height()
+        x0, y0 = self.canvas.canvasx(0), self.canvas.canvasy(0)
+        x1, y1 = x0 + width, y0 + height
+        
+        c0 = max(0, int((x0 - self.ROW_HEADER_WIDTH) // self.COL_WIDTH))
+        c1 = min(len(self.columns), int((x1 - self.ROW_HEADER_WIDTH) // self.COL_WIDTH) + 1)
+        r0 = max(0, bisect_right(self.row_top, y0 - self.HEADER_HEIGHT) - 1)
+        r1 = min(len(self.rows), bisect_right(self.row_top, y1 - self.HEADER_HEIGHT))
+        return x0, y0, range(c0, c1), range(r0, r1)
+    
+    def render(self, refresh=False):
+        """Vẽ các ô đang nằm trong vùng nhìn thấy; refresh=True cập nhật cả các ô đã vẽ"""
+        if not self.rows or not self.columns:
+            return
+        
+        x0, y0, cols, rows = self._visible_range()
+        visible = {(r, c) for r in rows for c in cols}
+        
+        for key in [k for k in self.cells if k not in visible]:
+            self._delete(self.cells.pop(key))
+        for key in visible:
+            text, fill = self._cell_style(*key)
+            if key not in self.cells:
+                self.cells[key] = self._create(self._cell_box(*key), text, fill, self.font)
+            elif refresh:
+                self._place(self.cells[key], self._cell_box(*key), text, fill)
+        
+        # Header cố định: hàng tiêu đề ngày luôn ở trên, cột ca trực luôn ở trái
+        for c in [c for c in self.col_headers if c not in cols]:
+            self._delete(self.col_headers.pop(c))
+        for c in cols:
+            x = self.ROW_HEADER_WIDTH + c * self.COL_WIDTH
+            box = (x, y0, x + self.COL_WIDTH, y0 + self.HEADER_HEIGHT)
+            if c not in self.col_headers:
+                self.col_headers[c] = self._create(box, self.columns[c], '#2196F3',
+                                                   self.header_font, color='white', tag='header')
+            else:
+                self._place(self.col_headers[c], box, self.columns[c], '#2196F3')
+        
+        for r in [r for r in self.row_headers if r not in rows]:
+            self._delete(self.row_headers.pop(r))
+        for r in rows:
+            y = self.HEADER_HEIGHT + self.row_top[r]
+            box = (x0, y, x0 + self.ROW_HEADER_WIDTH, self.HEADER_HEIGHT + self.row_top[r + 1])
+            if r not in self.row_headers:
+                self.row_headers[r] = self._create(box, self.rows[r][0], '#90CAF9',
+                                                   ('Arial', 9, 'bold'), tag='header')
+            else:
+                self._place(self.row_headers[r], box, self.rows[r][0], '#90CAF9')
+        
+        corner_box = (x0, y0, x0 + self.ROW_HEADER_WIDTH, y0 + self.HEADER_HEIGHT)
+        if self.corner is None:
+            self.corner = self._create(corner_box, "Ca trực", '#1976D2',
+                                       self.header_font, color='white', tag='header')
+        else:
+            self._place(self.corner, corner_box, "Ca trực", '#1976D2')
+        
+        self.canvas.tag_raise('header')
+        for r in rows:
+            self.canvas.tag_raise(self.row_headers[r][0])
+            self.canvas.tag_raise(self.row_headers[r][1])
+        self.canvas.tag_raise(self.corner[0])
+        self.canvas.tag_raise(self.corner[1])
+    
+    # ----- Cuộn -----
+    def yview(self, *args):
+        self.canvas.yview(*args)
+        self.render()
+    
+    def xview(self, *args):
+        self.canvas.xview(*args)
+        self.render()
+    
+    def scroll(self, dx=0, dy=0):
+        if dy:
+            self.canvas.yview_scroll(dy, "units")
+        if dx:
+            self.canvas.xview_scroll(dx, "units")
+        self.render()
+
+
+class MinMaxSeries:
+    """Chuỗi điểm thu gọn theo bucket: mỗi bucket giữ điểm min và max của các điểm liên tiếp
+    
+    Khi số bucket vượt max_buckets thì gộp từng cặp (kích thước bucket gấp đôi), nên số
+    điểm cần vẽ luôn <= 2 * max_buckets dù chuỗi dài bao nhiêu.
+    """
+    def __init__(self, max_buckets=1000):
+        self.max_buckets = max_buckets
+        self.clear()
+    
+    def clear(self):
+        self.size = 1
+        self.buckets = []           # [số điểm, x_min, v_min, x_max, v_max]
+    
+    def append(self, x, v):
+        if self.buckets and self.buckets[-1][0] < self.size:
+            b = self.buckets[-1]
+            b[0] += 1
+            if v < b[2]:
+                b[1], b[2] = x, v
+            if v > b[4]:
+                b[3], b[4] = x, v
+        else:
+            self.buckets.append([1, x, v, x, v])
+        
+        if len(self.buckets) > self.max_buckets:
+            merged = []
+            for i in range(0, len(self.buckets), 2):
+                pair = self.buckets[i:i + 2]
+                lo = min(pair, key=lambda b: b[2])
+                hi = max(pair, key=lambda b: b[4])
+                merged.append([sum(b[0] for b in pair), lo[1], lo[2], hi[3], hi[4]])
+            self.buckets = merged
+            self.size *= 2
+    
+    def xy(self):
+        xs, ys = [], []
+        for _, x_min, v_min, x_max, v_max in self.buckets:
+            for x, v in sorted(((x_min, v_min), (x_max, v_max))):
+                xs.append(x)
+                ys.append(v)
+        return xs, ys
+
+
+class ConvergenceChart:
+    """Biểu đồ hội tụ cập nhật tại chỗ bằng blitting
+    
+    Hai đường (fitness, trung bình động) được tạo 1 lần; mỗi lần cập nhật chỉ set_data
+    rồi vẽ lại 2 đường lên nền đã lưu. Chỉ vẽ lại toàn bộ khi dữ liệu vượt khỏi trục
+    (trục x tăng gấp đôi) hoặc khi đổi kích thước cửa sổ.
+    """
+    WINDOW = 10
+    
+    def __init__(self, ax, canvas):
+        self.ax = ax
+        self.canvas = canvas
+        self.background = None
+        
+        self.fit_line, = ax.plot([], [], 'b-', linewidth=2, label='Fitness', animated=True)
+        self.avg_line, = ax.plot([], [], 'r--', linewidth=1.5, alpha=0.7,
+                                 label='Trung bình động', animated=True)
+        ax.legend(loc='upper right')
+        from matplotlib.ticker import FuncFormatter
+        ax.yaxis.set_major_formatter(FuncFormatter(lambda x, p: f'{int(x):,}'))
+        
+        self.fit_series = MinMaxSeries()
+        self.avg_series = MinMaxSeries()
+        self.canvas.mpl_connect('draw_event', self._on_draw)
+        self.reset()
+    
+    def reset(self):
+        """Xóa dữ liệu của lần chạy trước"""
+        self.fit_series.clear()
+        self.avg_series.clear()
+        self.count = 0
+        self.window = deque()
+        self.window_sum = 0.0
+        self.y_range = None
+        self.fit_line.set_data([], [])
+        self.avg_line.set_data([], [])
+        self.ax.set_xlim(1, 50)
+        self.ax.set_ylim(0, 1)
+        self.canvas.draw_idle()
+    
+    def append(self, value):
+        """Thêm fitness của 1 thế hệ (trung bình động tính trực tuyến)"""
+        self.count += 1
+        self.fit_series.append(self.count, value)
+        
+        self.window.append(value)
+        self.window_sum += value
+        if len(self.window) > self.WINDOW:
+            self.window_sum -= self.window.popleft()
+        if len(self.window) == self.WINDOW:
+            self.avg_series.append(self.count, self.window_sum / self.WINDOW)
+        
+        lo, hi = self.y_range or (value, value)
+        self.y_range = (min(lo, value), max(hi, value))
+    
+    def _rescale(self):
+        """Mở rộng trục khi dữ liệu vượt ra ngoài, trả về True nếu trục đã đổi"""
+        changed = False
+        x_max = self.ax.get_xlim()[1]
+        if self.count > x_max:
+            while x_max < self.count:
+                x_max *= 2
+            self.ax.set_xlim(1, x_max)
+            changed = True
+        
+        lo, hi = self.y_range
+        y_lo, y_hi = self.ax.get_ylim()
+        if lo < y_lo or hi > y_hi or (y_lo, y_hi) == (0, 1):
+            # Chừa rộng về phía dữ liệu đang vượt để số lần vẽ lại chỉ tăng theo log
+            span = max(hi - lo, abs(hi) * 0.01, 1)
+            new_lo = lo - span * (0.5 if lo < y_lo else 0.05)
+            new_hi = hi + span * (0.5 if hi > y_hi and (y_lo, y_hi) != (0, 1) else 0.05)
+            self.ax.set_ylim(new_lo, new_hi)
+            changed = True
+        return changed
+    
+    def _on_draw(self, event):
+        """Sau mỗi lần vẽ toàn bộ: lưu nền (không có 2 đường) rồi vẽ 2 đường lên"""
+        self.background = self.canvas.copy_from_bbox(self.ax.bbox)
+        self._draw_lines()
+    
+    def _draw_lines(self):
+        self.ax.draw_artist(self.fit_line)
+        self.ax.draw_artist(self.avg_line)
+    
+    def update(self):
+        """Cập nhật 2 đường; chi phí cố định nhờ MinMaxSeries"""
+        if not self.count:
+            return
+        
+        self.fit_line.set_data(*self.fit_series.xy())
+        self.avg_line.set_data(*self.avg_series.xy())
+        
+        if self._rescale() or self.background is None:
+            self.canvas.draw()
+            return
+        
+        self.canvas.restore_region(self.background)
+        self._draw_lines()
+        self.canvas.blit(self.ax.bbox)
+
+
+class LogFileMirror:
+    """Ghi toàn bộ log console ra file trên 1 thread riêng (GUI chỉ đẩy vào queue)"""
+    def __init__(self, filename):
+        self.filename = filename
+        self.queue = queue.Queue()
+        self.file = open(filename, 'a', encoding='utf-8')
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+    
+    def write(self, text):
+        self.queue.put(text)
+    
+    def close(self):
+        self.queue.put(None)
+        self.thread.join(timeout=2)
+    
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            # Gom các dòng đang chờ thành 1 lần ghi
+            try:
+                while batch[-1] is not None:
+                    batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                pass
+            
+            closing = batch[-1] is None
+            self.file.write("".join(t for t in batch if t is not None))
+            self.file.flush()
+            if closing:
+                self.file.close()
+                return
+
+
+class VirtualEmployeeList:
+    """Danh sách nhân viên ảo trên Treeview: chỉ giữ số dòng vừa khung nhìn
+    
+    Các dòng được tạo 1 lần và chỉ đổi values khi cuộn/lọc; thanh cuộn dọc điều khiển
+    vị trí trong danh sách đã lọc. Chọn dòng được đánh dấu bằng tag thay cho selection
+    của Treeview để không phát sinh sự kiện khi cuộn.
+    """
+    ROW_HEIGHT = 20
+    
+    def __init__(self, tree, scrollbar, on_select, rows=20):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.on_select = on_select
+        self.items = []
+        self.offset = 0
+        self.pool = []
+        self.selected_id = None
+        
+        self.tree.tag_configure('selected', background='#0078D7', foreground='white')
+        self.scrollbar.config(command=self.yview)
+        self.tree.bind('<<TreeviewSelect>>', self._on_tree_select)
+        self.tree.bind('<MouseWheel>', lambda e: self.scroll(int(-1*(e.delta/120)) * 3))
+        self.tree.bind('<Button-4>', lambda e: self.scroll(-3))
+        self.tree.bind('<Button-5>', lambda e: self.scroll(3))
+        self.tree.bind('<Configure>', self._on_resize)
+        self._resize_pool(rows)
+    
+    @staticmethod
+    def row_values(emp):
+        role_text = "Bác sĩ" if emp.role == "doctor" else "Điều dưỡng"
+        return (emp.id, emp.name, role_text, emp.department,
+                f"{emp.years_exp} năm", len(emp.days_off))
+    
+    def _resize_pool(self, rows):
+        while len(self.pool) < rows:
+            self.pool.append(self.tree.insert("", "end", values=()))
+        while len(self.pool) > rows:
+            self.tree.delete(self.pool.pop())
+    
+    def _on_resize(self, event):
+        rows = max(1, (event.height - 25) // self.ROW_HEIGHT)
+        if rows != len(self.pool):
+            self._resize_pool(rows)
+            self.render()
+    
+    def set_items(self, items):
+        """Gán danh sách đã lọc, giữ nguyên vị trí cuộn nếu còn hợp lệ"""
+        self.items = items
+        self.offset = min(self.offset, max(0, len(items) - len(self.pool)))
+        self.render()
+    
+    def render(self):
+        for k, iid in enumerate(self.pool):
+            idx = self.offset + k
+            if idx < len(self.items):
+                emp = self.items[idx]
+                tags = ('selected',) if emp.id == self.selected_id else ()
+                self.tree.item(iid, values=self.row_values(emp), tags=tags)
+                self.tree.move(iid, "", k)
+            else:
+                self.tree.detach(iid)
+        
+        total = max(len(self.items), 1)
+        self.scrollbar.set(self.offset / total, min(1.0, (self.offset + len(self.pool)) / total))
+    
+    def refresh_employee(self, emp_id):
+        """Cập nhật tại chỗ dòng của 1 nhân viên nếu đang hiển thị"""
+        for k, iid in enumerate(self.pool):
+            idx = self.offset + k
+            if idx < len(self.items) and self.items[idx].id == emp_id:
+                self.tree.item(iid, values=self.row_values(self.items[idx]))
+                return
+    
+    def scroll(self, rows):
+        max_offset = max(0, len(self.items) - len(self.pool))
+        self.offset = max(0, min(max_offset, self.offset + rows))
+        self.render()
+        return "break"
+    
+    def yview(self, *args):
+        if args[0] == 'moveto':
+            max_offset = max(0, len(self.items) - len(self.pool))
+            self.offset = max(0, min(max_offset, int(float(args[1]) * len(self.items))))
+            self.render()
+        elif args[0] == 'scroll':
+            step = len(self.pool) if args[2] == 'pages' else 1
+            self.scroll(int(args[1]) * step)
+    
+    def _on_tree_select(self, event):
+        selection = self.tree.selection()
+        if not selection:
+            return
+        
+        k = self.pool.index(selection[0])
+        self.tree.selection_remove(selection)
+        if self.offset + k < len(self.items):
+            emp = self.items[self.offset + k]
+            self.selected_id = emp.id
+            self.render()
+            self.on_select(emp)
+
 
 class HospitalScheduleApp:
     def __init__(self, root):
@@ -44,18 +534,46 @@ class HospitalScheduleApp:
         self.dept_to_rooms = {}
         self.shifts = []
         self.days = []
+        # Lịch hiện tại: ga_module.ScheduleStore, dùng chung cho dashboard, xuất file và thay ca
         self.best_schedule = None
         
+        # Kết quả chấm điểm lịch hiện tại, gắn với phiên bản lịch (tăng mỗi lần lịch đổi)
+        self.schedule_version = 0
+        self.schedule_scores = None
+        
+        # Warm start: lịch kỳ trước dùng để khởi tạo quần thể
+        self.warm_start_file = None
+        self.carry_in = None
+        
+        # Chỉ mục sẵn sàng (DeltaEvaluator) cho gợi ý thay ca, tạo lại khi lịch đổi
+        self.replacement_index = None
+        
         # GA running state
         self.is_running = False
+        self.termination = {}
+        self.run_profile = None
+        self.ga_process = None
+        self.ga_conn = None
+        self.stop_event = None
         self.history = []
+        self.profile = None
         self.output_queue = queue.Queue()
         
+        # Các công việc xuất file đang chạy nền: {job_id: dict}
+        self.export_jobs = {}
+        self.export_job_seq = 0
+        
+        # Console: log được gom lại và ghi 1 lần mỗi chu kỳ check_queue
+        self.console_buffer = deque()
+        self.log_mirror = None
+        self.poll_interval = POLL_MIN_MS
+        
         # Setup UI
         self.setup_main_ui()
         
         # Start checking queue
-        self.root.after(100, self.check_queue)
+        self.root.after(POLL_MIN_MS, self.check_queue)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         
     def load_config_from_module(self):
         """Load cấu hình từ module schedule_v7"""
@@ -370,6 +888,10 @@ class HospitalScheduleApp:
                   style='Action.TButton',
                   width=20).pack(side="left", padx=5)
         
+        ttk.Button(button_frame, text="📥 Nhập danh sách NV",
+                  command=self.import_roster,
+                  width=20).pack(side="left", padx=5)
+        
         ttk.Button(button_frame, text="💾 Lưu cấu hình ra file", 
                   command=self.export_config,
                   width=20).pack(side="left", padx=5)
@@ -442,6 +964,48 @@ class HospitalScheduleApp:
                                f"Không thể tạo dữ liệu mẫu!\n\n"
                                f"Chi tiết: {str(e)}")
     
+    def report_import_errors(self, title, errors, limit=15):
+        """Ghi toàn bộ dòng lỗi ra console, trả về đoạn tóm tắt cho hộp thoại"""
+        if not errors:
+            return ""
+        for row, message in errors:
+            self.log_console(f"   [{title}] Dòng {row}: {message}\n", 'warning')
+        lines = "\n".join(f"   • Dòng {row}: {message}" for row, message in errors[:limit])
+        more = f"\n   ... và {len(errors) - limit} lỗi khác (xem Console)" if len(errors) > limit else ""
+        return f"\n\n⚠️ {len(errors)} dòng lỗi đã bị bỏ qua:\n{lines}{more}"
+    
+    def import_roster(self):
+        """Nhập danh sách nhân viên từ CSV/Excel thay cho dữ liệu mẫu"""
+        filename = filedialog.askopenfilename(
+            filetypes=[("CSV/Excel", "*.csv *.xlsx *.xls"), ("All files", "*.*")],
+            title="Nhập danh sách nhân viên (id, name, role, department, years_exp)"
+        )
+        if not filename:
+            return
+        
+        dept_to_rooms, shifts, days = ga_module.base_structure()
+        try:
+            employees, errors = ga_module.import_roster(filename, dept_to_rooms)
+        except Exception as e:
+            messagebox.showerror("❌ Lỗi", f"Không thể đọc file!\n\nChi tiết: {str(e)}")
+            return
+        
+        summary = self.report_import_errors("Nhân viên", errors)
+        if not employees:
+            messagebox.showerror("❌ Lỗi", f"Không có nhân viên hợp lệ trong file.{summary}")
+            return
+        
+        self.employees, self.dept_to_rooms, self.shifts, self.days = employees, dept_to_rooms, shifts, days
+        self.set_best_schedule(None)
+        if hasattr(self, 'employee_tree'):
+            self.update_employee_list()
+        
+        messagebox.showinfo("✅ Thành công",
+                          f"Đã nhập {len(employees)} nhân viên từ:\n{filename}\n\n"
+                          f"   • Bác sĩ: {sum(e.role == 'doctor' for e in employees)}\n"
+                          f"   • Điều dưỡng: {sum(e.role == 'nurse' for e in employees)}"
+                          f"{summary}")
+    
     def export_config(self):
         """Xuất cấu hình ra file"""
         filename = filedialog.asksaveasfilename(
@@ -529,7 +1093,7 @@ class HospitalScheduleApp:
         self.search_entry = ttk.Entry(search_frame, textvariable=self.search_var, 
                                       font=('Arial', 9))
         self.search_entry.pack(side="left", fill="x", expand=True, padx=(0, 5))
-        self.search_var.trace('w', lambda *args: self.filter_employees())
+        self.search_var.trace('w', lambda *args: self.schedule_filter_employees())
         
         ttk.Button(search_frame, text="🔍", width=3,
                   command=self.filter_employees).pack(side="left")
@@ -580,11 +1144,10 @@ class HospitalScheduleApp:
         self.employee_tree = ttk.Treeview(tree_frame,
                                          columns=("ID", "Tên", "Chức vụ", "Khoa", "Kinh nghiệm", "Ngày nghỉ"),
                                          show="headings",
-                                         yscrollcommand=tree_scroll_y.set,
+                                         selectmode="browse",
                                          xscrollcommand=tree_scroll_x.set,
                                          height=20)
         
-        tree_scroll_y.config(command=self.employee_tree.yview)
         tree_scroll_x.config(command=self.employee_tree.xview)
         
         # Configure columns
@@ -607,8 +1170,11 @@ class HospitalScheduleApp:
         tree_scroll_x.pack(side="bottom", fill="x")
         self.employee_tree.pack(side="left", fill="both", expand=True)
         
-        # Bind selection event
-        self.employee_tree.bind('<<TreeviewSelect>>', self.on_employee_select)
+        # Danh sách ảo: thanh cuộn dọc điều khiển vị trí, chọn dòng gọi select_employee
+        self.employee_list = VirtualEmployeeList(self.employee_tree, tree_scroll_y,
+                                                 self.select_employee)
+        self.employee_search_index = []
+        self._filter_job = None
         
         # ===== RIGHT PANEL: Đăng ký nghỉ =====
         right_panel = ttk.Frame(main_container)
@@ -664,6 +1230,8 @@ class HospitalScheduleApp:
         self.calendar_frame.pack(fill="both", expand=True)
         
         self.day_buttons = {}
+        self.calendar_cells = []    # 42 nút (6 tuần x 7 ngày) tạo 1 lần, xem build_calendar_grid
+        self.cell_state = []        # trạng thái đang hiển thị của từng nút, tránh config thừa
         self.selected_days_set = set()
         
         # Button panel
@@ -682,6 +1250,10 @@ class HospitalScheduleApp:
                   command=self.show_dayoff_stats,
                   style='Action.TButton').pack(side="left", padx=5)
         
+        ttk.Button(button_panel, text="📥 Nhập ngày nghỉ",
+                  command=self.import_leave,
+                  style='Action.TButton').pack(side="left", padx=5)
+        
         # Summary label
         self.dayoff_summary = tk.StringVar(value="Đã chọn: 0 ngày")
         ttk.Label(button_panel, textvariable=self.dayoff_summary,
@@ -692,12 +1264,10 @@ class HospitalScheduleApp:
         self.draw_calendar()
     
     def update_employee_list(self):
-        """Cập nhật danh sách nhân viên"""
-        # Clear tree
-        for item in self.employee_tree.get_children():
-            self.employee_tree.delete(item)
-        
+        """Cập nhật danh sách nhân viên và chỉ mục tìm kiếm"""
         if not self.employees:
+            self.employee_search_index = []
+            self.employee_list.set_items([])
             self.emp_count_label.config(text="⚠️ Chưa có dữ liệu. Vui lòng tạo dữ liệu mẫu ở tab Cấu hình!")
             self.dept_filter['values'] = []
             return
@@ -708,103 +1278,59 @@ class HospitalScheduleApp:
         if not self.dept_filter_var.get():
             self.dept_filter_var.set('Tất cả')
         
-        # Add employees to tree
-        for emp in self.employees:
-            role_text = "Bác sĩ" if emp.role == "doctor" else "Điều dưỡng"
-            self.employee_tree.insert("", "end", values=(
-                emp.id,
-                emp.name,
-                role_text,
-                emp.department,
-                f"{emp.years_exp} năm",
-                len(emp.days_off)
-            ))
-        
-        self.emp_count_label.config(text=f"Tổng: {len(self.employees)} nhân viên")
+        # Chuỗi tìm kiếm viết thường (mã, tên, khoa, chức vụ) tính 1 lần
+        self.employee_search_index = [
+            (f"{emp.id} {emp.name} {emp.department} "
+             f"{'bác sĩ' if emp.role == 'doctor' else 'điều dưỡng'}".lower(), emp)
+            for emp in self.employees
+        ]
+        self.filter_employees()
+    
+    def schedule_filter_employees(self, delay=200):
+        """Lọc lại sau khi người dùng ngừng gõ (debounce)"""
+        if self._filter_job is not None:
+            self.root.after_cancel(self._filter_job)
+        self._filter_job = self.root.after(delay, self.filter_employees)
     
     def filter_employees(self):
         """Lọc nhân viên theo điều kiện"""
-        # Clear tree
-        for item in self.employee_tree.get_children():
-            self.employee_tree.delete(item)
-        
+        self._filter_job = None
         if not self.employees:
             return
         
-        search_text = self.search_var.get().lower()
+        search_text = self.search_var.get().strip().lower()
         dept_filter = self.dept_filter_var.get()
         role_filter = self.role_filter_var.get()
+        role = {"Bác sĩ": "doctor", "Điều dưỡng": "nurse"}.get(role_filter)
         
-        count = 0
-        for emp in self.employees:
-            # Filter by search text
-            if search_text and search_text not in emp.name.lower() and search_text not in str(emp.id):
-                continue
-            
-            # Filter by department
-            if dept_filter and dept_filter != "Tất cả" and emp.department != dept_filter:
-                continue
-            
-            # Filter by role
-            if role_filter != "Tất cả":
-                if role_filter == "Bác sĩ" and emp.role != "doctor":
-                    continue
-                if role_filter == "Điều dưỡng" and emp.role != "nurse":
-                    continue
-            
-            role_text = "Bác sĩ" if emp.role == "doctor" else "Điều dưỡng"
-            self.employee_tree.insert("", "end", values=(
-                emp.id,
-                emp.name,
-                role_text,
-                emp.department,
-                f"{emp.years_exp} năm",
-                len(emp.days_off)
-            ))
-            count += 1
+        filtered = [
+            emp for text, emp in self.employee_search_index
+            if (not search_text or search_text in text)
+            and (not dept_filter or dept_filter == "Tất cả" or emp.department == dept_filter)
+            and (role is None or emp.role == role)
+        ]
+        self.employee_list.set_items(filtered)
         
-        self.emp_count_label.config(text=f"Hiển thị: {count}/{len(self.employees)} nhân viên")
+        if len(filtered) == len(self.employees):
+            self.emp_count_label.config(text=f"Tổng: {len(self.employees)} nhân viên")
+        else:
+            self.emp_count_label.config(text=f"Hiển thị: {len(filtered)}/{len(self.employees)} nhân viên")
     
-    def on_employee_select(self, event):
+    def select_employee(self, emp):
         """Khi chọn nhân viên"""
-        selection = self.employee_tree.selection()
-        if not selection:
-            return
-        
-        item = self.employee_tree.item(selection[0])
-        emp_id = int(item['values'][0])
-        
-        # Find employee
-        emp = next((e for e in self.employees if e.id == emp_id), None)
-        if emp:
-            self.selected_emp_id = emp_id
-            role = "Bác sĩ" if emp.role == "doctor" else "Điều dưỡng"
-            self.selected_emp_info.set(
-                f"🔹 {emp.name} - {role} - {emp.department} - {emp.years_exp} năm kinh nghiệm"
-            )
-            
-            # Load current days off
-            self.selected_days_set = set(emp.days_off)
-            self.draw_calendar()
-            self.update_dayoff_summary()
-    
-    def draw_calendar(self):
-        """Vẽ calendar"""
-        from datetime import datetime, timedelta
-        
-        # Clear existing
-        for widget in self.calendar_frame.winfo_children():
-            widget.destroy()
-        
-        self.day_buttons.clear()
-        
-        # Update month label
-        self.month_label_var.set(
-            f"Tháng {self.current_date.month:02d}/{self.current_date.year}"
+        self.selected_emp_id = emp.id
+        role = "Bác sĩ" if emp.role == "doctor" else "Điều dưỡng"
+        self.selected_emp_info.set(
+            f"🔹 {emp.name} - {role} - {emp.department} - {emp.years_exp} năm kinh nghiệm"
         )
         
-        # Create calendar grid
-        # Day headers
+        # Load current days off
+        self.selected_days_set = set(emp.days_off)
+        self.refresh_calendar_colors()
+        self.update_dayoff_summary()
+    
+    def build_calendar_grid(self):
+        """Tạo 1 lần tiêu đề thứ và lưới 6x7 nút ngày, draw_calendar chỉ cập nhật tại chỗ"""
         days_header = ["T2", "T3", "T4", "T5", "T6", "T7", "CN"]
         for i, day_name in enumerate(days_header):
             label = tk.Label(self.calendar_frame, text=day_name,
@@ -813,6 +1339,33 @@ class HospitalScheduleApp:
                            width=8, height=1)
             label.grid(row=0, column=i, sticky="nsew", padx=1, pady=1)
         
+        for k in range(42):
+            btn = tk.Button(self.calendar_frame, text="",
+                          font=('Arial', 10),
+                          width=8, height=3,
+                          relief='raised',
+                          command=lambda k=k: self.on_calendar_cell(k))
+            btn.grid(row=k // 7 + 1, column=k % 7, sticky="nsew", padx=1, pady=1)
+            self.calendar_cells.append(btn)
+            self.cell_state.append(None)
+        
+        # Configure grid weights
+        for i in range(7):
+            self.calendar_frame.columnconfigure(i, weight=1)
+        for i in range(7):
+            self.calendar_frame.rowconfigure(i, weight=1)
+        self.cell_day = [None] * 42
+    
+    def draw_calendar(self):
+        """Vẽ calendar (cập nhật chữ, màu của các nút có sẵn)"""
+        if not self.calendar_cells:
+            self.build_calendar_grid()
+        
+        # Update month label
+        self.month_label_var.set(
+            f"Tháng {self.current_date.month:02d}/{self.current_date.year}"
+        )
+        
         # Get first day and number of days in month
         first_day = self.current_date.replace(day=1)
         weekday = first_day.weekday()  # 0 = Monday
@@ -825,42 +1378,52 @@ class HospitalScheduleApp:
         
         days_in_month = (next_month - first_day).days
         
-        # Draw days
-        row = 1
-        col = weekday
-        
-        for day in range(1, days_in_month + 1):
-            day_index = day - 1  # 0-indexed
-            is_selected = day_index in self.selected_days_set
-            
+        self.day_buttons.clear()
+        for k, btn in enumerate(self.calendar_cells):
+            day = k - weekday + 1
+            if 1 <= day <= days_in_month:
+                day_index = day - 1  # 0-indexed
+                self.cell_day[k] = day_index
+                self.day_buttons[day_index] = btn
+                state = (str(day), day_index in self.selected_days_set)
+            else:
+                self.cell_day[k] = None
+                state = None
+            self._set_cell_state(k, state)
+        
+        # Ẩn tuần thứ 6 khi tháng chỉ trải trên 5 tuần (hoặc 4)
+        weeks = (weekday + days_in_month + 6) // 7
+        for k in range(28, 42):
+            if k // 7 < weeks:
+                self.calendar_cells[k].grid()
+            else:
+                self.calendar_cells[k].grid_remove()
+    
+    def _set_cell_state(self, k, state):
+        """state = (chữ, đã chọn) hoặc None cho ô trống; bỏ qua nếu không đổi"""
+        if self.cell_state[k] == state:
+            return
+        self.cell_state[k] = state
+        btn = self.calendar_cells[k]
+        if state is None:
+            btn.config(text="", bg='#F0F0F0', relief='flat', state='disabled')
+        else:
+            text, is_selected = state
             # Determine color
             if is_selected:
-                bg_color = '#FF6B6B'  # Red for selected
-                fg_color = 'white'
+                btn.config(text=text, bg='#FF6B6B', fg='white', relief='raised', state='normal')  # Red for selected
             else:
-                bg_color = 'white'
-                fg_color = 'black'
-            
-            btn = tk.Button(self.calendar_frame, text=str(day),
-                          font=('Arial', 10),
-                          width=8, height=3,
-                          bg=bg_color, fg=fg_color,
-                          relief='raised',
-                          command=lambda d=day_index: self.toggle_day(d))
-            btn.grid(row=row, column=col, sticky="nsew", padx=1, pady=1)
-            
-            self.day_buttons[day_index] = btn
-            
-            col += 1
-            if col > 6:
-                col = 0
-                row += 1
-        
-        # Configure grid weights
-        for i in range(7):
-            self.calendar_frame.columnconfigure(i, weight=1)
-        for i in range(row + 1):
-            self.calendar_frame.rowconfigure(i, weight=1)
+                btn.config(text=text, bg='white', fg='black', relief='raised', state='normal')
+    
+    def on_calendar_cell(self, k):
+        if self.cell_day[k] is not None:
+            self.toggle_day(self.cell_day[k])
+    
+    def refresh_calendar_colors(self):
+        """Chỉ tô lại màu theo selected_days_set (không đổi tháng)"""
+        for k, day_index in enumerate(self.cell_day):
+            if day_index is not None:
+                self._set_cell_state(k, (self.cell_state[k][0], day_index in self.selected_days_set))
     
     def toggle_day(self, day_index):
         """Chọn/bỏ chọn ngày"""
@@ -871,11 +1434,10 @@ class HospitalScheduleApp:
         
         if day_index in self.selected_days_set:
             self.selected_days_set.remove(day_index)
-            self.day_buttons[day_index].config(bg='white', fg='black')
         else:
             self.selected_days_set.add(day_index)
-            self.day_buttons[day_index].config(bg='#FF6B6B', fg='white')
         
+        self.refresh_calendar_colors()
         self.update_dayoff_summary()
     
     def update_dayoff_summary(self):
@@ -915,15 +1477,52 @@ class HospitalScheduleApp:
         
         emp = next((e for e in self.employees if e.id == self.selected_emp_id), None)
         if emp:
+            changed_days = emp.days_off ^ self.selected_days_set
             emp.days_off = set(self.selected_days_set)
+            if changed_days:
+                # Ngày nghỉ ảnh hưởng tới chấm điểm nên kết quả đã lưu không còn đúng
+                self.schedule_scores = None
+                self.replacement_index = None
             
-            # Update tree
-            self.update_employee_list()
-            self.filter_employees()
+            # Chỉ cập nhật cột số ngày nghỉ của nhân viên này
+            self.employee_list.refresh_employee(emp.id)
             
             messagebox.showinfo("✅ Thành công",
                               f"Đã lưu {len(self.selected_days_set)} ngày nghỉ cho:\n"
                               f"{emp.name}")
+            
+            if self.best_schedule and changed_days and not self.is_running:
+                self.reschedule_after_dayoff_change(emp, changed_days)
+    
+    def reschedule_after_dayoff_change(self, emp, changed_days):
+        """Sửa cục bộ lịch trực hiện tại sau khi đổi ngày nghỉ (không chạy lại GA)"""
+        if not messagebox.askyesno("🔁 Cập nhật lịch trực",
+                                   f"Đã có lịch trực. Cập nhật lịch cho thay đổi ngày nghỉ của "
+                                   f"{emp.name}?\n\n"
+                                   f"Chỉ các ca của nhân viên này (và ô cần bù người) được sắp xếp lại."):
+            return
+        
+        try:
+            self.root.config(cursor="watch")
+            self.root.update_idletasks()
+            
+            new_schedule, changed_cells = ga_module.reschedule_incremental(
+                self.best_schedule.schedule, self.employees, self.dept_to_rooms, self.shifts, self.days,
+                [emp.id], changed_days, carry_in=self.carry_in)
+            self.set_best_schedule(new_schedule)
+            
+            lines = [f"   • Ngày {d + 1}, ca {s_name}, {room}" for d, s_name, room in changed_cells[:10]]
+            if len(changed_cells) > 10:
+                lines.append(f"   ... và {len(changed_cells) - 10} ca khác")
+            
+            self.log_console(f"🔁 Cập nhật lịch sau khi đổi ngày nghỉ của {emp.name}: "
+                             f"{len(changed_cells)} ca thay đổi\n", 'info')
+            messagebox.showinfo("✅ Đã cập nhật lịch trực",
+                               f"Số ca thay đổi: {len(changed_cells)}\n\n" + "\n".join(lines))
+        except Exception as e:
+            messagebox.showerror("❌ Lỗi", f"Không thể cập nhật lịch trực:\n\n{str(e)}")
+        finally:
+            self.root.config(cursor="")
     
     def clear_all_dayoffs(self):
         """Xóa tất cả ngày nghỉ đã chọn"""
@@ -935,7 +1534,7 @@ class HospitalScheduleApp:
         if messagebox.askyesno("⚠️ Xác nhận",
                               "Xóa tất cả ngày nghỉ đã chọn?"):
             self.selected_days_set.clear()
-            self.draw_calendar()
+            self.refresh_calendar_colors()
             self.update_dayoff_summary()
     
     def show_dayoff_stats(self):
@@ -979,6 +1578,39 @@ class HospitalScheduleApp:
         
         messagebox.showinfo("📊 Thống kê ngày nghỉ", stats_text)
     
+    def import_leave(self):
+        """Nhập ngày nghỉ của nhiều nhân viên từ bảng (employee_id, date)"""
+        if not self.employees:
+            messagebox.showwarning("⚠️ Cảnh báo", "Chưa có dữ liệu nhân viên!")
+            return
+        
+        filename = filedialog.askopenfilename(
+            filetypes=[("CSV/Excel", "*.csv *.xlsx *.xls"), ("All files", "*.*")],
+            title="Nhập ngày nghỉ (employee_id, date)"
+        )
+        if not filename:
+            return
+        
+        # Ngày dạng lịch được tính theo tháng đang hiển thị, như khi bấm chọn trên lịch
+        start_date = ga_module.SCHEDULE_START_DATE or self.current_date.replace(day=1).date()
+        try:
+            count, errors = ga_module.import_leave(filename, self.employees, self.days, start_date)
+        except Exception as e:
+            messagebox.showerror("❌ Lỗi", f"Không thể đọc file!\n\nChi tiết: {str(e)}")
+            return
+        
+        self.schedule_scores = None
+        self.replacement_index = None
+        self.update_employee_list()
+        if self.selected_emp_id is not None:
+            emp = next((e for e in self.employees if e.id == self.selected_emp_id), None)
+            if emp:
+                self.select_employee(emp)
+        
+        summary = self.report_import_errors("Ngày nghỉ", errors)
+        messagebox.showinfo("✅ Thành công",
+                          f"Đã nhập {count} ngày nghỉ từ:\n{filename}{summary}")
+    
     def setup_tab3_run(self):
         """Tab 3: Chạy và theo dõi"""
         # Main container
@@ -1010,6 +1642,71 @@ class HospitalScheduleApp:
                                        width=15)
         self.clear_button.pack(side="left", padx=5)
         
+        ttk.Button(btn_row1, text="🔎 Phân tích khả thi",
+                  command=self.show_feasibility,
+                  width=20).pack(side="left", padx=5)
+        
+        self.log_mirror_button = ttk.Button(btn_row1, text="📝 Ghi log ra file",
+                                            command=self.toggle_log_mirror,
+                                            width=20)
+        self.log_mirror_button.pack(side="left", padx=5)
+        
+        # Warm start row
+        btn_row2 = ttk.Frame(control_frame)
+        btn_row2.pack(fill="x", pady=5)
+        
+        ttk.Button(btn_row2, text="📂 Nạp lịch kỳ trước",
+                  command=self.choose_warm_start,
+                  width=20).pack(side="left", padx=5)
+        
+        ttk.Button(btn_row2, text="✖ Bỏ lịch kỳ trước",
+                  command=self.clear_warm_start,
+                  width=20).pack(side="left", padx=5)
+        
+        self.warm_start_label = ttk.Label(btn_row2,
+                                          text="Khởi tạo: ngẫu nhiên (create_individual)",
+                                          font=('Arial', 9), foreground='gray')
+        self.warm_start_label.pack(side="left", padx=10)
+        
+        # Termination row: để trống = không dùng điều kiện đó
+        stop_row = ttk.Frame(control_frame)
+        stop_row.pack(fill="x", pady=5)
+        
+        ttk.Label(stop_row, text="⏱️ Dừng khi:", font=('Arial', 9, 'bold')).pack(side="left", padx=(5, 10))
+        
+        self.termination_vars = {}
+        for key, label in (('time_limit', "Quá (giây)"),
+                           ('target_soft', "Phạt mềm ≤ (khi đạt cận dưới cứng)"),
+                           ('patience_generations', "Không cải thiện (thế hệ)"),
+                           ('patience_seconds', "Không cải thiện (giây)")):
+            ttk.Label(stop_row, text=label + ":", font=('Arial', 9)).pack(side="left", padx=(10, 3))
+            var = tk.StringVar()
+            ttk.Entry(stop_row, textvariable=var, width=8, font=('Arial', 9)).pack(side="left")
+            self.termination_vars[key] = var
+        
+        self.stop_at_bound_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(stop_row, text="Đạt cận dưới vi phạm cứng",
+                       variable=self.stop_at_bound_var).pack(side="left", padx=(10, 3))
+        
+        # Profile row: cProfile + stack mẫu (flame graph) + snapshot tracemalloc
+        profile_row = ttk.Frame(control_frame)
+        profile_row.pack(fill="x", pady=5)
+        
+        self.profile_run_var = tk.BooleanVar(value=ga_module.PROFILE_RUN)
+        ttk.Checkbutton(profile_row, text="🔬 Profile lần chạy này (.pstats + .collapsed)",
+                       variable=self.profile_run_var).pack(side="left", padx=5)
+        
+        self.phase_timing_var = tk.BooleanVar(value=ga_module.PROFILE_GA)
+        ttk.Checkbutton(profile_row, text="⏲ Đo thời gian từng pha GA",
+                       variable=self.phase_timing_var).pack(side="left", padx=5)
+        
+        ttk.Label(profile_row, text="Snapshot bộ nhớ ở thế hệ (vd 1,50,100):",
+                 font=('Arial', 9)).pack(side="left", padx=(10, 3))
+        self.snapshot_gens_var = tk.StringVar(
+            value=",".join(map(str, ga_module.PROFILE_SNAPSHOT_GENERATIONS)))
+        ttk.Entry(profile_row, textvariable=self.snapshot_gens_var, width=15,
+                 font=('Arial', 9)).pack(side="left")
+        
         # Progress bar and status
         status_frame = ttk.Frame(control_frame)
         status_frame.pack(fill="x", pady=5)
@@ -1040,6 +1737,10 @@ class HospitalScheduleApp:
         self.time_label = ttk.Label(stats_frame, text="Thời gian: 0s", font=('Arial', 9))
         self.time_label.pack(side="left", padx=10)
         
+        # Thời gian theo pha của GA (GAProfiler), cập nhật mỗi thế hệ
+        self.profile_label = ttk.Label(stats_frame, text="", font=('Arial', 9), foreground='gray')
+        self.profile_label.pack(side="left", padx=10)
+        
         # ===== MAIN CONTENT: Console + Chart =====
         content_paned = ttk.PanedWindow(main_frame, orient=tk.VERTICAL)
         content_paned.pack(fill="both", expand=True)
@@ -1067,21 +1768,14 @@ class HospitalScheduleApp:
         self.console_text.tag_config('error', foreground='#F44336')
         self.console_text.tag_config('header', foreground='#FFD700', font=('Consolas', 9, 'bold'))
         
-        # Chart panel
-        chart_frame = ttk.LabelFrame(content_paned, text="📊 Biểu đồ hội tụ")
-        content_paned.add(chart_frame, weight=1)
-        
-        # Create matplotlib figure
-        self.fig = Figure(figsize=(8, 4), dpi=100, facecolor='white')
-        self.ax = self.fig.add_subplot(111)
-        self.ax.set_xlabel("Thế hệ (Generation)", fontsize=10)
-        self.ax.set_ylabel("Fitness (Penalty)", fontsize=10)
-        self.ax.set_title("Quá trình hội tụ của thuật toán GA", fontsize=12, fontweight='bold')
-        self.ax.grid(True, alpha=0.3)
-        
-        # Canvas for matplotlib
-        self.canvas = FigureCanvasTkAgg(self.fig, chart_frame)
-        self.canvas.get_tk_widget().pack(fill="both", expand=True, padx=5, pady=5)
+        # Chart panel: biểu đồ matplotlib được tạo khi chạy GA lần đầu (build_chart)
+        self.chart_frame = ttk.LabelFrame(content_paned, text="📊 Biểu đồ hội tụ")
+        content_paned.add(self.chart_frame, weight=1)
+        self.chart = None
+        self.chart_placeholder = ttk.Label(self.chart_frame,
+                                           text="Biểu đồ hội tụ sẽ hiển thị khi bắt đầu chạy GA",
+                                           font=('Arial', 10), foreground='gray')
+        self.chart_placeholder.pack(expand=True)
         
         # Initial message
         self.log_console("🎯 Hệ thống sẵn sàng. Nhấn 'Bắt đầu chạy' để khởi động thuật toán GA.\n", 'info')
@@ -1089,13 +1783,137 @@ class HospitalScheduleApp:
     
     def log_console(self, text, tag='info'):
         """Ghi log vào console với màu sắc"""
-        self.output_queue.put(('console', text, tag))
+        self.console_buffer.append((text, tag))
+        if self.log_mirror is not None:
+            self.log_mirror.write(text)
+    
+    def flush_console(self):
+        """Ghi các log đang chờ vào console: gộp theo tag, cắt bớt dòng cũ, cuộn 1 lần"""
+        if not self.console_buffer:
+            return 0
+        
+        count = 0
+        runs = []
+        while self.console_buffer:
+            text, tag = self.console_buffer.popleft()
+            count += 1
+            if runs and runs[-1][1] == tag:
+                runs[-1][0].append(text)
+            else:
+                runs.append(([text], tag))
+        
+        for texts, tag in runs:
+            self.console_text.insert(tk.END, "".join(texts), tag)
+        
+        lines = int(self.console_text.index('end-1c').split('.')[0])
+        if lines > CONSOLE_MAX_LINES:
+            self.console_text.delete('1.0', f"{lines - CONSOLE_MAX_LINES + 1}.0")
+        self.console_text.see(tk.END)
+        return count
+    
+    def toggle_log_mirror(self):
+        """Bật/tắt ghi toàn bộ log ra file"""
+        if self.log_mirror is not None:
+            self.log_mirror.close()
+            self.log_console(f"📝 Đã dừng ghi log ra file: {self.log_mirror.filename}\n", 'info')
+            self.log_mirror = None
+            self.log_mirror_button.config(text="📝 Ghi log ra file")
+            return
+        
+        filename = filedialog.asksaveasfilename(
+            defaultextension=".log",
+            filetypes=[("Log files", "*.log"), ("Text files", "*.txt")],
+            initialfile="hospital_schedule.log"
+        )
+        if not filename:
+            return
+        
+        try:
+            self.log_mirror = LogFileMirror(filename)
+        except OSError as e:
+            messagebox.showerror("❌ Lỗi", f"Không thể mở file log:\n\n{str(e)}")
+            return
+        self.log_mirror_button.config(text="⏹ Dừng ghi log")
+        self.log_console(f"📝 Đang ghi log ra file: {filename}\n", 'info')
+    
+    def on_close(self):
+        """Đóng ứng dụng: dừng tiến trình GA, hủy các công việc xuất file và ghi nốt log"""
+        if self.stop_event is not None:
+            self.stop_event.set()
+        for job in self.export_jobs.values():
+            job['cancel'].set()
+        if self.log_mirror is not None:
+            self.log_mirror.close()
+        self.root.destroy()
     
     def clear_console(self):
         """Xóa nội dung console"""
         self.console_text.delete(1.0, tk.END)
         self.log_console("Console đã được xóa.\n\n", 'info')
     
+    def choose_warm_start(self):
+        """Chọn file lịch kỳ trước (.json hoặc lich_truc_benh_vien.xlsx)"""
+        filename = filedialog.askopenfilename(
+            filetypes=[("Lịch trực", "*.json *.xlsx"), ("All files", "*.*")],
+            title="Nạp lịch kỳ trước"
+        )
+        
+        if filename:
+            self.warm_start_file = filename
+            self.warm_start_label.config(text=f"Khởi tạo từ: {os.path.basename(filename)}",
+                                         foreground='blue')
+    
+    def clear_warm_start(self):
+        """Quay về khởi tạo ngẫu nhiên"""
+        self.warm_start_file = None
+        self.warm_start_label.config(text="Khởi tạo: ngẫu nhiên (create_individual)",
+                                     foreground='gray')
+    
+    def log_feasibility(self, report):
+        """Ghi kết quả phân tích khả thi ra console"""
+        self.log_console("🔎 PHÂN TÍCH KHẢ THI\n", 'header')
+        if report['feasible']:
+            self.log_console("   ✅ Có thể đạt 0 vi phạm ràng buộc cứng\n", 'success')
+        else:
+            self.log_console(f"   ❌ Không thể tránh vi phạm cứng: cận dưới = "
+                             f"{report['hard_lower_bound']:,.0f} "
+                             f"({len(report['cells'])} khoa-ngày thiếu người)\n", 'error')
+            for c in report['cells'][:10]:
+                self.log_console(f"      • {c['dept']}, ngày {c['day']}: {c['doctors']} BS, "
+                                 f"{c['nurses']} DD, {c['seniors']} senior còn rảnh\n", 'error')
+        
+        self.log_console(f"   Mỗi người trực tối đa {report['max_shifts_per_day']} ca/ngày "
+                         f"để đủ thời gian nghỉ\n", 'info')
+        if report['capacity']:
+            self.log_console(f"   ⚠️ Thiếu năng lực (phải vi phạm ràng buộc mềm): "
+                             f"{len(report['capacity'])} mục\n", 'warning')
+            for c in report['capacity'][:10]:
+                unit = "ca" if c['kind'] == 'rest' else "giờ"
+                self.log_console(f"      • {c['dept']}, {c['period']}, {c['role']}: cần "
+                                 f"{c['required']} {unit}, tối đa {c['capacity']} {unit}\n", 'warning')
+        self.log_console("\n")
+    
+    def show_feasibility(self):
+        """Phân tích khả thi mà không chạy GA"""
+        if not self.employees:
+            messagebox.showerror("❌ Lỗi",
+                               "Chưa có dữ liệu nhân viên!\n\n"
+                               "Vui lòng tạo dữ liệu mẫu ở tab Cấu hình trước.")
+            return
+        
+        report = ga_module.analyze_feasibility(self.employees, self.dept_to_rooms,
+                                               self.shifts, self.days)
+        self.log_feasibility(report)
+        if report['feasible'] and not report['capacity']:
+            messagebox.showinfo("🔎 Phân tích khả thi",
+                              "Dữ liệu khả thi: có thể đạt 0 vi phạm cứng và đủ năng lực.")
+        else:
+            messagebox.showwarning("🔎 Phân tích khả thi",
+                                 f"Cận dưới vi phạm cứng: {report['hard_lower_bound']:,.0f}\n"
+                                 f"Khoa-ngày thiếu người: {len(report['cells'])}\n"
+                                 f"Mục thiếu năng lực: {len(report['capacity'])}\n\n"
+                                 f"Xem chi tiết ở console.")
+    
     def start_ga(self):
         """Bắt đầu chạy GA"""
         # Validate data
@@ -1110,8 +1928,49 @@ class HospitalScheduleApp:
                                   "Thuật toán đang chạy!")
             return
         
+        # Điều kiện dừng
+        try:
+            self.termination = {}
+            for key, var in self.termination_vars.items():
+                value = var.get().strip()
+                if key == 'patience_generations':
+                    self.termination[key] = int(value) if value else None
+                else:
+                    self.termination[key] = float(value) if value else None
+        except ValueError as e:
+            messagebox.showerror("❌ Lỗi",
+                               f"Điều kiện dừng không hợp lệ!\n\n"
+                               f"Chi tiết: {str(e)}")
+            return
+        
+        # Profile lần chạy: file ghi vào PROFILE_DIR (tính từ thư mục làm việc)
+        self.run_profile = None
+        if self.profile_run_var.get():
+            try:
+                gens = [int(g) for g in self.snapshot_gens_var.get().split(",") if g.strip()]
+            except ValueError as e:
+                messagebox.showerror("❌ Lỗi",
+                                   f"Danh sách thế hệ snapshot không hợp lệ!\n\n"
+                                   f"Chi tiết: {str(e)}")
+                return
+            self.run_profile = {'out_dir': os.path.abspath(ga_module.PROFILE_DIR),
+                                'snapshot_generations': gens}
+        
+        # Phân tích khả thi trước khi chạy
+        report = ga_module.analyze_feasibility(self.employees, self.dept_to_rooms,
+                                               self.shifts, self.days)
+        self.termination['hard_floor'] = report['hard_lower_bound']
+        self.termination['stop_at_hard_floor'] = self.stop_at_bound_var.get()
+        
+        warning = ""
+        if not report['feasible']:
+            warning = (f"⚠️ Không thể đạt 0 vi phạm cứng!\n"
+                       f"  • Cận dưới: {report['hard_lower_bound']:,.0f}\n"
+                       f"  • Khoa-ngày thiếu người: {len(report['cells'])}\n\n")
+        
         # Confirm
         if not messagebox.askyesno("🚀 Xác nhận",
+                                   f"{warning}"
                                    f"Bắt đầu chạy thuật toán GA?\n\n"
                                    f"Cấu hình:\n"
                                    f"  • Số thế hệ: {self.config['GENERATIONS']}\n"
@@ -1121,10 +1980,14 @@ class HospitalScheduleApp:
                                    f"Quá trình này có thể mất vài phút..."):
             return
         
+        self.log_feasibility(report)
+        
         # Reset
         self.is_running = True
         self.history = []
-        self.best_schedule = None
+        self.profile = ga_module.GAProfiler()
+        self.profile_label.config(text="")
+        self.set_best_schedule(None)
         
         # Update UI
         self.run_button.config(state="disabled")
@@ -1133,198 +1996,230 @@ class HospitalScheduleApp:
         self.progress_var.set(0)
         
         # Clear chart
-        self.ax.clear()
-        self.ax.set_xlabel("Thế hệ (Generation)", fontsize=10)
-        self.ax.set_ylabel("Fitness (Penalty)", fontsize=10)
-        self.ax.set_title("Quá trình hội tụ của thuật toán GA", fontsize=12, fontweight='bold')
-        self.ax.grid(True, alpha=0.3)
-        self.canvas.draw()
-        
-        # Start thread
-        thread = threading.Thread(target=self.run_ga_algorithm, daemon=True)
-        thread.start()
+        if self.chart is None:
+            self.build_chart()
+        self.chart.reset()
+        
+        # Tiến trình con chạy GA, GUI chỉ đọc thông điệp từ Pipe trong check_queue
+        policy = ga_module.TerminationPolicy(**self.termination)
+        self.log_run_config(policy)
+        self.carry_in = None
+        
+        self.ga_conn, child_conn = multiprocessing.Pipe(duplex=False)
+        self.stop_event = multiprocessing.Event()
+        self.ga_process = multiprocessing.Process(
+            target=ga_module.ga_worker,
+            args=(child_conn, self.stop_event, self.employees, self.dept_to_rooms,
+                  self.shifts, self.days, dict(self.config, PROFILE_GA=self.phase_timing_var.get()),
+                  self.termination, self.warm_start_file, self.run_profile),
+            daemon=True)
+        self.ga_process.start()
+        child_conn.close()
     
     def stop_ga(self):
         """Dừng GA"""
         if messagebox.askyesno("⚠️ Xác nhận",
                               "Dừng thuật toán?\n\n"
-                              "Tiến trình hiện tại sẽ bị hủy."):
-            self.is_running = False
-            self.run_button.config(state="normal")
+                              "Lịch tốt nhất tìm được đến lúc dừng sẽ được giữ lại."):
+            if self.stop_event is not None:
+                self.stop_event.set()
             self.stop_button.config(state="disabled")
-            self.status_label.config(text="Trạng thái: Đã dừng", foreground='orange')
+            self.status_label.config(text="Trạng thái: Đang dừng...", foreground='orange')
             self.log_console("\n⏸️ Người dùng đã dừng thuật toán.\n\n", 'warning')
     
-    def run_ga_algorithm(self):
-        """Chạy thuật toán GA trong thread riêng"""
-        import time
-        start_time = time.time()
+    def log_run_config(self, policy):
+        """Ghi cấu hình lần chạy ra console"""
+        self.log_console("=" * 80 + "\n", 'header')
+        self.log_console("🚀 BẮT ĐẦU CHẠY THUẬT TOÁN DI TRUYỀN (GA)\n", 'header')
+        self.log_console("=" * 80 + "\n\n", 'header')
+        
+        self.log_console(f"📋 Thông tin cấu hình:\n", 'info')
+        self.log_console(f"   • Số thế hệ: {self.config['GENERATIONS']}\n", 'info')
+        self.log_console(f"   • Kích thước quần thể: {self.config['POPULATION_SIZE']}\n", 'info')
+        self.log_console(f"   • Số nhân viên: {len(self.employees)}\n", 'info')
+        self.log_console(f"   • Số ngày lập lịch: {self.config['NUM_DAYS']}\n\n", 'info')
+        
+        if policy.time_limit is not None:
+            self.log_console(f"   • Giới hạn thời gian: {policy.time_limit:g}s\n", 'info')
+        if policy.target_soft is not None:
+            self.log_console(f"   • Dừng khi đạt cận dưới cứng và phạt mềm ≤ {policy.target_soft:,.0f}\n", 'info')
+        if policy.patience_generations is not None:
+            self.log_console(f"   • Dừng sau {policy.patience_generations} thế hệ không cải thiện\n", 'info')
+        if policy.patience_seconds is not None:
+            self.log_console(f"   • Dừng sau {policy.patience_seconds:g}s không cải thiện\n", 'info')
+        if policy.stop_at_hard_floor:
+            self.log_console(f"   • Dừng khi vi phạm cứng đạt cận dưới {policy.hard_floor:,.0f}\n", 'info')
+        
+        if self.run_profile:
+            gens = self.run_profile['snapshot_generations']
+            self.log_console(f"   • Profile lần chạy → {self.run_profile['out_dir']}"
+                             + (f" (snapshot bộ nhớ ở thế hệ {', '.join(map(str, gens))})" if gens else "")
+                             + "\n", 'info')
+        
+        self.log_console("🧬 Đang tạo quần thể ban đầu...\n", 'info')
+        if self.warm_start_file:
+            self.log_console(f"   Khởi tạo từ lịch kỳ trước: {os.path.basename(self.warm_start_file)}\n", 'info')
+    
+    def poll_ga_process(self):
+        """Đọc các thông điệp tiến trình GA đã gửi (chạy trong vòng lặp Tk)"""
+        if self.ga_conn is None:
+            return
         
         try:
-            self.log_console("=" * 80 + "\n", 'header')
-            self.log_console("🚀 BẮT ĐẦU CHẠY THUẬT TOÁN DI TRUYỀN (GA)\n", 'header')
-            self.log_console("=" * 80 + "\n\n", 'header')
-            
-            self.log_console(f"📋 Thông tin cấu hình:\n", 'info')
-            self.log_console(f"   • Số thế hệ: {self.config['GENERATIONS']}\n", 'info')
-            self.log_console(f"   • Kích thước quần thể: {self.config['POPULATION_SIZE']}\n", 'info')
-            self.log_console(f"   • Số nhân viên: {len(self.employees)}\n", 'info')
-            self.log_console(f"   • Số ngày lập lịch: {self.config['NUM_DAYS']}\n\n", 'info')
+            while self.ga_conn is not None and self.ga_conn.poll():
+                self.handle_ga_message(self.ga_conn.recv())
+        except (EOFError, OSError):
+            # Tiến trình con kết thúc mà không gửi kết quả
+            self.handle_ga_message(('error', "Tiến trình GA kết thúc bất thường"))
+    
+    def handle_ga_message(self, msg):
+        """Xử lý 1 thông điệp từ ga_module.ga_worker"""
+        msg_type = msg[0]
+        generations = int(self.config['GENERATIONS'])
+        
+        if msg_type == 'population':
+            _, created, total = msg
+            self.log_console(f"   Đã tạo {created}/{total} cá thể\n", 'info')
+            if created == total:
+                self.log_console("✅ Hoàn thành tạo quần thể!\n\n", 'success')
+                self.log_console("🔄 Bắt đầu tiến hóa...\n\n", 'info')
+        
+        elif msg_type == 'generation':
+            record = msg[1]
+            gen = record['gen']
+            fit = record['fit']
+            elapsed = record['elapsed']
+            self.history.append(fit)
+            self.chart.append(fit)
             
-            # Tạo quần thể ban đầu
-            self.log_console("🧬 Đang tạo quần thể ban đầu...\n", 'info')
-            population = []
-            pop_size = int(self.config['POPULATION_SIZE'])
-            for i in range(pop_size):
-                if not self.is_running:
-                    return
-                ind = ga_module.create_individual(self.employees, self.dept_to_rooms,
-                                                  self.shifts, self.days)
-                population.append(ind)
-                if (i + 1) % 20 == 0:
-                    self.log_console(f"   Đã tạo {i + 1}/{pop_size} cá thể\n", 'info')
+            if record['hill_climb']:
+                self.log_console(f"   🔧 Hill Climbing triggered at Gen {gen + 1}\n", 'warning')
             
-            self.log_console("✅ Hoàn thành tạo quần thể!\n\n", 'success')
+            if 'profile' in record:
+                self.profile.merge(record['profile'])
+                self.profile_label.config(text=f"⏲ {self.profile.summary()}")
             
-            best_fit = float("inf")
-            stagnation = 0
+            # Log progress
+            if gen % 10 == 0 or gen == generations - 1:
+                self.log_console(
+                    f"Gen {gen + 1:3d}/{generations} | "
+                    f"Fitness = {fit:,.0f} | "
+                    f"Time: {elapsed:.1f}s\n",
+                    'info'
+                )
             
-            self.log_console("🔄 Bắt đầu tiến hóa...\n\n", 'info')
+            # Update UI: tiến độ theo thế hệ hoặc theo thời gian, lấy giá trị lớn hơn
+            progress = ((gen + 1) / generations) * 100
+            time_limit = self.termination.get('time_limit')
+            if time_limit:
+                progress = max(progress, elapsed / time_limit * 100)
+            self.output_queue.put(('progress', min(progress, 100), gen + 1, record['best_fit'], elapsed))
             
-            # Main GA loop
-            generations = int(self.config['GENERATIONS'])
-            for gen in range(generations):
-                if not self.is_running:
-                    self.log_console("\n⏸️ Thuật toán đã bị dừng.\n", 'warning')
-                    return
-                
-                # Evaluate fitness
-                scored = []
-                for ind in population:
-                    fit = ga_module.fitness(ind, self.employees, self.dept_to_rooms,
-                                           self.shifts, self.days)
-                    scored.append((fit, ind))
-                scored.sort(key=lambda x: x[0])
-                
-                # Get best
-                best = scored[0][1]
-                fit = scored[0][0]
-                
-                self.history.append(fit)
-                
-                # Log progress
-                if gen % 10 == 0 or gen == generations - 1:
-                    elapsed = time.time() - start_time
-                    self.log_console(
-                        f"Gen {gen + 1:3d}/{generations} | "
-                        f"Fitness = {fit:,.0f} | "
-                        f"Time: {elapsed:.1f}s\n",
-                        'info'
-                    )
-                
-                # Update UI
-                progress = ((gen + 1) / generations) * 100
-                self.output_queue.put(('progress', progress, gen + 1, fit, elapsed))
-                
-                # Update chart every 5 generations
-                if gen % 5 == 0 or gen == generations - 1:
-                    self.output_queue.put(('chart', None))
-                
-                # Check improvement
-                if fit < best_fit:
-                    best_fit = fit
-                    stagnation = 0
-                    self.best_schedule = copy.deepcopy(best)
-                else:
-                    stagnation += 1
-                
-                # Hill climbing if stagnated
-                stagnation_limit = int(self.config['STAGNATION_LIMIT'])
-                if stagnation >= stagnation_limit:
-                    self.log_console(f"   🔧 Hill Climbing triggered at Gen {gen + 1}\n", 'warning')
-                    best = ga_module.hill_climb(best, self.employees, self.dept_to_rooms,
-                                                self.shifts, self.days,
-                                                self.config['HILL_CLIMB_STEPS'])
-                    stagnation = 0
-                
-                # Create new population
-                new_pop = [copy.deepcopy(scored[i][1]) for i in range(self.config['ELITE_SIZE'])]
-                
-                while len(new_pop) < self.config['POPULATION_SIZE']:
-                    p1 = ga_module.tournament_selection(scored)
-                    p2 = ga_module.tournament_selection(scored)
-                    child = ga_module.crossover_uniform(p1, p2, self.employees, self.dept_to_rooms)
-                    child = ga_module.mutate_scramble(child, self.employees, self.dept_to_rooms,
-                                                      self.shifts, self.days,
-                                                      self.config['MUTATION_RATE'])
-                    child = ga_module.mutate_balance_hours(child, self.employees, self.dept_to_rooms,
-                                                          self.shifts, self.days, 0.3)
-                    new_pop.append(child)
-                
-                population = new_pop
-            
-            # Kết thúc
-            if self.is_running:
-                elapsed = time.time() - start_time
-                
-                self.log_console("\n" + "=" * 80 + "\n", 'header')
-                self.log_console("✅ HOÀN THÀNH THUẬT TOÁN!\n", 'success')
-                self.log_console("=" * 80 + "\n\n", 'header')
-                
-                self.log_console(f"📊 Kết quả:\n", 'success')
-                self.log_console(f"   • Fitness tốt nhất: {best_fit:,.0f}\n", 'success')
-                self.log_console(f"   • Thời gian chạy: {elapsed:.1f}s ({elapsed/60:.1f} phút)\n", 'success')
-                self.log_console(f"   • Số thế hệ: {generations}\n\n", 'success')
-                
-                # Convert schedule to dashboard format
-                self.best_schedule = self.convert_schedule_format(self.best_schedule)
-                
-                # Kiểm tra ràng buộc
-                self.log_console("🔍 Đang kiểm tra ràng buộc...\n", 'info')
-                hard_violations, soft_violations, soft_metrics, soft_stats = \
-                    ga_module.check_constraints_detailed(best, self.employees,
-                                                        self.dept_to_rooms, self.shifts, self.days)
-                
-                total_hard = sum(len(v) for v in hard_violations.values())
-                total_soft = sum(len(v) for v in soft_violations.values())
-                
-                self.log_console(f"\n📈 Thống kê vi phạm:\n", 'info')
-                if total_hard == 0:
-                    self.log_console(f"   ✅ Vi phạm ràng buộc cứng: 0 (HOÀN HẢO!)\n", 'success')
-                else:
-                    self.log_console(f"   ⚠️ Vi phạm ràng buộc cứng: {total_hard}\n", 'warning')
-                
-                self.log_console(f"   📊 Vi phạm ràng buộc mềm: {total_soft}\n", 'info')
-                self.log_console(f"   ⏰ Giờ làm trung bình: {soft_metrics['avg_hours']:.1f}h\n", 'info')
-                self.log_console(f"   📅 Số ca trực trung bình: {soft_metrics['avg_shifts']:.1f} ca\n\n", 'info')
-                
-                self.log_console("🎉 Bạn có thể xem kết quả chi tiết ở tab Dashboard!\n", 'success')
-                
-                self.output_queue.put(('complete', elapsed, best_fit))
+            # Update chart every 5 generations
+            if gen % 5 == 0 or gen == generations - 1:
+                self.output_queue.put(('chart', None))
+        
+        elif msg_type == 'profile':
+            self.log_console("\n🔬 Đã ghi profile:\n", 'success')
+            for path in msg[1]:
+                self.log_console(f"   {path}\n", 'info')
+        
+        elif msg_type == 'result':
+            _, schedule_dict, best_fit, history, reason, carry_in, elapsed = msg
+            self.finish_ga_process()
+            self.show_ga_result(schedule_dict, best_fit, history, reason, carry_in, elapsed)
+        
+        elif msg_type == 'error':
+            self.finish_ga_process()
+            self.log_console(f"\n❌ LỖI: {msg[1]}\n\n", 'error')
+            self.output_queue.put(('error', msg[1]))
+    
+    def finish_ga_process(self):
+        """Đóng Pipe, chờ tiến trình con và trả lại trạng thái nút bấm"""
+        if self.ga_conn is not None:
+            self.ga_conn.close()
+            self.ga_conn = None
+        if self.ga_process is not None:
+            self.ga_process.join(timeout=1)
+            self.ga_process = None
+        self.stop_event = None
+        self.is_running = False
+        self.run_button.config(state="normal")
+        self.stop_button.config(state="disabled")
+    
+    def show_ga_result(self, schedule_dict, best_fit, history, reason, carry_in, elapsed):
+        """Nhận lịch tốt nhất từ tiến trình GA, kiểm tra ràng buộc và ghi kết quả"""
+        if schedule_dict is None:
+            self.log_console("\n⏸️ Thuật toán đã bị dừng.\n", 'warning')
+            self.status_label.config(text="Trạng thái: Đã dừng", foreground='orange')
+            return
         
-        except Exception as e:
-            self.log_console(f"\n❌ LỖI: {str(e)}\n", 'error')
-            self.log_console(f"Chi tiết: {type(e).__name__}\n\n", 'error')
-            self.output_queue.put(('error', str(e)))
+        generations = int(self.config['GENERATIONS'])
+        best_schedule = ga_module.schedule_from_dict(schedule_dict)
+        self.carry_in = carry_in
         
-        finally:
-            self.is_running = False
-            self.run_button.config(state="normal")
-            self.stop_button.config(state="disabled")
+        if reason == 'stopped':
+            self.log_console("\n⏸️ Thuật toán đã bị dừng. Giữ lại lịch tốt nhất hiện có.\n\n", 'warning')
+            self.status_label.config(text="Trạng thái: Đã dừng", foreground='orange')
+        else:
+            self.log_console("\n" + "=" * 80 + "\n", 'header')
+            self.log_console("✅ HOÀN THÀNH THUẬT TOÁN!\n", 'success')
+            self.log_console("=" * 80 + "\n\n", 'header')
+        
+        self.log_console(f"📊 Kết quả:\n", 'success')
+        self.log_console(f"   • Fitness tốt nhất: {best_fit:,.0f}\n", 'success')
+        self.log_console(f"   • Thời gian chạy: {elapsed:.1f}s ({elapsed/60:.1f} phút)\n", 'success')
+        self.log_console(f"   • Số thế hệ: {len(history)}/{generations}\n", 'success')
+        self.log_console(f"   • Lý do dừng: {ga_module.STOP_REASONS[reason]}\n\n", 'success')
+        
+        if self.profile is not None and self.profile.generations:
+            self.log_console(self.profile.report(elapsed) + "\n\n", 'info')
+        
+        # Kiểm tra ràng buộc
+        self.log_console("🔍 Đang kiểm tra ràng buộc...\n", 'info')
+        hard_violations, soft_violations, soft_metrics, soft_stats = \
+            ga_module.check_constraints_detailed(best_schedule, self.employees,
+                                                self.dept_to_rooms, self.shifts, self.days,
+                                                self.carry_in)
+        
+        # Giữ kết quả chấm điểm cho dashboard
+        self.set_best_schedule(best_schedule, scores={
+            'hard_violations': hard_violations,
+            'soft_violations': soft_violations,
+            'soft_metrics': soft_metrics,
+            'fitness': best_fit
+        })
+        
+        total_hard = sum(len(v) for v in hard_violations.values())
+        total_soft = sum(len(v) for v in soft_violations.values())
+        
+        self.log_console(f"\n📈 Thống kê vi phạm:\n", 'info')
+        if total_hard == 0:
+            self.log_console(f"   ✅ Vi phạm ràng buộc cứng: 0 (HOÀN HẢO!)\n", 'success')
+        else:
+            self.log_console(f"   ⚠️ Vi phạm ràng buộc cứng: {total_hard}\n", 'warning')
+        
+        self.log_console(f"   📊 Vi phạm ràng buộc mềm: {total_soft}\n", 'info')
+        self.log_console(f"   ⏰ Giờ làm trung bình: {soft_metrics['avg_hours']:.1f}h\n", 'info')
+        self.log_console(f"   📅 Số ca trực trung bình: {soft_metrics['avg_shifts']:.1f} ca\n\n", 'info')
+        
+        self.log_console("🎉 Bạn có thể xem kết quả chi tiết ở tab Dashboard!\n", 'success')
+        
+        if reason != 'stopped':
+            self.output_queue.put(('complete', elapsed, best_fit))
     
     def check_queue(self):
-        """Kiểm tra queue để cập nhật UI từ thread"""
+        """Kiểm tra queue để cập nhật UI từ tiến trình GA"""
+        self.poll_ga_process()
+        self.poll_export_jobs()
+        handled = 0
         try:
             while True:
                 msg = self.output_queue.get_nowait()
                 msg_type = msg[0]
+                handled += 1
                 
-                if msg_type == 'console':
-                    _, text, tag = msg
-                    self.console_text.insert(tk.END, text, tag)
-                    self.console_text.see(tk.END)
-                
-                elif msg_type == 'progress':
+                if msg_type == 'progress':
                     _, progress, gen, fit, elapsed = msg
                     self.progress_var.set(progress)
                     self.gen_label.config(text=f"Thế hệ: {gen}/{self.config['GENERATIONS']}")
@@ -1344,72 +2239,54 @@ class HospitalScheduleApp:
                     _, error_msg = msg
                     self.status_label.config(text=f"Trạng thái: Lỗi", foreground='red')
                     messagebox.showerror("❌ Lỗi", f"Có lỗi xảy ra:\n\n{error_msg}")
+                
+                elif msg_type == 'export':
+                    _, job_id, job = msg
+                    self.update_export_job(job_id, job)
         
         except queue.Empty:
             pass
         
         finally:
-            self.root.after(100, self.check_queue)
+            handled += self.flush_console()
+            
+            # Chu kỳ thích ứng: nhanh khi có dữ liệu, giãn dần khi rảnh
+            if handled:
+                self.poll_interval = POLL_MIN_MS
+            elif self.is_running or self.export_jobs:
+                self.poll_interval = min(max(self.poll_interval, 100), POLL_MAX_MS)
+            else:
+                self.poll_interval = min(self.poll_interval * 2, POLL_MAX_MS)
+            self.root.after(self.poll_interval, self.check_queue)
     
-    def update_chart(self):
-        """Cập nhật biểu đồ hội tụ"""
-        if not self.history:
-            return
+    def build_chart(self):
+        """Tạo biểu đồ hội tụ khi chạy GA lần đầu
         
-        self.ax.clear()
-        self.ax.plot(range(1, len(self.history) + 1), self.history,
-                    'b-', linewidth=2, label='Fitness')
+        matplotlib chỉ được import tại đây để mở ứng dụng và tiến trình con
+        (spawn import lại file này) không phải chờ nạp matplotlib.
+        """
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        from matplotlib.figure import Figure
         
-        # Thêm đường trung bình
-        if len(self.history) > 10:
-            import numpy as np
-            window = 10
-            moving_avg = np.convolve(self.history, np.ones(window)/window, mode='valid')
-            self.ax.plot(range(window, len(self.history) + 1), moving_avg,
-                        'r--', linewidth=1.5, alpha=0.7, label='Trung bình động')
+        self.chart_placeholder.destroy()
         
+        # Create matplotlib figure
+        self.fig = Figure(figsize=(8, 4), dpi=100, facecolor='white')
+        self.ax = self.fig.add_subplot(111)
         self.ax.set_xlabel("Thế hệ (Generation)", fontsize=10)
         self.ax.set_ylabel("Fitness (Penalty)", fontsize=10)
         self.ax.set_title("Quá trình hội tụ của thuật toán GA", fontsize=12, fontweight='bold')
         self.ax.grid(True, alpha=0.3)
-        self.ax.legend(loc='upper right')
-        
-        # Format y-axis với dấu phẩy
-        self.ax.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'{int(x):,}'))
         
+        # Canvas for matplotlib
+        self.canvas = FigureCanvasTkAgg(self.fig, self.chart_frame)
+        self.canvas.get_tk_widget().pack(fill="both", expand=True, padx=5, pady=5)
         self.fig.tight_layout()
-        self.canvas.draw()
-    
-    def convert_schedule_format(self, ga_schedule):
-        """Chuyển đổi schedule từ GA format sang dashboard format"""
-        # GA format: schedule[day][shift_name][room] = [emp_ids]
-        # Dashboard format: schedule[day] = [{'employee': emp, 'shift': shift, 'room': room}]
-        
-        emp_dict = {e.id: e for e in self.employees}
-        shift_dict = {s.name: s for s in self.shifts}
-        
-        # Create a simple Room class for storing room info
-        class SimpleRoom:
-            def __init__(self, name):
-                self.name = name
-        
-        converted = {}
-        for day in ga_schedule:
-            converted[day] = []
-            for shift_name in ga_schedule[day]:
-                for room_name in ga_schedule[day][shift_name]:
-                    emp_ids = ga_schedule[day][shift_name][room_name]
-                    for emp_id in emp_ids:
-                        if emp_id in emp_dict:
-                            converted[day].append({
-                                'employee': emp_dict[emp_id],
-                                'shift': shift_dict[shift_name],
-                                'room': SimpleRoom(room_name)
-                            })
-        
-        return converted
-        
-        return converted
+        self.chart = ConvergenceChart(self.ax, self.canvas)
+    
+    def update_chart(self):
+        """Cập nhật biểu đồ hội tụ"""
+        self.chart.update()
     
     def setup_tab4_dashboard(self):
         """Tab 4: Dashboard và xuất Excel"""
@@ -1477,6 +2354,36 @@ class HospitalScheduleApp:
                   command=self.export_employee_hours,
                   width=30).pack(side="left", padx=5)
         
+        ttk.Button(export_row2, text="💾 Lưu lịch (JSON)",
+                  command=self.save_schedule_json,
+                  width=20).pack(side="left", padx=5)
+        
+        # Row 4: Actions
+        action_row = ttk.Frame(control_frame)
+        action_row.pack(fill="x", pady=5)
+        
+        ttk.Button(action_row, text="🚑 Gợi ý thay ca đột xuất",
+                  command=self.open_replacement_dialog,
+                  width=30).pack(side="left", padx=5)
+        
+        # ===== EXPORT JOBS PANEL =====
+        jobs_frame = ttk.LabelFrame(main_frame, text="📤 Xuất file đang chạy", padding="5")
+        jobs_frame.pack(fill="x", pady=(0, 10))
+        
+        self.export_tree = ttk.Treeview(jobs_frame, columns=('file', 'progress', 'status'),
+                                        show='headings', height=3)
+        self.export_tree.heading('file', text='File')
+        self.export_tree.heading('progress', text='Tiến độ')
+        self.export_tree.heading('status', text='Trạng thái')
+        self.export_tree.column('file', width=400)
+        self.export_tree.column('progress', width=120, anchor='center')
+        self.export_tree.column('status', width=150, anchor='center')
+        self.export_tree.pack(side="left", fill="x", expand=True)
+        
+        ttk.Button(jobs_frame, text="⛔ Hủy xuất",
+                  command=self.cancel_export,
+                  width=15).pack(side="left", padx=5)
+        
         # ===== STATISTICS PANEL =====
         stats_frame = ttk.LabelFrame(main_frame, text="📈 Thống kê tổng quan", padding="10")
         stats_frame.pack(fill="x", pady=(0, 10))
@@ -1514,44 +2421,74 @@ class HospitalScheduleApp:
         canvas_container.pack(fill="both", expand=True)
         
         self.dashboard_canvas = tk.Canvas(canvas_container, bg='white')
+        self.dashboard_grid = ScheduleGrid(self.dashboard_canvas)
         v_scrollbar = ttk.Scrollbar(canvas_container, orient="vertical",
-                                   command=self.dashboard_canvas.yview)
+                                   command=self.dashboard_grid.yview)
         h_scrollbar = ttk.Scrollbar(canvas_container, orient="horizontal",
-                                   command=self.dashboard_canvas.xview)
+                                   command=self.dashboard_grid.xview)
         
         self.dashboard_canvas.configure(yscrollcommand=v_scrollbar.set,
-                                       xscrollcommand=h_scrollbar.set)
+                                       xscrollcommand=h_scrollbar.set,
+                                       xscrollincrement=20, yscrollincrement=20)
         
         v_scrollbar.pack(side="right", fill="y")
         h_scrollbar.pack(side="bottom", fill="x")
         self.dashboard_canvas.pack(side="left", fill="both", expand=True)
         
-        # Frame inside canvas
-        self.dashboard_inner_frame = ttk.Frame(self.dashboard_canvas)
-        self.canvas_window = self.dashboard_canvas.create_window((0, 0),
-                                                                 window=self.dashboard_inner_frame,
-                                                                 anchor="nw")
-        
-        # Configure scroll region
-        self.dashboard_inner_frame.bind('<Configure>',
-                                       lambda e: self.dashboard_canvas.configure(
-                                           scrollregion=self.dashboard_canvas.bbox("all")))
+        # Vẽ lại vùng nhìn thấy khi đổi kích thước
+        self.dashboard_canvas.bind('<Configure>', lambda e: self.dashboard_grid.render())
         
         # Mouse wheel scroll for dashboard
         def _on_dashboard_mousewheel(event):
-            self.dashboard_canvas.yview_scroll(int(-1*(event.delta/120)), "units")
+            self.dashboard_grid.scroll(dy=int(-1*(event.delta/120)))
         def _on_dashboard_h_mousewheel(event):
-            self.dashboard_canvas.xview_scroll(int(-1*(event.delta/120)), "units")
+            self.dashboard_grid.scroll(dx=int(-1*(event.delta/120)))
         
         self.dashboard_canvas.bind("<MouseWheel>", _on_dashboard_mousewheel)
         self.dashboard_canvas.bind("<Shift-MouseWheel>", _on_dashboard_h_mousewheel)
         
         # Initial message
-        ttk.Label(self.dashboard_inner_frame,
-                 text="Chưa có dữ liệu lịch trực.\n\n"
-                      "Vui lòng chạy thuật toán GA ở tab 'Chạy và theo dõi' trước.",
-                 font=('Arial', 12),
-                 foreground='gray').pack(pady=50)
+        self.dashboard_grid.show_message("Chưa có dữ liệu lịch trực.\n\n"
+                                         "Vui lòng chạy thuật toán GA ở tab 'Chạy và theo dõi' trước.")
+    
+    def set_best_schedule(self, schedule, keep_evaluator=False, scores=None):
+        """Gán lịch mới (GA format, không sao chép) và đánh dấu phiên bản mới
+        
+        Nếu schedule chính là lịch hiện tại đã được sửa tại chỗ (vd sau apply_replacement)
+        thì giữ ScheduleStore cũ và touch(), các view chỉ dựng lại khi được dùng.
+        scores: kết quả chấm điểm đã có sẵn cho đúng lịch này (xem get_schedule_scores)
+        """
+        if schedule is None:
+            self.best_schedule = None
+        elif self.best_schedule is not None and self.best_schedule.schedule is schedule:
+            self.best_schedule.touch()
+        else:
+            self.best_schedule = ga_module.ScheduleStore(schedule, self.employees,
+                                                         self.shifts, self.days)
+        self.schedule_version += 1
+        self.schedule_scores = dict(scores, version=self.schedule_version) if scores else None
+        if not keep_evaluator:
+            self.replacement_index = None
+    
+    def get_schedule_scores(self):
+        """Vi phạm và fitness của lịch hiện tại, chỉ tính lại khi lịch đã đổi phiên bản"""
+        scores = self.schedule_scores
+        if scores is None or scores['version'] != self.schedule_version:
+            ga_schedule = self.best_schedule.schedule
+            hard_violations, soft_violations, soft_metrics, _ = \
+                ga_module.check_constraints_detailed(ga_schedule, self.employees,
+                                                    self.dept_to_rooms, self.shifts, self.days,
+                                                    self.carry_in)
+            scores = self.schedule_scores = {
+                'version': self.schedule_version,
+                'hard_violations': hard_violations,
+                'soft_violations': soft_violations,
+                'soft_metrics': soft_metrics,
+                'fitness': ga_module.fitness(ga_schedule, self.employees,
+                                             self.dept_to_rooms, self.shifts, self.days,
+                                             carry_in=self.carry_in)
+            }
+        return scores
     
     def refresh_dashboard(self):
         """Làm mới dashboard với dữ liệu mới"""
@@ -1572,10 +2509,6 @@ class HospitalScheduleApp:
         if self.dashboard_emp_var.get() not in emp_list:
             self.dashboard_emp_var.set("Tất cả")
         
-        # Clear existing widgets
-        for widget in self.dashboard_inner_frame.winfo_children():
-            widget.destroy()
-        
         # Filter schedule
         filtered_schedule = self.filter_schedule()
         
@@ -1586,31 +2519,17 @@ class HospitalScheduleApp:
         self.draw_dashboard_calendar(filtered_schedule)
     
     def filter_schedule(self):
-        """Lọc lịch trực theo bộ lọc"""
+        """Lọc lịch trực theo bộ lọc (tra chỉ mục, không duyệt toàn bộ lịch)"""
         dept = self.dashboard_dept_var.get()
         emp_name = self.dashboard_emp_var.get()
         
-        filtered = {}
-        for day, day_schedule in self.best_schedule.items():
-            filtered[day] = []
-            for shift_data in day_schedule:
-                emp = shift_data['employee']
-                
-                # Filter by department
-                if dept != "Tất cả" and emp.department != dept:
-                    continue
-                
-                # Filter by employee
-                if emp_name != "Tất cả" and emp.name != emp_name:
-                    continue
-                
-                filtered[day].append(shift_data)
-        
-        return filtered
+        return self.best_schedule.filter(
+            dept=None if dept == "Tất cả" else dept,
+            emp_name=None if emp_name == "Tất cả" else emp_name)
     
     def update_dashboard_stats(self, schedule):
         """Cập nhật thống kê dashboard"""
-        if not schedule:
+        if schedule is None:
             return
         
         # Count total shifts
@@ -1620,9 +2539,9 @@ class HospitalScheduleApp:
         # Calculate average hours
         employee_hours = {}
         for day_schedule in schedule.values():
-            for shift_data in day_schedule:
-                emp = shift_data['employee']
-                shift = shift_data['shift']
+            for a in day_schedule:
+                emp = a.employee
+                shift = a.shift
                 if emp.name not in employee_hours:
                     employee_hours[emp.name] = 0
                 employee_hours[emp.name] += shift.hours
@@ -1635,15 +2554,9 @@ class HospitalScheduleApp:
         
         # Check violations (only for full schedule)
         if self.dashboard_dept_var.get() == "Tất cả" and self.dashboard_emp_var.get() == "Tất cả":
-            # Need to convert back to GA format for validation
-            ga_format_schedule = self.convert_to_ga_format(self.best_schedule)
-            
-            hard_violations, soft_violations, _, _ = \
-                ga_module.check_constraints_detailed(ga_format_schedule, self.employees,
-                                                    self.dept_to_rooms, self.shifts, self.days)
-            
-            total_hard = sum(len(v) for v in hard_violations.values())
-            total_soft = sum(len(v) for v in soft_violations.values())
+            scores = self.get_schedule_scores()
+            total_hard = sum(len(v) for v in scores['hard_violations'].values())
+            total_soft = sum(len(v) for v in scores['soft_violations'].values())
             
             if total_hard == 0:
                 self.violations_label.config(text=f"✅ Vi phạm: {total_soft} (mềm)",
@@ -1652,39 +2565,15 @@ class HospitalScheduleApp:
                 self.violations_label.config(text=f"⚠️ Vi phạm: {total_hard} cứng, {total_soft} mềm",
                                            foreground='red')
             
-            # Calculate fitness
-            fitness = ga_module.fitness(ga_format_schedule, self.employees,
-                                       self.dept_to_rooms, self.shifts, self.days)
-            self.fitness_dashboard_label.config(text=f"Fitness: {fitness:,.0f}")
+            self.fitness_dashboard_label.config(text=f"Fitness: {scores['fitness']:,.0f}")
         else:
             self.violations_label.config(text="Vi phạm: -", foreground='black')
             self.fitness_dashboard_label.config(text="Fitness: -")
     
-    def convert_to_ga_format(self, dashboard_schedule):
-        """Chuyển đổi từ dashboard format về GA format"""
-        # Dashboard format: schedule[day] = [{'employee': emp, 'shift': shift, 'room': room}]
-        # GA format: schedule[day][shift_name][room] = [emp_ids]
-        
-        ga_schedule = defaultdict(lambda: defaultdict(lambda: defaultdict(list)))
-        
-        for day, shift_list in dashboard_schedule.items():
-            for item in shift_list:
-                emp = item['employee']
-                shift = item['shift']
-                room = item['room']
-                
-                if emp.id not in ga_schedule[day][shift.name][room.name]:
-                    ga_schedule[day][shift.name][room.name].append(emp.id)
-        
-        return dict(ga_schedule)
-    
     def draw_dashboard_calendar(self, schedule):
-        """Vẽ lịch trực dạng bảng"""
-        if not schedule:
-            ttk.Label(self.dashboard_inner_frame,
-                     text="Không có dữ liệu phù hợp với bộ lọc.",
-                     font=('Arial', 11),
-                     foreground='gray').pack(pady=30)
+        """Vẽ lịch trực dạng bảng (ScheduleGrid chỉ vẽ các ô đang hiển thị)"""
+        if not schedule or not any(schedule.values()):
+            self.dashboard_grid.show_message("Không có dữ liệu phù hợp với bộ lọc.")
             return
         
         # Colors for shifts
@@ -1695,74 +2584,23 @@ class HospitalScheduleApp:
             'Đêm': '#E8F5E9'      # Light green
         }
         
-        # Create table frame
-        table_frame = ttk.Frame(self.dashboard_inner_frame)
-        table_frame.pack(fill="both", expand=True, padx=10, pady=10)
-        
-        # Header row
-        header_frame = ttk.Frame(table_frame)
-        header_frame.grid(row=0, column=0, columnspan=len(self.days) + 1, sticky="ew")
-        
-        # Empty cell for row header
-        header_label = tk.Label(header_frame, text="Ca trực",
-                               font=('Arial', 10, 'bold'),
-                               bg='#1976D2', fg='white',
-                               width=15, height=2,
-                               relief='solid', borderwidth=1)
-        header_label.grid(row=0, column=0, sticky="nsew")
-        
-        # Day headers
-        for col, day in enumerate(self.days, 1):
-            day_label = tk.Label(header_frame, text=day,
-                                font=('Arial', 10, 'bold'),
-                                bg='#2196F3', fg='white',
-                                width=20, height=2,
-                                relief='solid', borderwidth=1)
-            day_label.grid(row=0, column=col, sticky="nsew")
-        
-        # Data rows - grouped by shift
-        row = 1
-        for shift in self.shifts:
-            # Shift name label
-            shift_label = tk.Label(table_frame,
-                                  text=f"{shift.name}\n({shift.start}-{shift.end})",
-                                  font=('Arial', 9, 'bold'),
-                                  bg='#90CAF9', fg='black',
-                                  width=15,
-                                  relief='solid', borderwidth=1,
-                                  justify='center')
-            shift_label.grid(row=row, column=0, sticky="nsew", pady=1)
-            
-            # Cells for each day
-            for col, day in enumerate(self.days, 1):
-                # Get employees for this shift and day
-                employees_in_shift = [
-                    sd for sd in schedule.get(day, [])
-                    if sd['shift'].name == shift.name
-                ]
-                
-                # Create cell content
-                if employees_in_shift:
-                    content = "\n".join([
-                        f"• {sd['employee'].name} ({sd['room'].name})"
-                        for sd in employees_in_shift
-                    ])
-                    bg_color = shift_colors.get(shift.name, 'white')
-                else:
-                    content = "-"
-                    bg_color = 'white'
-                
-                cell = tk.Label(table_frame, text=content,
-                               font=('Arial', 8),
-                               bg=bg_color,
-                               width=20,
-                               relief='solid', borderwidth=1,
-                               justify='left',
-                               anchor='nw',
-                               padx=5, pady=5)
-                cell.grid(row=row, column=col, sticky="nsew", pady=1, padx=1)
-            
-            row += 1
+        shift_row = {shift.name: r for r, shift in enumerate(self.shifts)}
+        day_col = {day: c for c, day in enumerate(self.days)}
+        
+        # Gom nội dung từng ô trong 1 lần duyệt
+        lines = defaultdict(list)
+        for day, day_schedule in schedule.items():
+            c = day_col.get(day)
+            if c is None:
+                continue
+            for a in day_schedule:
+                lines[(shift_row[a.shift.name], c)].append(f"• {a.employee.name} ({a.room})")
+        
+        rows = [(f"{shift.name}\n({shift.start}-{shift.end})", shift_colors.get(shift.name, 'white'))
+                for shift in self.shifts]
+        columns = [str(day) for day in self.days]
+        texts = {key: "\n".join(items) for key, items in lines.items()}
+        self.dashboard_grid.set_data(rows, columns, texts)
     
     def export_to_excel(self, export_type):
         """Xuất lịch trực ra Excel"""
@@ -1783,155 +2621,8 @@ class HospitalScheduleApp:
         if not filename:
             return
         
-        try:
-            # Create workbook
-            wb = openpyxl.Workbook()
-            
-            if export_type == 'all':
-                ws = wb.active
-                ws.title = "Toàn bộ"
-                self._write_schedule_to_sheet(ws, self.best_schedule, "Toàn bộ")
-            
-            elif export_type == 'department':
-                wb.remove(wb.active)  # Remove default sheet
-                for dept in self.config['DEPARTMENTS']:
-                    ws = wb.create_sheet(title=dept[:31])  # Excel limit 31 chars
-                    dept_schedule = self._filter_by_department(dept)
-                    self._write_schedule_to_sheet(ws, dept_schedule, dept)
-            
-            elif export_type == 'employee':
-                wb.remove(wb.active)
-                for emp in self.employees:
-                    ws = wb.create_sheet(title=emp.name[:31])
-                    emp_schedule = self._filter_by_employee(emp.name)
-                    self._write_schedule_to_sheet(ws, emp_schedule, emp.name)
-            
-            # Save workbook
-            wb.save(filename)
-            
-            if messagebox.askyesno("✅ Thành công",
-                                  f"Đã xuất file Excel thành công!\n\n"
-                                  f"File: {filename}\n\n"
-                                  f"Bạn có muốn mở file?"):
-                import os
-                os.startfile(filename)
-        
-        except Exception as e:
-            messagebox.showerror("❌ Lỗi", f"Không thể xuất file Excel:\n\n{str(e)}")
-    
-    def _write_schedule_to_sheet(self, ws, schedule, title):
-        """Ghi lịch trực vào sheet Excel"""
-        # Convert to GA format first
-        ga_schedule = self.convert_to_ga_format(schedule)
-        emp_dict = {e.id: e for e in self.employees}
-        
-        # Styles
-        header_font = Font(bold=True, color="FFFFFF")
-        header_fill = PatternFill(start_color="1976D2", end_color="1976D2", fill_type="solid")
-        shift_fill = PatternFill(start_color="90CAF9", end_color="90CAF9", fill_type="solid")
-        center_align = Alignment(horizontal="center", vertical="center", wrap_text=True)
-        border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
-        
-        # Title
-        ws.merge_cells('A1:H1')
-        title_cell = ws['A1']
-        title_cell.value = f"LỊCH TRỰC - {title.upper()}"
-        title_cell.font = Font(bold=True, size=16)
-        title_cell.alignment = center_align
-        ws.row_dimensions[1].height = 30
-        
-        # Headers
-        ws['A3'] = "Ca trực"
-        ws['A3'].font = header_font
-        ws['A3'].fill = header_fill
-        ws['A3'].alignment = center_align
-        ws['A3'].border = border
-        
-        for col, day in enumerate(self.days, 2):
-            cell = ws.cell(row=3, column=col)
-            cell.value = day
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = center_align
-            cell.border = border
-        
-        # Data
-        row = 4
-        for shift in self.shifts:
-            # Shift name
-            shift_cell = ws.cell(row=row, column=1)
-            shift_cell.value = f"{shift.name}\n({shift.start}-{shift.end})"
-            shift_cell.font = Font(bold=True)
-            shift_cell.fill = shift_fill
-            shift_cell.alignment = center_align
-            shift_cell.border = border
-            
-            # Data for each day
-            for col, day in enumerate(self.days, 2):
-                employees_in_shift = [
-                    sd for sd in schedule.get(day, [])
-                    if sd['shift'].name == shift.name
-                ]
-                
-                content = "\n".join([
-                    f"{sd['employee'].name} ({sd['room'].name})"
-                    for sd in employees_in_shift
-                ]) if employees_in_shift else "-"
-                
-                cell = ws.cell(row=row, column=col)
-                cell.value = content
-                cell.alignment = Alignment(horizontal="left", vertical="top", wrap_text=True)
-                cell.border = border
-            
-            ws.row_dimensions[row].height = 60
-            row += 1
-        
-        # Column widths
-        ws.column_dimensions['A'].width = 20
-        for col in range(2, len(self.days) + 2):
-            ws.column_dimensions[openpyxl.utils.get_column_letter(col)].width = 30
-        
-        # Add statistics at bottom
-        row += 2
-        stats_cell = ws.cell(row=row, column=1)
-        stats_cell.value = "THỐNG KÊ:"
-        stats_cell.font = Font(bold=True)
-        
-        row += 1
-        total_shifts = sum(len(shifts) for shifts in schedule.values())
-        ws.cell(row=row, column=1).value = f"Tổng số ca trực: {total_shifts}"
-        
-        row += 1
-        employee_set = set()
-        for day_schedule in schedule.values():
-            for sd in day_schedule:
-                employee_set.add(sd['employee'].name)
-        ws.cell(row=row, column=1).value = f"Số nhân viên: {len(employee_set)}"
-    
-    def _filter_by_department(self, dept):
-        """Lọc lịch theo khoa"""
-        filtered = {}
-        for day, day_schedule in self.best_schedule.items():
-            filtered[day] = [
-                sd for sd in day_schedule
-                if sd['employee'].department == dept
-            ]
-        return filtered
-    
-    def _filter_by_employee(self, emp_name):
-        """Lọc lịch theo nhân viên"""
-        filtered = {}
-        for day, day_schedule in self.best_schedule.items():
-            filtered[day] = [
-                sd for sd in day_schedule
-                if sd['employee'].name == emp_name
-            ]
-        return filtered
+        sheets = {'all': 1, 'department': len(self.dept_to_rooms)}.get(export_type, len(self.employees))
+        self.start_export('schedule', filename, sheets, export_type=export_type)
     
     def export_calendar_by_room(self):
         """Xuất lịch trực theo khoa và phòng sử dụng hàm từ schedule-v7.py"""
@@ -1941,9 +2632,6 @@ class HospitalScheduleApp:
                                   "Vui lòng chạy thuật toán GA trước.")
             return
         
-        # Chuyển đổi schedule về GA format
-        ga_schedule = self.convert_to_ga_format(self.best_schedule)
-        
         # Chọn file
         filename = filedialog.asksaveasfilename(
             defaultextension=".xlsx",
@@ -1953,24 +2641,8 @@ class HospitalScheduleApp:
         )
         
         if filename:
-            try:
-                # Gọi hàm từ module GA
-                ga_module.export_calendar_to_excel(
-                    ga_schedule,
-                    self.employees,
-                    self.dept_to_rooms,
-                    self.shifts,
-                    self.days,
-                    filename
-                )
-                
-                messagebox.showinfo("✅ Thành công",
-                                   f"Đã xuất lịch trực theo phòng ra file:\n\n{filename}\n\n"
-                                   "File Excel chứa lịch trực chi tiết của từng phòng trong mỗi khoa.")
-            except Exception as e:
-                messagebox.showerror("❌ Lỗi",
-                                    f"Không thể xuất file!\n\n"
-                                    f"Chi tiết: {str(e)}")
+            sheets = sum(len(rooms) for rooms in self.dept_to_rooms.values())
+            self.start_export('calendar', filename, sheets)
     
     def export_employee_hours(self):
         """Xuất thời gian làm việc của nhân viên sử dụng hàm từ schedule-v7.py"""
@@ -1980,9 +2652,6 @@ class HospitalScheduleApp:
                                   "Vui lòng chạy thuật toán GA trước.")
             return
         
-        # Chuyển đổi schedule về GA format
-        ga_schedule = self.convert_to_ga_format(self.best_schedule)
-        
         # Chọn file
         filename = filedialog.asksaveasfilename(
             defaultextension=".xlsx",
@@ -1992,29 +2661,259 @@ class HospitalScheduleApp:
         )
         
         if filename:
+            # Nhiều nhân viên -> đề xuất gộp chi tiết vào 1 sheet thay vì N sheet
+            long_format = messagebox.askyesno(
+                "📋 Chi tiết ca trực",
+                f"Có {len(self.employees)} nhân viên.\n\n"
+                "Gộp chi tiết ca trực vào 1 sheet 'Chi tiết'?\n"
+                "(Chọn 'No' để tạo mỗi nhân viên 1 sheet riêng)",
+                default='yes' if len(self.employees) > 100 else 'no'
+            )
+            sheets = 2 if long_format else len(self.employees) + 1
+            self.start_export('hours', filename, sheets,
+                              details="long" if long_format else "sheets")
+    
+    def start_export(self, kind, filename, sheets, **options):
+        """Chạy ga_module.export_worker nền cho 1 file, có thể chạy song song nhiều file
+        
+        Lịch được chụp lại (schedule_to_dict) lúc bắt đầu, sửa lịch sau đó không ảnh hưởng file.
+        Workbook lớn (>= EXPORT_PROCESS_MIN_SHEETS sheet) chạy trong tiến trình con để không
+        tranh GIL với giao diện, workbook nhỏ chạy trong thread.
+        """
+        self.export_job_seq += 1
+        job_id = self.export_job_seq
+        
+        use_process = sheets >= EXPORT_PROCESS_MIN_SHEETS
+        conn, child_conn = multiprocessing.Pipe(duplex=False)
+        cancel = multiprocessing.Event() if use_process else threading.Event()
+        args = (child_conn, cancel, kind, filename,
+                ga_module.schedule_to_dict(self.best_schedule.schedule),
+                self.employees, self.dept_to_rooms, self.shifts, self.days, options)
+        if use_process:
+            worker = multiprocessing.Process(target=ga_module.export_worker, args=args, daemon=True)
+        else:
+            worker = threading.Thread(target=ga_module.export_worker, args=args, daemon=True)
+        worker.start()
+        if use_process:
+            child_conn.close()
+        
+        self.export_jobs[job_id] = {
+            'filename': filename,
+            'conn': conn,
+            'worker': worker,
+            'cancel': cancel,
+            'written': 0,
+            'total': sheets,
+            'status': 'running'
+        }
+        self.export_tree.insert('', 'end', iid=str(job_id),
+                                values=(os.path.basename(filename), f"0/{sheets}", "⏳ Đang xuất"))
+        self.log_console(f"📤 Bắt đầu xuất: {filename}\n", 'info')
+    
+    def poll_export_jobs(self):
+        """Đọc thông điệp từ các công việc xuất file, chuyển thay đổi vào output_queue"""
+        for job_id, job in list(self.export_jobs.items()):
+            changed = False
             try:
-                # Gọi hàm từ module GA
-                ga_module.export_employee_hours_to_excel(
-                    ga_schedule,
-                    self.employees,
-                    self.dept_to_rooms,
-                    self.shifts,
-                    self.days,
-                    filename
-                )
-                
+                while job['status'] == 'running' and job['conn'].poll():
+                    msg = job['conn'].recv()
+                    changed = True
+                    if msg[0] == 'sheet':
+                        _, job['written'], job['total'] = msg
+                    elif msg[0] == 'error':
+                        job['status'], job['error'] = 'error', msg[1]
+                    else:
+                        job['status'] = msg[0]
+            except (EOFError, OSError):
+                changed = True
+                job['status'], job['error'] = 'error', "Tiến trình xuất file kết thúc bất thường"
+            
+            if job['status'] != 'running':
+                job['conn'].close()
+                job['worker'].join(timeout=1)
+                del self.export_jobs[job_id]
+            if changed:
+                self.output_queue.put(('export', job_id, job))
+    
+    def update_export_job(self, job_id, job):
+        """Cập nhật dòng của 1 công việc xuất file; báo kết quả khi kết thúc"""
+        iid = str(job_id)
+        if not self.export_tree.exists(iid):
+            return
+        self.export_tree.set(iid, 'progress', f"{job['written']}/{job['total']}")
+        
+        status = job['status']
+        if status == 'running':
+            return
+        
+        self.export_tree.delete(iid)
+        filename = job['filename']
+        if status == 'done':
+            self.log_console(f"✅ Đã xuất: {filename}\n", 'success')
+            messagebox.showinfo("✅ Thành công", f"Đã xuất file Excel thành công!\n\nFile: {filename}")
+        elif status == 'cancelled':
+            self.log_console(f"⏹ Đã hủy xuất: {filename}\n", 'warning')
+        else:
+            self.log_console(f"❌ Lỗi xuất {filename}: {job['error']}\n", 'error')
+            messagebox.showerror("❌ Lỗi", f"Không thể xuất file!\n\nChi tiết: {job['error']}")
+    
+    def cancel_export(self):
+        """Hủy các công việc xuất file đang chọn (hủy sau sheet đang ghi)"""
+        for iid in self.export_tree.selection():
+            job = self.export_jobs.get(int(iid))
+            if job is not None:
+                job['cancel'].set()
+                self.export_tree.set(iid, 'status', "⏹ Đang hủy...")
+
+    
+    def get_replacement_index(self):
+        """Chỉ mục sẵn sàng trên lịch hiện tại (tạo 1 lần, dùng lại cho mọi lần tra cứu)"""
+        if self.replacement_index is None:
+            # Dùng chung dữ liệu với ScheduleStore; apply_replacement sửa tại chỗ
+            ga_schedule = self.best_schedule.schedule
+            self.replacement_index = ga_module.DeltaEvaluator(
+                ga_schedule, self.employees, self.dept_to_rooms,
+                self.shifts, self.days, self.carry_in)
+        return self.replacement_index
+    
+    def open_replacement_dialog(self):
+        """Hộp thoại gợi ý người thay ca khi nhân viên báo nghỉ đột xuất"""
+        if not self.best_schedule:
+            messagebox.showwarning("⚠️ Cảnh báo",
+                                  "Chưa có dữ liệu lịch trực!\n\n"
+                                  "Vui lòng chạy thuật toán GA trước.")
+            return
+        
+        win = tk.Toplevel(self.root)
+        win.title("🚑 Gợi ý thay ca đột xuất")
+        win.geometry("760x480")
+        
+        form = ttk.Frame(win, padding="10")
+        form.pack(fill="x")
+        
+        ttk.Label(form, text="Nhân viên nghỉ:").grid(row=0, column=0, sticky="w", padx=(0, 5))
+        emp_var = tk.StringVar()
+        ttk.Combobox(form, textvariable=emp_var,
+                     values=[f"{e.id} - {e.name}" for e in self.employees],
+                     width=30).grid(row=0, column=1, padx=5)
+        
+        ttk.Label(form, text="Ngày:").grid(row=0, column=2, sticky="w", padx=(10, 5))
+        day_var = tk.IntVar(value=1)
+        ttk.Spinbox(form, from_=1, to=len(self.days), textvariable=day_var,
+                    width=5).grid(row=0, column=3, padx=5)
+        
+        ttk.Label(form, text="Ca:").grid(row=0, column=4, sticky="w", padx=(10, 5))
+        shift_var = tk.StringVar(value=self.shifts[0].name if self.shifts else "")
+        ttk.Combobox(form, textvariable=shift_var, state="readonly",
+                     values=[s.name for s in self.shifts], width=10).grid(row=0, column=5, padx=5)
+        
+        status_var = tk.StringVar(value="Chọn nhân viên, ngày và ca rồi nhấn 'Tìm người thay'.")
+        
+        tree = ttk.Treeview(win, columns=("Tên", "Phòng", "Kinh nghiệm", "Giờ hiện tại", "Δ Fitness"),
+                            show="headings", height=12)
+        for col, width in (("Tên", 160), ("Phòng", 140), ("Kinh nghiệm", 100),
+                           ("Giờ hiện tại", 100), ("Δ Fitness", 120)):
+            tree.heading(col, text=col)
+            tree.column(col, width=width, anchor="center")
+        
+        suggestions = {}
+        request = {}
+        
+        def search():
+            tree.delete(*tree.get_children())
+            suggestions.clear()
+            try:
+                emp_id = int(emp_var.get().split(" - ")[0])
+                day = int(day_var.get()) - 1
+            except (ValueError, tk.TclError):
+                status_var.set("⚠️ Vui lòng chọn nhân viên và ngày hợp lệ.")
+                return
+            
+            ev = self.get_replacement_index()
+            if emp_id not in ev.emp:
+                status_var.set(f"⚠️ Không tìm thấy nhân viên có ID {emp_id}.")
+                return
+            if not 0 <= day < len(self.days):
+                status_var.set(f"⚠️ Ngày phải nằm trong khoảng 1 - {len(self.days)}.")
+                return
+            
+            start = time.perf_counter()
+            result = ga_module.suggest_replacements(ev, emp_id, day, shift_var.get(), limit=20)
+            elapsed = (time.perf_counter() - start) * 1000
+            
+            request.update(emp_id=emp_id, day=day, shift=shift_var.get())
+            for i, sug in enumerate(result):
+                e = sug['employee']
+                iid = tree.insert("", "end", values=(e.name, sug['room'], f"{e.years_exp} năm",
+                                                     f"{sug['hours']}h", f"{sug['delta']:+,.0f}"))
+                suggestions[iid] = sug
+            
+            if result:
+                status_var.set(f"Tìm thấy {len(result)} ứng viên ({elapsed:.1f} ms). "
+                               f"Δ Fitness càng nhỏ càng tốt.")
+            else:
+                status_var.set("Không có ứng viên phù hợp hoặc nhân viên không trực ca này.")
+        
+        def apply():
+            selection = tree.selection()
+            if not selection:
+                messagebox.showwarning("⚠️ Cảnh báo", "Vui lòng chọn người thay!", parent=win)
+                return
+            
+            sug = suggestions[selection[0]]
+            ev = self.get_replacement_index()
+            ga_module.apply_replacement(ev, request['emp_id'], sug['employee'].id,
+                                        request['day'], request['shift'], sug['room'])
+            # ev.schedule đã được cập nhật tại chỗ nên chỉ mục vẫn dùng được
+            self.set_best_schedule(ev.schedule, keep_evaluator=True)
+            
+            absent = next(e for e in self.employees if e.id == request['emp_id'])
+            self.log_console(f"🚑 Thay ca: {absent.name} → {sug['employee'].name} "
+                             f"(Ngày {request['day'] + 1}, ca {request['shift']}, {sug['room']})\n",
+                             'info')
+            self.refresh_dashboard()
+            search()
+        
+        ttk.Button(form, text="🔍 Tìm người thay", command=search).grid(row=0, column=6, padx=10)
+        
+        tree.pack(fill="both", expand=True, padx=10, pady=5)
+        
+        bottom = ttk.Frame(win, padding="10")
+        bottom.pack(fill="x")
+        ttk.Label(bottom, textvariable=status_var, foreground='gray').pack(side="left")
+        ttk.Button(bottom, text="✅ Áp dụng", command=apply,
+                  style='Action.TButton').pack(side="right")
+    
+    def save_schedule_json(self):
+        """Lưu lịch trực ra JSON để làm lịch khởi tạo cho kỳ sau"""
+        if not self.best_schedule:
+            messagebox.showwarning("⚠️ Cảnh báo",
+                                  "Chưa có dữ liệu lịch trực!\n\n"
+                                  "Vui lòng chạy thuật toán GA trước.")
+            return
+        
+        filename = filedialog.asksaveasfilename(
+            defaultextension=".json",
+            filetypes=[("JSON files", "*.json"), ("All files", "*.*")],
+            title="Lưu lịch trực",
+            initialfile="lich_truc_benh_vien.json"
+        )
+        
+        if filename:
+            try:
+                ga_schedule = self.best_schedule.schedule
+                ga_module.save_schedule_json(ga_schedule, self.shifts, self.days, filename)
                 messagebox.showinfo("✅ Thành công",
-                                   f"Đã xuất giờ làm nhân viên ra file:\n\n{filename}\n\n"
-                                   "File Excel chứa:\n"
-                                   "• Sheet 'Tổng hợp': Tổng hợp giờ làm của tất cả nhân viên\n"
-                                   "• Các sheet riêng: Chi tiết từng ca trực của từng nhân viên")
+                                   f"Đã lưu lịch trực ra file:\n\n{filename}\n\n"
+                                   "Có thể dùng file này ở nút 'Nạp lịch kỳ trước' cho kỳ sau.")
             except Exception as e:
                 messagebox.showerror("❌ Lỗi",
-                                    f"Không thể xuất file!\n\n"
+                                    f"Không thể lưu file!\n\n"
                                     f"Chi tiết: {str(e)}")
 
 
 def main():
+    multiprocessing.freeze_support()
     root = tk.Tk()
     app = HospitalScheduleApp(root)
     root.mainloop()
@@ -1,9 +1,12 @@
+import math
 import random
 import copy
-import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
-from collections import defaultdict
+import json
+import os
+import time
+from bisect import bisect_left, insort
+from types import MappingProxyType
+from collections import defaultdict, namedtuple, Counter
 
 # =====================================================
 # GLOBAL CONFIG
@@ -57,6 +60,38 @@ MUTATION_RATE = 0.15
 STAGNATION_LIMIT = 5
 HILL_CLIMB_STEPS = 50
 
+PROFILE_GA = False         # Đo thời gian từng pha của vòng lặp GA (GAProfiler), in ra cuối lệnh run (--phase-timing)
+
+# ---------------- PROFILE LẦN CHẠY (RunProfiler) ----------------
+PROFILE_RUN = False                  # cProfile + lấy mẫu stack cho cả lần chạy (hoặc python schedule-v7.py --profile)
+PROFILE_DIR = "."                    # Thư mục ghi .pstats / .collapsed / snapshot bộ nhớ (cạnh các file xuất)
+PROFILE_SAMPLE_INTERVAL = 0.005      # Chu kỳ lấy mẫu stack (giây)
+PROFILE_SNAPSHOT_GENERATIONS = ()    # Thế hệ (đếm từ 1) chụp snapshot tracemalloc, vd (1, 50, 100)
+
+# ---------------- TERMINATION ----------------
+TIME_LIMIT_SECONDS = None           # Giới hạn thời gian chạy (giây), None = không giới hạn
+TARGET_SOFT_PENALTY = None          # Dừng khi phạt cứng đạt cận dưới và phạt mềm <= ngưỡng
+MAX_NO_IMPROVE_GENERATIONS = None   # Dừng khi N thế hệ liên tiếp không cải thiện
+MAX_NO_IMPROVE_SECONDS = None       # Dừng khi T giây không cải thiện
+STOP_AT_HARD_BOUND = False          # Dừng ngay khi phạt cứng đạt cận dưới của analyze_feasibility
+
+# ---------------- WARM START ----------------
+WARM_START_FILE = None     # Lịch kỳ trước (.json hoặc .xlsx) dùng để khởi tạo quần thể
+CARRY_IN_DAYS = 1          # Số ngày cuối kỳ trước đưa vào kiểm tra nghỉ giữa ca
+SEED_MUTATION_ROUNDS = 3   # Số lần đột biến lịch gốc để sinh các cá thể còn lại
+
+# ---------------- INCREMENTAL RESCHEDULING ----------------
+INCREMENTAL_RADIUS = 2            # Số ngày lân cận để xét lại các ca khác của nhân viên bị thay đổi
+INCREMENTAL_TIME_LIMIT = 2.0      # Giới hạn thời gian tìm kiếm cục bộ (giây)
+INCREMENTAL_STEPS = 3000          # Số bước tìm kiếm cục bộ tối đa
+INCREMENTAL_CHANGE_COST = 800     # Mức cải thiện tối thiểu để đổi thêm 1 ca của nhân viên bị thay đổi
+
+# ---------------- COLUMNAR EXPORT ----------------
+COLUMNAR_FORMAT = None              # "csv" hoặc "parquet": xuất thêm bảng cột cho payroll/BI, None = không xuất
+COLUMNAR_DIR = "du_lieu_lich_truc"
+COLUMNAR_PARTITION_BY = None        # Ví dụ ("dept", "month")
+SCHEDULE_START_DATE = None          # Ngày thực của ngày đầu kỳ, vd "2025-01-01" (month = "YYYY-MM")
+
 # ---------------- PENALTY WEIGHTS ----------------
 # HARD CONSTRAINTS - Phạt cực nặng (không được vi phạm)
 W_NO_DOCTOR   = 1_000_000
@@ -91,17 +126,37 @@ class Shift:
         self.hours = hours
 
 
-def generate_sample_data():
-    random.seed(42)
-    
+def base_structure():
+    """Khoa/phòng, ca và ngày theo cấu hình (dùng chung cho dữ liệu mẫu và dữ liệu nhập)"""
     shifts = [Shift(*s) for s in SHIFTS]
     days = list(range(NUM_DAYS))
+    dept_to_rooms = {dept: rooms for dept, rooms in DEPARTMENTS.items()}
+    return dept_to_rooms, shifts, days
+
+
+def print_instance_summary(employees, dept_to_rooms):
+    """In thống kê nhân viên theo khoa (đếm 1 lượt qua danh sách)"""
+    counts = {dept: Counter() for dept in dept_to_rooms}
+    for e in employees:
+        c = counts.setdefault(e.department, Counter())
+        c[e.role] += 1
+        if e.years_exp >= MIN_EXPERIENCE_YEARS:
+            c['senior_' + e.role] += 1
+    total = sum(counts.values(), Counter())
+    
+    print(f"Số khoa: {len(dept_to_rooms)}")
+    print(f"Tổng số phòng: {sum(len(rooms) for rooms in dept_to_rooms.values())}")
+    print(f"Tổng số bác sĩ: {total['doctor']}")
+    print(f"Tổng số điều dưỡng: {total['nurse']}")
+    print(f"Nhân viên có kinh nghiệm ≥{MIN_EXPERIENCE_YEARS} năm: "
+          f"{total['senior_doctor'] + total['senior_nurse']}")
+    return counts
+
+
+def generate_sample_data():
+    random.seed(42)
     
-    all_rooms = []
-    dept_to_rooms = {}
-    for dept, rooms in DEPARTMENTS.items():
-        all_rooms.extend(rooms)
-        dept_to_rooms[dept] = rooms
+    dept_to_rooms, shifts, days = base_structure()
     
     employees = []
     eid = 0
@@ -145,11 +200,7 @@ def generate_sample_data():
     print("=" * 80)
     print("THÔNG TIN NHÂN VIÊN")
     print("=" * 80)
-    print(f"Số khoa: {len(DEPARTMENTS)}")
-    print(f"Tổng số phòng: {len(all_rooms)}")
-    print(f"Tổng số bác sĩ: {sum(e.role == 'doctor' for e in employees)}")
-    print(f"Tổng số điều dưỡng: {sum(e.role == 'nurse' for e in employees)}")
-    print(f"Nhân viên có kinh nghiệm ≥5 năm: {sum(e.years_exp >= 5 for e in employees)}")
+    counts = print_instance_summary(employees, dept_to_rooms)
     print(f"\n STAFF CONFIGURATION:")
     print(f"   Bác sĩ mỗi khoa: {DOCTORS_PER_DEPARTMENT}")
     print(f"   Điều dưỡng mỗi khoa: {NURSES_PER_DEPARTMENT}")
@@ -157,16 +208,221 @@ def generate_sample_data():
     print(f"   Tỷ lệ điều dưỡng senior: {SENIOR_NURSE_RATIO*100:.0f}%")
     print("\n Phân bổ theo khoa:")
     for dept in dept_list:
-        dept_docs = sum(1 for e in employees if e.department == dept and e.role == 'doctor')
-        dept_nurses = sum(1 for e in employees if e.department == dept and e.role == 'nurse')
-        senior_docs = sum(1 for e in employees if e.department == dept and e.role == 'doctor' and e.years_exp >= 5)
-        senior_nurses = sum(1 for e in employees if e.department == dept and e.role == 'nurse' and e.years_exp >= 5)
-        print(f"   {dept}: {dept_docs} BS ({senior_docs} senior), {dept_nurses} DD ({senior_nurses} senior), {len(DEPARTMENTS[dept])} phòng")
+        c = counts[dept]
+        print(f"   {dept}: {c['doctor']} BS ({c['senior_doctor']} senior), "
+              f"{c['nurse']} DD ({c['senior_nurse']} senior), {len(dept_to_rooms[dept])} phòng")
     print("=" * 80 + "\n")
     
     return employees, dept_to_rooms, shifts, days
 
 
+def generate_instance(num_departments=len(DEPARTMENTS), rooms_per_department=2,
+                      doctors_per_department=DOCTORS_PER_DEPARTMENT,
+                      nurses_per_department=NURSES_PER_DEPARTMENT,
+                      senior_doctor_ratio=SENIOR_DOCTOR_RATIO, senior_nurse_ratio=SENIOR_NURSE_RATIO,
+                      senior_years=(5, 10), junior_years=(1, 4),
+                      leave_density=0.0, leave_clustering=0.0,
+                      num_days=NUM_DAYS, shifts=SHIFTS, seed=42):
+    """Sinh dữ liệu giả lập có tham số để đo hiệu năng (vài trăm đến ~100.000 nhân viên)
+    
+    Tên khoa lấy từ DEPARTMENTS, vượt quá thì đặt "Khoa N". Kinh nghiệm chọn đều trong
+    senior_years / junior_years theo tỷ lệ senior. Ngày nghỉ sinh theo xích Markov 2 trạng thái:
+    leave_density = tỷ lệ ngày nghỉ trung bình, leave_clustering (0..1) = xác suất ngày nghỉ
+    kéo dài sang ngày sau (0 = rải đều, gần 1 = nghỉ thành đợt dài).
+    Cùng tham số và seed cho cùng kết quả. Trả về (employees, dept_to_rooms, shifts, days)
+    như generate_sample_data.
+    """
+    import numpy as np
+    
+    rng = np.random.default_rng(seed)
+    
+    shifts = [Shift(*s) for s in shifts]
+    days = list(range(num_days))
+    
+    names = list(DEPARTMENTS)[:num_departments]
+    names += [f"Khoa {k + 1}" for k in range(len(names), num_departments)]
+    codes = [dept[:3] if k < len(DEPARTMENTS) else f"K{k + 1}" for k, dept in enumerate(names)]
+    dept_to_rooms = {dept: [f"Phòng {code} {r + 1}" for r in range(rooms_per_department)]
+                     for dept, code in zip(names, codes)}
+    
+    # Mỗi vai trò: bác sĩ của tất cả các khoa trước, rồi điều dưỡng (như generate_sample_data)
+    blocks = [('doctor', 'BS', doctors_per_department, senior_doctor_ratio),
+              ('nurse', 'DD', nurses_per_department, senior_nurse_ratio)]
+    role_col, name_col, dept_col, years_col = [], [], [], []
+    for role, prefix, per_dept, ratio in blocks:
+        n = per_dept * num_departments
+        dept_idx = np.repeat(np.arange(num_departments), per_dept)
+        senior = rng.random(n) < ratio
+        years = np.where(senior,
+                         rng.integers(senior_years[0], senior_years[1] + 1, n),
+                         rng.integers(junior_years[0], junior_years[1] + 1, n))
+        role_col += [role] * n
+        name_col += [f"{prefix}_{codes[d]}_{i + 1}"
+                     for d, i in zip(dept_idx.tolist(), np.tile(np.arange(per_dept), num_departments).tolist())]
+        dept_col += [names[d] for d in dept_idx.tolist()]
+        years_col += years.tolist()
+    
+    # Ngày nghỉ: P(nghỉ | hôm trước nghỉ) = c + (1-c)·p, P(nghỉ | hôm trước làm) = (1-c)·p
+    n = len(role_col)
+    off = np.zeros((n, num_days), dtype=bool)
+    if leave_density > 0 and num_days:
+        stay = leave_clustering + (1 - leave_clustering) * leave_density
+        start = (1 - leave_clustering) * leave_density
+        off[:, 0] = rng.random(n) < leave_density
+        for d in range(1, num_days):
+            off[:, d] = rng.random(n) < np.where(off[:, d - 1], stay, start)
+    
+    rows, cols = np.nonzero(off)
+    bounds = np.searchsorted(rows, np.arange(n + 1))
+    cols = cols.tolist()
+    
+    employees = [Employee(i, name_col[i], role_col[i], dept_col[i],
+                          cols[bounds[i]:bounds[i + 1]], years_col[i])
+                 for i in range(n)]
+    return employees, dept_to_rooms, shifts, days
+
+
+# =====================================================
+# NHẬP DANH SÁCH NHÂN VIÊN VÀ NGÀY NGHỈ
+# =====================================================
+ROSTER_COLUMNS = {
+    'id': 'id', 'mã': 'id', 'mã nv': 'id',
+    'name': 'name', 'tên': 'name', 'họ tên': 'name',
+    'role': 'role', 'chức vụ': 'role',
+    'department': 'department', 'dept': 'department', 'khoa': 'department',
+    'years_exp': 'years_exp', 'kinh nghiệm': 'years_exp', 'kinh nghiệm (năm)': 'years_exp',
+}
+LEAVE_COLUMNS = {
+    'employee_id': 'employee_id', 'id': 'employee_id', 'mã nv': 'employee_id',
+    'date': 'date', 'day': 'date', 'ngày': 'date', 'ngày nghỉ': 'date',
+}
+ROLE_NAMES = {'doctor': 'doctor', 'bác sĩ': 'doctor', 'bs': 'doctor',
+              'nurse': 'nurse', 'điều dưỡng': 'nurse', 'dd': 'nurse'}
+
+
+def _read_import_table(source, columns):
+    """Đọc CSV/Excel (hoặc DataFrame) thành bảng chuỗi, đổi tên cột theo columns"""
+    import pandas as pd
+    
+    if isinstance(source, pd.DataFrame):
+        df = source.astype(str).where(source.notna(), None)
+    elif str(source).lower().endswith(('.xlsx', '.xls')):
+        df = pd.read_excel(source, dtype=str)
+    else:
+        df = pd.read_csv(source, dtype=str, skipinitialspace=True, encoding='utf-8-sig')
+    
+    df = df.rename(columns=lambda c: columns.get(str(c).strip().lower(), str(c).strip().lower()))
+    missing = sorted(set(columns.values()) - set(df.columns))
+    if missing:
+        raise ValueError(f"Thiếu cột: {', '.join(missing)}")
+    
+    df = df[list(dict.fromkeys(columns.values()))]
+    for col in df.columns:
+        df[col] = df[col].str.strip()
+    return df.reset_index(drop=True)
+
+
+def _row_errors(checks):
+    """[(mask, thông báo)] -> [(số dòng trong file, thông báo)], dòng 1 là tiêu đề"""
+    import numpy as np
+    
+    errors = []
+    for mask, message in checks:
+        errors.extend((int(row) + 2, message) for row in np.flatnonzero(mask))
+    return sorted(errors)
+
+
+def import_roster(source, dept_to_rooms=None):
+    """Nhập danh sách nhân viên (id, name, role, department, years_exp) từ CSV/Excel
+    
+    Kiểm tra toàn bộ bảng 1 lượt; dòng lỗi bị bỏ qua và được báo lại.
+    Chấp nhận tiêu đề tiếng Việt như sheet 'Tổng hợp' của file giờ làm.
+    Trả về (employees, errors) với errors = [(số dòng, thông báo)].
+    """
+    import numpy as np
+    import pandas as pd
+    
+    df = _read_import_table(source, ROSTER_COLUMNS)
+    
+    ids = pd.to_numeric(df['id'], errors='coerce')
+    years = pd.to_numeric(df['years_exp'], errors='coerce')
+    roles = df['role'].str.lower().map(ROLE_NAMES)
+    
+    bad_id = ids.isna() | (ids % 1 != 0)
+    checks = [
+        (bad_id, "ID không hợp lệ"),
+        (~bad_id & ids.duplicated(), "ID bị trùng"),
+        (df['name'].isna() | (df['name'] == ''), "Thiếu tên"),
+        (roles.isna(), "Chức vụ không hợp lệ (doctor/nurse)"),
+        (years.isna() | (years < 0), "Số năm kinh nghiệm không hợp lệ"),
+    ]
+    if dept_to_rooms is not None:
+        checks.append((~df['department'].isin(list(dept_to_rooms)), "Khoa không tồn tại"))
+    else:
+        checks.append((df['department'].isna(), "Thiếu khoa"))
+    
+    errors = _row_errors(checks)
+    valid = ~np.logical_or.reduce([mask.to_numpy() for mask, _ in checks])
+    
+    employees = [
+        Employee(int(i), name, role, dept, (), int(y))
+        for i, name, role, dept, y in zip(ids[valid], df['name'][valid], roles[valid],
+                                          df['department'][valid], years[valid])
+    ]
+    return employees, errors
+
+
+def import_leave(source, employees, days, start_date=None, replace=True):
+    """Nhập ngày nghỉ dạng bảng dài (employee_id, date) từ CSV/Excel và gán vào days_off
+    
+    date là chỉ số ngày trong days (tính từ 0) hoặc ngày thực (YYYY-MM-DD, dd/mm/yyyy) tính
+    theo start_date. Ngày nghỉ được dựng thành ma trận nhân viên x ngày rồi gán 1 lần;
+    replace=True thay toàn bộ ngày nghỉ cũ, False thì cộng thêm.
+    Trả về (số ngày nghỉ đã gán, errors) với errors = [(số dòng, thông báo)].
+    """
+    import numpy as np
+    import pandas as pd
+    
+    df = _read_import_table(source, LEAVE_COLUMNS)
+    
+    pos = {e.id: k for k, e in enumerate(employees)}
+    emp_idx = pd.to_numeric(df['employee_id'], errors='coerce').map(pos)
+    
+    day_idx = pd.to_numeric(df['date'], errors='coerce')
+    is_date = day_idx.isna() & df['date'].notna()
+    if is_date.any() and start_date is not None:
+        dates = pd.to_datetime(df['date'][is_date], format='ISO8601', errors='coerce')
+        retry = dates.isna()
+        dates[retry] = pd.to_datetime(df['date'][is_date][retry], format='%d/%m/%Y', errors='coerce')
+        day_idx[is_date] = (dates - pd.Timestamp(start_date)).dt.days
+    
+    day_pos = {d: k for k, d in enumerate(days)}
+    day_col = day_idx.map(day_pos)
+    
+    checks = [
+        (emp_idx.isna(), "Không tìm thấy nhân viên"),
+        (is_date & (start_date is None), "Ngày dạng lịch cần start_date (SCHEDULE_START_DATE)"),
+        (day_idx.isna() & ~(is_date & (start_date is None)), "Ngày không hợp lệ"),
+        (day_idx.notna() & day_col.isna(), "Ngày nằm ngoài kỳ lập lịch"),
+    ]
+    errors = _row_errors(checks)
+    valid = (emp_idx.notna() & day_col.notna()).to_numpy()
+    
+    off = np.zeros((len(employees), len(days)), dtype=bool)
+    rows = emp_idx[valid].astype(int).to_numpy()
+    off[rows, day_col[valid].astype(int).to_numpy()] = True
+    
+    days_arr = np.asarray(days)
+    touched = set(rows.tolist())
+    for k, e in enumerate(employees):
+        if replace:
+            e.days_off = set(days_arr[off[k]].tolist()) if k in touched else set()
+        elif k in touched:
+            e.days_off |= set(days_arr[off[k]].tolist())
+    
+    return int(off.sum()), errors
+
+
 def get_room_department(room, dept_to_rooms):
     """Tìm khoa của phòng"""
     for dept, rooms in dept_to_rooms.items():
@@ -230,7 +486,9 @@ def create_individual(employees, dept_to_rooms, shifts, days):
     return schedule
 
 
-def check_constraints_detailed(schedule, employees, dept_to_rooms, shifts, days):
+def check_constraints_detailed(schedule, employees, dept_to_rooms, shifts, days, carry_in=None):
+    import numpy as np
+    
     emp = {e.id: e for e in employees}
     
     hours_week = defaultdict(int)
@@ -329,17 +587,20 @@ def check_constraints_detailed(schedule, employees, dept_to_rooms, shifts, days)
                 'overtime': hours - MAX_HOURS_PER_WEEK
             })
     
-    # Kiểm tra ràng buộc mềm: thời gian nghỉ
+    # Kiểm tra ràng buộc mềm: thời gian nghỉ (kể cả các ca cuối kỳ trước)
     for emp_id, seq in timeline.items():
+        if carry_in and emp_id in carry_in:
+            seq.extend(carry_in[emp_id])
         seq.sort(key=lambda x: x[0]*24 + x[1].start)
         for j in range(1, len(seq)):
             prev_d, prev_s = seq[j-1]
             cur_d, cur_s = seq[j]
             rest = (cur_d*24 + cur_s.start) - (prev_d*24 + prev_s.end)
-            if rest < MIN_REST_HOURS:
+            if rest < MIN_REST_HOURS and cur_d >= 0:
+                prev_label = f"Ngày {prev_d+1}" if prev_d >= 0 else f"Kỳ trước (ngày {prev_d})"
                 soft_violations['no_rest_12h'].append({
                     'employee': emp[emp_id].name,
-                    'from': f"Ngày {prev_d+1} ca {prev_s.name}",
+                    'from': f"{prev_label} ca {prev_s.name}",
                     'to': f"Ngày {cur_d+1} ca {cur_s.name}",
                     'rest_hours': rest, 'missing': MIN_REST_HOURS - rest
                 })
@@ -441,7 +702,12 @@ def print_constraint_report(hard_violations, soft_violations, soft_metrics, soft
     print("="*80 + "\n")
 
 
-def fitness(schedule, employees, dept_to_rooms, shifts, days, log=False):
+# Số lần gọi fitness / _create_valid_assignment từ khi nạp module (GAProfiler lấy hiệu số)
+_op_counts = Counter()
+
+
+def fitness(schedule, employees, dept_to_rooms, shifts, days, log=False, carry_in=None):
+    _op_counts['evaluations'] += 1
     emp = {e.id: e for e in employees}
     hours_week = defaultdict(int)
     timeline = defaultdict(list)
@@ -488,14 +754,16 @@ def fitness(schedule, employees, dept_to_rooms, shifts, days, log=False):
         if h > MAX_HOURS_PER_WEEK:
             soft["over_30h"] += (h - MAX_HOURS_PER_WEEK)
     
-    # Tính soft constraint: no rest 12h
+    # Tính soft constraint: no rest 12h (carry_in: các ca cuối kỳ trước, ngày âm)
     for i, seq in timeline.items():
+        if carry_in and i in carry_in:
+            seq.extend(carry_in[i])
         seq.sort(key=lambda x: x[0]*24 + x[1].start)
         for j in range(1, len(seq)):
             prev_d, prev_s = seq[j-1]
             cur_d, cur_s = seq[j]
             rest = (cur_d*24 + cur_s.start) - (prev_d*24 + prev_s.end)
-            if rest < MIN_REST_HOURS:
+            if rest < MIN_REST_HOURS and cur_d >= 0:
                 soft["no_rest_12h"] += 1
     
     # Tính soft constraint: over/under monthly hours
@@ -510,7 +778,7 @@ def fitness(schedule, employees, dept_to_rooms, shifts, days, log=False):
             soft["under_monthly"] += (MIN_HOURS_PER_MONTH - total_hours[i])
     
     # Tính fairness penalty
-    avg = np.mean(list(total_hours.values())) if total_hours else 0
+    avg = sum(total_hours.values()) / len(total_hours) if total_hours else 0
     fairness = 0
     for h in total_hours.values():
         fairness += abs(h - avg)
@@ -547,6 +815,7 @@ def tournament_selection(scored):
 # Tạo assignment hợp lệ cho 1 khoa
 def _create_valid_assignment(employees, dept, day):
     """Tạo assignment hợp lệ cho 1 khoa"""
+    _op_counts['repairs'] += 1
     pool = [e for e in employees if e.department == dept and day not in e.days_off]
     doctors = [e for e in pool if e.role == "doctor"]
     nurses = [e for e in pool if e.role == "nurse"]
@@ -660,7 +929,7 @@ def mutate_balance_hours(ind, employees, dept_to_rooms, shifts, days, rate=0.3):
     if not emp_hours:
         return ind
     
-    avg_hours = np.mean(list(emp_hours.values()))
+    avg_hours = sum(emp_hours.values()) / len(emp_hours)
     overworked = [(emp_id, h) for emp_id, h in emp_hours.items() if h > avg_hours + 10]
     underworked = [(emp_id, h) for emp_id, h in emp_hours.items() if h < avg_hours - 10]
     
@@ -690,9 +959,9 @@ def mutate_balance_hours(ind, employees, dept_to_rooms, shifts, days, rate=0.3):
     return ind
 
 # Tìm kiếm nghiệm láng giềng tốt hơn bằng cách hoán đổi ca trực giữa hai ca ngẫu nhiên từ best individual
-def hill_climb(ind, employees, dept_to_rooms, shifts, days, steps=50):
+def hill_climb(ind, employees, dept_to_rooms, shifts, days, steps=50, carry_in=None):
     best = copy.deepcopy(ind)
-    best_fit = fitness(best, employees, dept_to_rooms, shifts, days)
+    best_fit = fitness(best, employees, dept_to_rooms, shifts, days, carry_in=carry_in)
     
     all_rooms = [room for rooms in dept_to_rooms.values() for room in rooms]
     
@@ -718,15 +987,1445 @@ def hill_climb(ind, employees, dept_to_rooms, shifts, days, steps=50):
             neigh[d][s1.name][room] = assign2
             neigh[d][s2.name][room] = assign1
         
-        f = fitness(neigh, employees, dept_to_rooms, shifts, days)
+        f = fitness(neigh, employees, dept_to_rooms, shifts, days, carry_in=carry_in)
         if f < best_fit:
             best, best_fit = neigh, f
     
     return best
 
 
+# =====================================================
+# WARM START: KHỞI TẠO TỪ LỊCH KỲ TRƯỚC
+# =====================================================
+def _empty_schedule():
+    return defaultdict(lambda: defaultdict(lambda: defaultdict(list)))
+
+
+def _room_sheet_name(dept, room):
+    """Tên sheet Excel của 1 phòng trong file lịch trực"""
+    return f"{dept[:10]}_{room[:15]}".replace("/", "-")[:31]
+
+
+def save_schedule_json(schedule, shifts, days, filename="lich_truc_benh_vien.json"):
+    """Lưu lịch trực (GA format) ra file JSON để làm lịch khởi tạo cho kỳ sau"""
+    data = {
+        'days': list(days),
+        'shifts': [s.name for s in shifts],
+        'schedule': {
+            str(d): {
+                s.name: {room: list(ids) for room, ids in schedule[d][s.name].items()}
+                for s in shifts
+            }
+            for d in days
+        }
+    }
+    with open(filename, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    
+    print(f"\nĐã lưu lịch trực ra file: {filename}")
+
+
+def load_schedule_json(filename):
+    """Đọc lịch trực đã lưu bằng save_schedule_json, trả về (schedule, days)"""
+    with open(filename, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    
+    schedule = _empty_schedule()
+    for d, day_schedule in data['schedule'].items():
+        for s_name, rooms in day_schedule.items():
+            for room, ids in rooms.items():
+                schedule[int(d)][s_name][room] = list(ids)
+    
+    return schedule, sorted(int(d) for d in data['days'])
+
+
+def load_schedule_from_excel(filename, employees, dept_to_rooms, shifts):
+    """Đọc lại lịch trực từ file xuất bởi export_calendar_to_excel, trả về (schedule, days)"""
+    import pandas as pd
+    
+    name_to_id = {e.name: e.id for e in employees}
+    sheets = pd.read_excel(filename, sheet_name=None, dtype=str)
+    
+    schedule = _empty_schedule()
+    days = set()
+    
+    for dept, rooms in dept_to_rooms.items():
+        for room in rooms:
+            df = sheets.get(_room_sheet_name(dept, room))
+            if df is None:
+                continue
+            
+            for _, row in df.iterrows():
+                d = int(str(row["Ngày"]).replace("Ngày", "").strip()) - 1
+                days.add(d)
+                
+                for shift in shifts:
+                    ids = []
+                    for col in (f"{shift.name}\nBác sĩ", f"{shift.name}\nĐiều dưỡng"):
+                        cell = row.get(col)
+                        if not isinstance(cell, str):
+                            continue
+                        for line in cell.split("\n"):
+                            # Mỗi dòng có dạng "Tên (Ny)"; nhân viên đã nghỉ việc bị bỏ qua
+                            emp_id = name_to_id.get(line.rsplit(" (", 1)[0].strip())
+                            if emp_id is not None:
+                                ids.append(emp_id)
+                    schedule[d][shift.name][room] = ids
+    
+    return schedule, sorted(days)
+
+
+def _repair_assignment(ids, emp, dept_staff, dept, day):
+    """Loại nhân viên không hợp lệ khỏi 1 ô và bổ sung cho đủ ràng buộc cứng"""
+    kept = []
+    for i in ids:
+        e = emp.get(i)
+        if e is None or e.department != dept or day in e.days_off or i in kept:
+            continue
+        kept.append(i)
+    
+    available = [e for e in dept_staff if day not in e.days_off and e.id not in kept]
+    random.shuffle(available)
+    
+    doctors = sum(1 for i in kept if emp[i].role == "doctor")
+    nurses = sum(1 for i in kept if emp[i].role == "nurse")
+    
+    rest = []
+    for e in available:
+        if e.role == "doctor" and doctors < MIN_DOCTOR_PER_SHIFT:
+            kept.append(e.id)
+            doctors += 1
+        elif e.role == "nurse" and nurses < MIN_NURSE_PER_SHIFT:
+            kept.append(e.id)
+            nurses += 1
+        else:
+            rest.append(e)
+    
+    while len(kept) < MIN_TOTAL_PER_SHIFT and rest:
+        kept.append(rest.pop().id)
+    
+    if not any(emp[i].years_exp >= MIN_EXPERIENCE_YEARS for i in kept):
+        seniors = [e for e in rest if e.years_exp >= MIN_EXPERIENCE_YEARS]
+        if seniors:
+            kept.append(random.choice(seniors).id)
+    
+    return kept
+
+
+def seed_from_schedule(prev_schedule, prev_days, employees, dept_to_rooms, shifts, days, day_offset=0):
+    """Ánh xạ lịch kỳ trước sang khoảng ngày mới và sửa các ô không còn hợp lệ
+    
+    Ngày d của kỳ mới lấy phân công của ngày prev_days[(d + day_offset) % len(prev_days)];
+    day_offset dùng để căn thứ trong tuần giữa hai kỳ.
+    """
+    emp = {e.id: e for e in employees}
+    dept_staff = defaultdict(list)
+    for e in employees:
+        dept_staff[e.department].append(e)
+    
+    prev_days = sorted(prev_days)
+    seed = _empty_schedule()
+    
+    for d in days:
+        src = prev_days[(d + day_offset) % len(prev_days)]
+        for s in shifts:
+            for dept, rooms in dept_to_rooms.items():
+                for room in rooms:
+                    ids = prev_schedule[src][s.name][room] if src in prev_schedule else []
+                    seed[d][s.name][room] = _repair_assignment(ids, emp, dept_staff[dept], dept, d)
+    
+    return seed
+
+
+def extract_carry_in(prev_schedule, prev_days, shifts, tail_days=CARRY_IN_DAYS):
+    """Lấy các ca của những ngày cuối kỳ trước, đánh số ngày âm (-1 = ngày liền trước kỳ mới)"""
+    prev_days = sorted(prev_days)
+    if not prev_days or tail_days <= 0:
+        return {}
+    
+    end = prev_days[-1] + 1
+    carry_in = defaultdict(list)
+    for d in prev_days[-tail_days:]:
+        if d not in prev_schedule:
+            continue
+        for s in shifts:
+            for ids in prev_schedule[d][s.name].values():
+                for i in ids:
+                    carry_in[i].append((d - end, s))
+    
+    return dict(carry_in)
+
+
+def create_seeded_population(seed, employees, dept_to_rooms, shifts, days, size,
+                             rounds=SEED_MUTATION_ROUNDS):
+    """Quần thể gồm lịch gốc và các bản đột biến của nó"""
+    population = [seed]
+    while len(population) < size:
+        ind = copy.deepcopy(seed)
+        for _ in range(rounds):
+            ind = mutate_scramble(ind, employees, dept_to_rooms, shifts, days, rate=1.0)
+            ind = mutate_balance_hours(ind, employees, dept_to_rooms, shifts, days, rate=1.0)
+        population.append(ind)
+    return population
+
+
+def warm_start_population(filename, employees, dept_to_rooms, shifts, days, size, day_offset=0):
+    """Tạo quần thể ban đầu từ file lịch kỳ trước (.json hoặc .xlsx)
+    
+    Trả về (population, carry_in) để dùng cho fitness/hill_climb.
+    """
+    if os.path.splitext(filename)[1].lower() == ".json":
+        prev_schedule, prev_days = load_schedule_json(filename)
+    else:
+        prev_schedule, prev_days = load_schedule_from_excel(filename, employees, dept_to_rooms, shifts)
+    
+    if not prev_days:
+        raise ValueError(f"Không đọc được lịch trực nào từ file: {filename}")
+    
+    seed = seed_from_schedule(prev_schedule, prev_days, employees, dept_to_rooms, shifts, days, day_offset)
+    population = create_seeded_population(seed, employees, dept_to_rooms, shifts, days, size)
+    carry_in = extract_carry_in(prev_schedule, prev_days, shifts)
+    
+    return population, carry_in
+
+
+# =====================================================
+# ĐÁNH GIÁ DELTA VÀ LẬP LỊCH LẠI CỤC BỘ
+# =====================================================
+class DeltaEvaluator:
+    """Trạng thái tổng hợp của 1 lịch (GA format) để tính chênh lệch fitness khi sửa 1 ô
+    
+    Tổng điểm (total) luôn bằng fitness(schedule, ...), nhưng mỗi lần sửa 1 ô chỉ
+    tính lại các nhân viên trong ô đó thay vì duyệt lại toàn bộ lịch.
+    """
+    def __init__(self, schedule, employees, dept_to_rooms, shifts, days, carry_in=None):
+        self.schedule = schedule
+        self.emp = {e.id: e for e in employees}
+        self.shift_by_name = {s.name: s for s in shifts}
+        self.shifts = shifts
+        self.days = days
+        
+        self.room_dept = {}
+        for dept, rooms in dept_to_rooms.items():
+            for room in rooms:
+                self.room_dept.setdefault(room, dept)
+        
+        self.staff = defaultdict(list)
+        for e in employees:
+            self.staff[(e.department, e.role)].append(e)
+        
+        self.week_hours = defaultdict(lambda: defaultdict(int))
+        self.total_hours = defaultdict(int)
+        self.timeline = defaultdict(list)      # emp_id -> [(giờ bắt đầu, giờ kết thúc)] đã sắp xếp
+        self.busy = defaultdict(int)           # (emp_id, day, shift) -> số ô đang trực
+        
+        for i, seq in (carry_in or {}).items():
+            for d, s in seq:
+                insort(self.timeline[i], (d * 24 + s.start, d * 24 + s.end))
+        
+        self.hard_total = 0
+        for d in days:
+            for s in shifts:
+                for room, dept in self.room_dept.items():
+                    ids = schedule[d][s.name][room]
+                    self.hard_total += self._cell_hard(ids, dept, d)
+                    for i in ids:
+                        self._add_slot(i, d, s)
+        
+        self.emp_soft = {i: self._emp_soft(i) for i in self.total_hours}
+        self.soft_total = sum(self.emp_soft.values())
+        self.sum_hours = sum(self.total_hours.values())
+        self.fairness = self._fairness()
+    
+    @property
+    def total(self):
+        return self.hard_total + self.soft_total + self.fairness * W_FAIRNESS
+    
+    def _cell_hard(self, ids, dept, d):
+        """Điểm phạt ràng buộc cứng của 1 ô (giống fitness)"""
+        doctors = nurses = 0
+        has_senior = False
+        penalty = 0
+        for i in ids:
+            e = self.emp[i]
+            if e.role == "doctor":
+                doctors += 1
+            elif e.role == "nurse":
+                nurses += 1
+            if e.years_exp >= MIN_EXPERIENCE_YEARS:
+                has_senior = True
+            if e.department != dept:
+                penalty += W_WRONG_DEPT
+            if d in e.days_off:
+                penalty += W_DAY_OFF
+        
+        if doctors < MIN_DOCTOR_PER_SHIFT:
+            penalty += (MIN_DOCTOR_PER_SHIFT - doctors) * W_NO_DOCTOR
+        if nurses < MIN_NURSE_PER_SHIFT:
+            penalty += (MIN_NURSE_PER_SHIFT - nurses) * W_NO_NURSE
+        if doctors + nurses < MIN_TOTAL_PER_SHIFT:
+            penalty += (MIN_TOTAL_PER_SHIFT - doctors - nurses) * W_LESS_5
+        if not has_senior:
+            penalty += W_NO_SENIOR
+        return penalty
+    
+    def cell_hard(self, d, s_name, room):
+        return self._cell_hard(self.schedule[d][s_name][room], self.room_dept[room], d)
+    
+    def _emp_soft(self, i):
+        """Điểm phạt mềm của 1 nhân viên, trừ phần công bằng"""
+        penalty = 0
+        for h in self.week_hours[i].values():
+            if h > MAX_HOURS_PER_WEEK:
+                penalty += (h - MAX_HOURS_PER_WEEK) * W_OVER_30H
+        
+        seq = self.timeline[i]
+        for j in range(1, len(seq)):
+            if seq[j][0] >= 0 and seq[j][0] - seq[j-1][1] < MIN_REST_HOURS:
+                penalty += W_NO_REST
+        
+        h = self.total_hours[i]
+        if h > MAX_HOURS_PER_MONTH:
+            penalty += (h - MAX_HOURS_PER_MONTH) * W_OVER_MONTHLY
+        if h < MIN_HOURS_PER_MONTH:
+            penalty += (MIN_HOURS_PER_MONTH - h) * W_UNDER_MONTHLY
+        return penalty
+    
+    def _fairness(self):
+        if not self.total_hours:
+            return 0
+        avg = self.sum_hours / len(self.total_hours)
+        return sum(abs(h - avg) for h in self.total_hours.values())
+    
+    def _add_slot(self, i, d, s):
+        self.week_hours[i][d // 7] += s.hours
+        self.total_hours[i] += s.hours
+        insort(self.timeline[i], (d * 24 + s.start, d * 24 + s.end))
+        self.busy[(i, d, s.name)] += 1
+    
+    def _remove_slot(self, i, d, s):
+        week = self.week_hours[i]
+        week[d // 7] -= s.hours
+        if not week[d // 7]:
+            del week[d // 7]
+        self.total_hours[i] -= s.hours
+        if not self.total_hours[i]:
+            del self.total_hours[i]
+        self.timeline[i].remove((d * 24 + s.start, d * 24 + s.end))
+        self.busy[(i, d, s.name)] -= 1
+        if not self.busy[(i, d, s.name)]:
+            del self.busy[(i, d, s.name)]
+    
+    def set_cell(self, d, s_name, room, new_ids):
+        """Thay danh sách nhân viên của 1 ô và cập nhật điểm"""
+        ids = self.schedule[d][s_name][room]
+        dept = self.room_dept[room]
+        s = self.shift_by_name[s_name]
+        touched = set(ids) | set(new_ids)
+        old_hours = {i: self.total_hours.get(i, 0) for i in touched}
+        old_active = len(self.total_hours)
+        old_sum = self.sum_hours
+        
+        self.hard_total -= self._cell_hard(ids, dept, d)
+        for i in ids:
+            self._remove_slot(i, d, s)
+        for i in new_ids:
+            self._add_slot(i, d, s)
+        self.hard_total += self._cell_hard(new_ids, dept, d)
+        self.schedule[d][s_name][room] = list(new_ids)
+        
+        for i in touched:
+            new = self._emp_soft(i) if i in self.total_hours else 0
+            self.soft_total += new - self.emp_soft.pop(i, 0)
+            if i in self.total_hours:
+                self.emp_soft[i] = new
+        
+        self.sum_hours += sum(self.total_hours.get(i, 0) - old_hours[i] for i in touched)
+        if len(self.total_hours) == old_active and self.sum_hours == old_sum:
+            # Trung bình không đổi: chỉ các nhân viên trong ô thay đổi độ lệch
+            avg = self.sum_hours / old_active if old_active else 0
+            for i in touched:
+                if old_hours[i]:
+                    self.fairness -= abs(old_hours[i] - avg)
+                if self.total_hours.get(i, 0):
+                    self.fairness += abs(self.total_hours[i] - avg)
+        else:
+            self.fairness = self._fairness()
+    
+    def delta_cell(self, d, s_name, room, new_ids):
+        """Chênh lệch fitness nếu thay ô bằng new_ids (lịch không bị thay đổi)"""
+        old_ids = list(self.schedule[d][s_name][room])
+        before = self.total
+        self.set_cell(d, s_name, room, new_ids)
+        after = self.total
+        self.set_cell(d, s_name, room, old_ids)
+        return after - before
+    
+    def is_available(self, e, d, s_name):
+        """Nhân viên không nghỉ và chưa trực ca này ở phòng khác"""
+        return d not in e.days_off and (e.id, d, s_name) not in self.busy
+    
+    def is_rest_compliant(self, i, d, s_name):
+        """Thêm ca (d, s_name) cho nhân viên i vẫn đảm bảo MIN_REST_HOURS với 2 ca liền kề"""
+        s = self.shift_by_name[s_name]
+        start, end = d * 24 + s.start, d * 24 + s.end
+        seq = self.timeline[i]
+        k = bisect_left(seq, (start, end))
+        if k > 0 and start - seq[k-1][1] < MIN_REST_HOURS:
+            return False
+        if k < len(seq) and seq[k][0] - end < MIN_REST_HOURS:
+            return False
+        return True
+    
+    def best_addition(self, d, s_name, room, role=None):
+        """Ứng viên cùng khoa (và cùng chức vụ nếu có) làm fitness tốt nhất khi thêm vào ô
+        
+        Trả về (delta, emp_id) hoặc None nếu không còn ai rảnh.
+        """
+        ids = self.schedule[d][s_name][room]
+        dept = self.room_dept[room]
+        roles = [role] if role else ["doctor", "nurse"]
+        best = None
+        for r in roles:
+            for e in self.staff[(dept, r)]:
+                if e.id in ids or not self.is_available(e, d, s_name):
+                    continue
+                delta = self.delta_cell(d, s_name, room, ids + [e.id])
+                if best is None or delta < best[0]:
+                    best = (delta, e.id)
+        return best
+
+
+def reschedule_incremental(schedule, employees, dept_to_rooms, shifts, days, changed_emp_ids,
+                           changed_days=None, carry_in=None, radius=INCREMENTAL_RADIUS,
+                           time_limit=INCREMENTAL_TIME_LIMIT, steps=INCREMENTAL_STEPS,
+                           change_cost=INCREMENTAL_CHANGE_COST):
+    """Sửa lịch sau khi đổi ngày nghỉ/danh sách nhân viên mà không chạy lại GA
+    
+    Chỉ các ô có nhân viên bị ảnh hưởng được sửa, sau đó tìm kiếm cục bộ (đánh giá
+    delta) trên đúng các ô vừa sửa và các ca khác của nhân viên trong changed_emp_ids
+    thuộc radius ngày lân cận; các ô còn lại của lịch đã công bố giữ nguyên. Mỗi ca
+    đổi thêm ngoài các ô phải sửa cần cải thiện fitness hơn change_cost.
+    Trả về (schedule mới, danh sách ô đã đổi [(day, shift, room)]).
+    """
+    start_time = time.time()
+    emp = {e.id: e for e in employees}
+    changed = set(changed_emp_ids)
+    day_filter = set(changed_days) if changed_days is not None else None
+    
+    # Tìm các ô bị ảnh hưởng; nhân viên đã rời danh sách bị loại ngay
+    new_schedule = _empty_schedule()
+    affected = []
+    for d in days:
+        for s in shifts:
+            for dept, rooms in dept_to_rooms.items():
+                for room in rooms:
+                    ids = list(schedule[d][s.name][room])
+                    removed = [
+                        i for i in ids
+                        if i not in emp or (
+                            i in changed and (day_filter is None or d in day_filter) and
+                            (d in emp[i].days_off or emp[i].department != dept)
+                        )
+                    ]
+                    new_schedule[d][s.name][room] = [i for i in ids if i in emp]
+                    if removed:
+                        affected.append((d, s.name, room, removed))
+    
+    ev = DeltaEvaluator(new_schedule, employees, dept_to_rooms, shifts, days, carry_in)
+    touched = set()
+    
+    # Sửa: thay người bị loại bằng ứng viên cùng chức vụ có delta tốt nhất
+    for d, s_name, room, removed in affected:
+        ids = [i for i in ev.schedule[d][s_name][room] if i not in removed]
+        ev.set_cell(d, s_name, room, ids)
+        for i in removed:
+            best = ev.best_addition(d, s_name, room, emp[i].role if i in emp else None)
+            if best is not None:
+                ev.set_cell(d, s_name, room, ev.schedule[d][s_name][room] + [best[1]])
+        
+        while ev.cell_hard(d, s_name, room) > 0:
+            best = ev.best_addition(d, s_name, room)
+            if best is None or best[0] >= 0:
+                break
+            ev.set_cell(d, s_name, room, ev.schedule[d][s_name][room] + [best[1]])
+        
+        touched.add((d, s_name, room))
+    
+    # Tìm kiếm cục bộ: các ô vừa sửa + các ca của nhân viên bị thay đổi quanh ngày bị ảnh hưởng
+    day_set = set(days)
+    neighborhood = sorted({
+        nd for d, _, _, _ in affected for nd in range(d - radius, d + radius + 1) if nd in day_set
+    })
+    cells = sorted(touched | {
+        (d, s.name, room) for d in neighborhood for s in shifts for room in ev.room_dept
+        if changed.intersection(ev.schedule[d][s.name][room])
+    })
+    
+    for _ in range(steps if cells else 0):
+        if time.time() - start_time > time_limit:
+            break
+        
+        d, s_name, room = random.choice(cells)
+        ids = ev.schedule[d][s_name][room]
+        if not ids:
+            continue
+        
+        pos = random.randrange(len(ids))
+        pool = ev.staff[(ev.room_dept[room], emp[ids[pos]].role)]
+        cand = random.choice(pool)
+        if cand.id in ids or not ev.is_available(cand, d, s_name):
+            continue
+        
+        new_ids = list(ids)
+        new_ids[pos] = cand.id
+        cost = 0 if (d, s_name, room) in touched else change_cost
+        if ev.delta_cell(d, s_name, room, new_ids) < -cost:
+            ev.set_cell(d, s_name, room, new_ids)
+            touched.add((d, s_name, room))
+    
+    changed_cells = sorted(
+        (d, s_name, room) for d, s_name, room in touched
+        if sorted(ev.schedule[d][s_name][room]) != sorted(schedule[d][s_name][room])
+    )
+    
+    return ev.schedule, changed_cells
+
+
+def suggest_replacements(evaluator, emp_id, day, shift_name, limit=10):
+    """Gợi ý người thay ca cho emp_id ở (day, shift_name), xếp theo chênh lệch fitness
+    
+    Ứng viên cùng khoa và chức vụ, không nghỉ ngày đó, chưa trực ca đó và đủ
+    MIN_REST_HOURS với các ca liền kề. Dùng trạng thái của DeltaEvaluator làm chỉ mục
+    nên mỗi ứng viên chỉ tốn 1 lần đánh giá delta.
+    Trả về list dict {'employee', 'room', 'delta', 'hours'} tăng dần theo delta.
+    """
+    ev = evaluator
+    absent = ev.emp[emp_id]
+    rooms = [room for room in ev.room_dept if emp_id in ev.schedule[day][shift_name][room]]
+    
+    suggestions = []
+    for room in rooms:
+        ids = ev.schedule[day][shift_name][room]
+        pos = ids.index(emp_id)
+        for e in ev.staff[(absent.department, absent.role)]:
+            if e.id == emp_id or not ev.is_available(e, day, shift_name):
+                continue
+            if not ev.is_rest_compliant(e.id, day, shift_name):
+                continue
+            
+            new_ids = list(ids)
+            new_ids[pos] = e.id
+            suggestions.append({
+                'employee': e,
+                'room': room,
+                'delta': ev.delta_cell(day, shift_name, room, new_ids),
+                'hours': ev.total_hours.get(e.id, 0)
+            })
+    
+    suggestions.sort(key=lambda x: x['delta'])
+    return suggestions[:limit]
+
+
+def apply_replacement(evaluator, emp_id, new_id, day, shift_name, room):
+    """Thay emp_id bằng new_id trong 1 ô (giữ nguyên vị trí)"""
+    ids = list(evaluator.schedule[day][shift_name][room])
+    ids[ids.index(emp_id)] = new_id
+    evaluator.set_cell(day, shift_name, room, ids)
+
+
+# =====================================================
+# GA ENGINE VÀ ĐIỀU KIỆN DỪNG
+# =====================================================
+STOP_REASONS = {
+    'generations': "Đạt số thế hệ tối đa",
+    'time_limit': "Hết thời gian cho phép",
+    'target': "Đạt fitness mục tiêu",
+    'hard_bound': "Đạt cận dưới vi phạm cứng",
+    'no_improve_generations': "Không cải thiện sau nhiều thế hệ",
+    'no_improve_seconds': "Không cải thiện trong thời gian cho phép",
+    'stopped': "Người dùng dừng",
+}
+
+
+def hard_penalty(hard):
+    """Tổng điểm phạt cứng (đã nhân trọng số) từ dict hard của fitness(log=True)"""
+    return (
+        hard.get("no_doctor", 0)   * W_NO_DOCTOR +
+        hard.get("no_nurse", 0)    * W_NO_NURSE +
+        hard.get("less_than_5", 0) * W_LESS_5 +
+        hard.get("no_senior", 0)   * W_NO_SENIOR +
+        hard.get("wrong_dept", 0)  * W_WRONG_DEPT +
+        hard.get("day_off", 0)     * W_DAY_OFF
+    )
+
+
+class TerminationPolicy:
+    """Điều kiện dừng sớm của GA, ngoài số thế hệ tối đa
+    
+    time_limit: giới hạn thời gian chạy (giây)
+    target_soft: dừng khi phạt cứng đạt hard_floor và phạt mềm <= ngưỡng
+    patience_generations / patience_seconds: dừng khi không cải thiện sau N thế hệ / T giây
+    hard_floor: cận dưới phạt cứng (từ analyze_feasibility), mặc định 0
+    stop_at_hard_floor: dừng ngay khi phạt cứng đạt hard_floor
+    """
+    def __init__(self, time_limit=None, target_soft=None,
+                 patience_generations=None, patience_seconds=None,
+                 hard_floor=0, stop_at_hard_floor=False):
+        self.time_limit = time_limit
+        self.target_soft = target_soft
+        self.patience_generations = patience_generations
+        self.patience_seconds = patience_seconds
+        self.hard_floor = hard_floor
+        self.stop_at_hard_floor = stop_at_hard_floor
+        self.start()
+    
+    @classmethod
+    def from_config(cls, config=None):
+        return cls(
+            time_limit=_ga_param(config, 'TIME_LIMIT_SECONDS'),
+            target_soft=_ga_param(config, 'TARGET_SOFT_PENALTY'),
+            patience_generations=_ga_param(config, 'MAX_NO_IMPROVE_GENERATIONS'),
+            patience_seconds=_ga_param(config, 'MAX_NO_IMPROVE_SECONDS'),
+            stop_at_hard_floor=_ga_param(config, 'STOP_AT_HARD_BOUND'),
+        )
+    
+    def start(self):
+        self.start_time = self.last_improve_time = time.time()
+        self.last_improve_gen = 0
+        self.best = float("inf")
+    
+    def out_of_time(self):
+        """Đã vượt time_limit (kiểm tra giữa thế hệ, sau từng cá thể)"""
+        return self.time_limit is not None and time.time() - self.start_time >= self.time_limit
+    
+    def update(self, gen, best_fit, best_hard):
+        """Ghi nhận kết quả tốt nhất sau thế hệ gen, trả về lý do dừng hoặc None"""
+        now = time.time()
+        if best_fit < self.best:
+            self.best = best_fit
+            self.last_improve_gen = gen
+            self.last_improve_time = now
+        
+        reached_floor = best_hard is not None and best_hard <= self.hard_floor
+        if self.target_soft is not None and reached_floor and best_fit - best_hard <= self.target_soft:
+            return 'target'
+        if self.stop_at_hard_floor and reached_floor:
+            return 'hard_bound'
+        if self.time_limit is not None and now - self.start_time >= self.time_limit:
+            return 'time_limit'
+        if self.patience_generations is not None and gen - self.last_improve_gen >= self.patience_generations:
+            return 'no_improve_generations'
+        if self.patience_seconds is not None and now - self.last_improve_time >= self.patience_seconds:
+            return 'no_improve_seconds'
+        return None
+
+
+class GAProfiler:
+    """Bộ đếm thời gian từng pha và số lần gọi trong vòng lặp GA (bật bằng PROFILE_GA)
+    
+    run_ga bọc mỗi pha bằng t0 = start() ... stop(pha, t0). take_generation() trả về
+    {'phases': {pha: giây}, 'counts': {...}} của riêng thế hệ vừa xong và cộng dồn vào
+    total_phases / total_counts. evaluations và repairs lấy từ _op_counts nên tính cả các
+    lần gọi bên trong hill_climb, crossover và đột biến.
+    """
+    PHASES = ('initialization', 'evaluation', 'sorting', 'elite_copy', 'selection',
+              'crossover', 'mutate_scramble', 'mutate_balance_hours', 'hill_climb')
+    LABELS = {
+        'initialization': ('Khởi tạo quần thể', 'Khởi tạo'),
+        'evaluation': ('Đánh giá fitness', 'Đánh giá'),
+        'sorting': ('Sắp xếp', 'Sắp xếp'),
+        'elite_copy': ('Sao chép elite', 'Elite'),
+        'selection': ('Chọn lọc', 'Chọn lọc'),
+        'crossover': ('Lai ghép', 'Lai ghép'),
+        'mutate_scramble': ('Đột biến scramble', 'Scramble'),
+        'mutate_balance_hours': ('Đột biến cân bằng giờ', 'Cân bằng'),
+        'hill_climb': ('Hill climbing', 'HC'),
+    }
+    
+    def __init__(self):
+        self.phases = dict.fromkeys(self.PHASES, 0.0)
+        self.counts = Counter()
+        self.total_phases = dict.fromkeys(self.PHASES, 0.0)
+        self.total_counts = Counter()
+        self.generations = 0
+        self._mark = Counter(_op_counts)
+    
+    start = staticmethod(time.perf_counter)
+    
+    def stop(self, phase, t0):
+        self.phases[phase] += time.perf_counter() - t0
+    
+    def count(self, name, n=1):
+        self.counts[name] += n
+    
+    def take_generation(self):
+        now = Counter(_op_counts)
+        for key in ('evaluations', 'repairs'):
+            self.counts[key] += now[key] - self._mark[key]
+        self._mark = now
+        
+        record = {'phases': self.phases, 'counts': dict(self.counts)}
+        self.merge(record)
+        self.phases = dict.fromkeys(self.PHASES, 0.0)
+        self.counts = Counter()
+        return record
+    
+    def merge(self, record):
+        """Cộng dồn 1 bản ghi thế hệ (dùng cả ở GUI, nơi bản ghi đến từ tiến trình con)"""
+        for phase, seconds in record['phases'].items():
+            self.total_phases[phase] = self.total_phases.get(phase, 0.0) + seconds
+        self.total_counts.update(record['counts'])
+        self.generations += 1
+    
+    def summary(self, top=3):
+        """1 dòng ngắn: các pha tốn thời gian nhất và số lần gọi"""
+        total = sum(self.total_phases.values()) or 1.0
+        ranked = sorted(self.total_phases.items(), key=lambda kv: -kv[1])[:top]
+        parts = [f"{self.LABELS[p][1]} {v / total:.0%}" for p, v in ranked if v > 0]
+        c = self.total_counts
+        return (" · ".join(parts) + f" | {c['evaluations']:,} đánh giá, "
+                f"{c['cache_hits']:,} cache, {c['repairs']:,} sửa")
+    
+    def report(self, elapsed=None):
+        """Bảng thời gian theo pha (tổng, trung bình mỗi thế hệ, tỷ lệ) và các bộ đếm"""
+        measured = sum(self.total_phases.values())
+        total = max(elapsed or 0.0, measured) or 1.0
+        gens = max(self.generations, 1)
+        
+        lines = [f"THỐNG KÊ THỜI GIAN GA ({self.generations} thế hệ)",
+                 f"   {'Pha':24s} {'Tổng (s)':>10s} {'TB/thế hệ (ms)':>16s} {'%':>7s}"]
+        rows = list(self.total_phases.items())
+        if elapsed:
+            rows.append(('other', max(elapsed - measured, 0.0)))
+        for phase, seconds in rows:
+            label = self.LABELS[phase][0] if phase in self.LABELS else "Khác"
+            lines.append(f"   {label:24s} {seconds:10.3f} {seconds / gens * 1000:16.2f} "
+                         f"{seconds / total:7.1%}")
+        c = self.total_counts
+        lines.append(f"   Số lần đánh giá fitness: {c['evaluations']:,} "
+                     f"(dùng lại từ cache: {c['cache_hits']:,}) | "
+                     f"Sửa phân công (_create_valid_assignment): {c['repairs']:,}")
+        return "\n".join(lines)
+
+
+class _NullProfiler:
+    """Thay GAProfiler khi tắt đo: các lời gọi không làm gì"""
+    def start(self):
+        return 0.0
+    
+    def stop(self, phase, t0):
+        pass
+    
+    def count(self, name, n=1):
+        pass
+    
+    def take_generation(self):
+        return None
+
+
+_NULL_PROFILER = _NullProfiler()
+
+
+class RunProfiler:
+    """Profile 1 lần chạy GA, không cần công cụ ngoài
+    
+    - cProfile cho thread chạy GA -> <prefix>.pstats (đọc bằng pstats / snakeviz)
+    - thread phụ lấy mẫu stack mỗi interval giây -> <prefix>.collapsed (flamegraph.pl, speedscope)
+    - snapshot tracemalloc ở các thế hệ trong snapshot_generations (đếm từ 1 như log)
+      -> <prefix>_mem_genN.txt (top dòng cấp phát, chênh lệch với snapshot trước) và .tracemalloc
+    start() và stop() phải gọi trên thread chạy GA; on_generation(record) sau mỗi thế hệ.
+    """
+    def __init__(self, out_dir=None, prefix=None, snapshot_generations=(), interval=None):
+        self.out_dir = out_dir or PROFILE_DIR
+        self.prefix = prefix or time.strftime("ga_profile_%Y%m%d_%H%M%S")
+        self.snapshot_generations = set(snapshot_generations)
+        self.interval = interval or PROFILE_SAMPLE_INTERVAL
+        self.files = []
+        self.stacks = Counter()
+        self._prev_snapshot = None
+        self._tracing = False
+    
+    def _path(self, suffix):
+        return os.path.join(self.out_dir, self.prefix + suffix)
+    
+    def start(self):
+        import cProfile
+        import threading
+        import tracemalloc
+        
+        os.makedirs(self.out_dir, exist_ok=True)
+        if self.snapshot_generations and not tracemalloc.is_tracing():
+            tracemalloc.start(10)
+            self._tracing = True
+        
+        self._target = threading.get_ident()
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, daemon=True)
+        self._sampler.start()
+        self._cprofile = cProfile.Profile()
+        self._cprofile.enable()
+    
+    def _sample(self):
+        import sys
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+    
+    def on_generation(self, record):
+        import tracemalloc
+        
+        gen = record['gen'] + 1
+        if gen not in self.snapshot_generations or not tracemalloc.is_tracing():
+            return
+        
+        # Tạm tắt cProfile để thời gian chụp snapshot không lẫn vào .pstats
+        self._cprofile.disable()
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [f"Thế hệ {gen}: đang dùng {current / 2**20:.1f} MiB, đỉnh {peak / 2**20:.1f} MiB",
+                 "", "Top 25 vị trí cấp phát:"]
+        lines += [f"   {stat}" for stat in snapshot.statistics('lineno')[:25]]
+        if self._prev_snapshot is not None:
+            lines += ["", "Thay đổi so với snapshot trước:"]
+            lines += [f"   {stat}" for stat in snapshot.compare_to(self._prev_snapshot, 'lineno')[:25]]
+        self._prev_snapshot = snapshot
+        
+        text_path = self._path(f"_mem_gen{gen}.txt")
+        with open(text_path, 'w', encoding='utf-8') as f:
+            f.write("\n".join(lines) + "\n")
+        snapshot.dump(self._path(f"_mem_gen{gen}.tracemalloc"))
+        self.files += [text_path, self._path(f"_mem_gen{gen}.tracemalloc")]
+        self._cprofile.enable()
+    
+    def stop(self):
+        """Dừng đo và ghi file, trả về danh sách file đã ghi"""
+        import tracemalloc
+        
+        self._cprofile.disable()
+        self._stop.set()
+        self._sampler.join()
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
+        
+        self._cprofile.dump_stats(self._path(".pstats"))
+        with open(self._path(".collapsed"), 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        self.files = [self._path(".pstats"), self._path(".collapsed")] + self.files
+        return self.files
+
+
+def _ga_param(config, key):
+    """Tham số GA từ config (dict của GUI) hoặc hằng số của module"""
+    if config and key in config:
+        return config[key]
+    return globals()[key]
+
+
+def run_ga(employees, dept_to_rooms, shifts, days, config=None, population=None,
+           carry_in=None, policy=None, on_generation=None, should_stop=None, profiler=None,
+           on_population=None):
+    """Vòng lặp GA dùng chung cho lệnh run (cmd_run) và ứng dụng GUI
+    
+    population (tùy chọn) là các cá thể có sẵn, vd từ lịch kỳ trước; phần còn thiếu được
+    tạo bằng create_individual (pha 'initialization'), on_population(đã có, tổng số) báo
+    tiến độ sau mỗi 20 cá thể và khi đủ quần thể.
+    
+    on_generation(record) được gọi sau mỗi thế hệ với dict gồm gen, fit, hard, soft,
+    fairness, best_fit, best_hard (phạt cứng của lịch tốt nhất), elapsed, hill_climb.
+    should_stop() trả về True để dừng giữa chừng, được kiểm tra sau mỗi cá thể nên lệnh
+    dừng có hiệu lực trong vòng 1 lần tính fitness. time_limit của policy cũng được kiểm
+    tra ở cùng các điểm đó (kể cả lúc tạo quần thể): hết giờ giữa thế hệ thì các cá thể
+    đã đánh giá vẫn được tính vào lịch tốt nhất rồi dừng với lý do 'time_limit'; nếu
+    chưa có cá thể nào được đánh giá thì vẫn đánh giá 1 cá thể để có lịch trả về.
+    Khi truyền profiler (GAProfiler),
+    record có thêm 'profile' = thời gian từng pha và số lần gọi của thế hệ đó.
+    Fitness của các cá thể elite được giữ lại từ thế hệ trước (không tính lại).
+    Luôn trả về lịch tốt nhất đã gặp: (best_schedule, best_fit, history, reason).
+    """
+    pop_size = int(_ga_param(config, 'POPULATION_SIZE'))
+    generations = int(_ga_param(config, 'GENERATIONS'))
+    elite_size = int(_ga_param(config, 'ELITE_SIZE'))
+    mutation_rate = float(_ga_param(config, 'MUTATION_RATE'))
+    stagnation_limit = int(_ga_param(config, 'STAGNATION_LIMIT'))
+    hill_climb_steps = int(_ga_param(config, 'HILL_CLIMB_STEPS'))
+    
+    if policy is None:
+        policy = TerminationPolicy.from_config(config)
+    policy.start()
+    prof = profiler or _NULL_PROFILER
+    
+    def interrupted(have_result):
+        """'stopped' / 'time_limit' khi phải dừng giữa thế hệ, None nếu chạy tiếp"""
+        if should_stop and should_stop():
+            return 'stopped'
+        if have_result and policy.out_of_time():
+            return 'time_limit'
+        return None
+    
+    t0 = prof.start()
+    population = list(population or [])
+    while len(population) < pop_size:
+        interrupt = interrupted(bool(population))
+        if interrupt == 'stopped':
+            return None, float("inf"), [], 'stopped'
+        if interrupt:
+            break
+        population.append(create_individual(employees, dept_to_rooms, shifts, days))
+        if on_population and len(population) % 20 == 0 and len(population) < pop_size:
+            on_population(len(population), pop_size)
+    prof.stop('initialization', t0)
+    if on_population:
+        on_population(len(population), pop_size)
+    
+    # Fitness đã biết của các cá thể mang sang thế hệ sau, theo id(cá thể)
+    known_fit = {}
+    best_schedule = None
+    best_fit = float("inf")
+    best_hard = None
+    history = []
+    stagnation = 0
+    reason = 'generations'
+    
+    for gen in range(generations):
+        interrupt = interrupted(best_schedule is not None)
+        if interrupt:
+            reason = interrupt
+            break
+        
+        scored = []
+        t0 = prof.start()
+        for ind in population:
+            interrupt = interrupted(best_schedule is not None or bool(scored))
+            if interrupt:
+                break
+            fit = known_fit.get(id(ind))
+            if fit is None:
+                fit = fitness(ind, employees, dept_to_rooms, shifts, days, carry_in=carry_in)
+            else:
+                prof.count('cache_hits')
+            scored.append((fit, ind))
+        prof.stop('evaluation', t0)
+        if interrupt == 'stopped':
+            reason = 'stopped'
+            break
+        t0 = prof.start()
+        scored.sort(key=lambda x: x[0])
+        prof.stop('sorting', t0)
+        
+        best = scored[0][1]
+        t0 = prof.start()
+        fit, hard, soft, fairness = fitness(best, employees, dept_to_rooms, shifts, days,
+                                            log=True, carry_in=carry_in)
+        prof.stop('evaluation', t0)
+        history.append(fit)
+        
+        if fit < best_fit:
+            best_fit, best_hard = fit, hard_penalty(hard)
+            t0 = prof.start()
+            best_schedule = copy.deepcopy(best)
+            prof.stop('elite_copy', t0)
+            stagnation = 0
+        else:
+            stagnation += 1
+        
+        climbed = stagnation >= stagnation_limit and not interrupt
+        if climbed:
+            t0 = prof.start()
+            best = hill_climb(best, employees, dept_to_rooms, shifts, days, hill_climb_steps, carry_in)
+            stagnation = 0
+            hc_fit, hc_hard, _, _ = fitness(best, employees, dept_to_rooms, shifts, days,
+                                            log=True, carry_in=carry_in)
+            if hc_fit < best_fit:
+                best_fit, best_hard = hc_fit, hard_penalty(hc_hard)
+                best_schedule = copy.deepcopy(best)
+            prof.stop('hill_climb', t0)
+        
+        stop = interrupt or policy.update(gen, best_fit, best_hard)
+        if not stop:
+            t0 = prof.start()
+            new_pop = [copy.deepcopy(scored[i][1]) for i in range(elite_size)]
+            known_fit = {id(new_pop[i]): scored[i][0] for i in range(elite_size)}
+            if climbed:
+                # Giữ lại kết quả leo đồi thay cho bản sao của cá thể tốt nhất
+                del known_fit[id(new_pop[0])]
+                new_pop[0] = best
+                known_fit[id(best)] = hc_fit
+            prof.stop('elite_copy', t0)
+            
+            while len(new_pop) < pop_size:
+                stop = interrupted(True)
+                if stop:
+                    break
+                t0 = prof.start()
+                p1 = tournament_selection(scored)
+                p2 = tournament_selection(scored)
+                t1 = prof.start()
+                prof.stop('selection', t0)
+                child = crossover_uniform(p1, p2, employees, dept_to_rooms)
+                t2 = prof.start()
+                prof.stop('crossover', t1)
+                child = mutate_scramble(child, employees, dept_to_rooms, shifts, days, mutation_rate)
+                t3 = prof.start()
+                prof.stop('mutate_scramble', t2)
+                child = mutate_balance_hours(child, employees, dept_to_rooms, shifts, days, 0.3)
+                prof.stop('mutate_balance_hours', t3)
+                new_pop.append(child)
+        
+        if on_generation:
+            record = {
+                'gen': gen, 'fit': fit, 'hard': dict(hard), 'soft': dict(soft),
+                'fairness': fairness, 'best_fit': best_fit, 'best_hard': best_hard,
+                'elapsed': time.time() - policy.start_time, 'hill_climb': climbed
+            }
+            if profiler is not None:
+                record['profile'] = profiler.take_generation()
+            on_generation(record)
+        elif profiler is not None:
+            profiler.take_generation()
+        
+        if stop:
+            reason = stop
+            break
+        population = new_pop
+    
+    return best_schedule, best_fit, history, reason
+
+
+# =====================================================
+# PHÂN TÍCH KHẢ THI TRƯỚC KHI CHẠY GA
+# =====================================================
+def daily_rest_capacity(shifts):
+    """Số ca và số giờ tối đa 1 người trực mỗi ngày (lặp lại hằng ngày) mà vẫn đủ MIN_REST_HOURS"""
+    best = (0, 0)
+    ordered = sorted(shifts, key=lambda s: s.start)
+    for mask in range(1, 1 << len(ordered)):
+        chosen = [s for k, s in enumerate(ordered) if mask >> k & 1]
+        gaps = [chosen[j].start - chosen[j-1].end for j in range(1, len(chosen))]
+        # Khoảng nghỉ từ ca cuối hôm nay sang ca đầu hôm sau
+        gaps.append(24 + chosen[0].start - chosen[-1].end)
+        if min(gaps) >= MIN_REST_HOURS:
+            best = max(best, (len(chosen), sum(s.hours for s in chosen)))
+    return best
+
+
+def _pick_cost(tiers, k):
+    """Chi phí chọn k người rẻ nhất từ tiers [(chi phí/người, số người, số senior)] đã sắp
+    theo chi phí, kèm cờ có thể có senior trong nhóm đã chọn; None nếu không đủ người"""
+    cost, has_senior = 0, False
+    for unit, count, seniors in tiers:
+        if k <= 0:
+            break
+        take = min(k, count)
+        cost += take * unit
+        has_senior = has_senior or seniors > 0
+        k -= take
+    return (cost, has_senior) if k <= 0 else None
+
+
+def _pick_cost_with_senior(tiers, k):
+    """Chi phí chọn k người (k >= 1) trong đó chắc chắn có 1 senior; None nếu không được"""
+    best = None
+    for t, (unit, count, seniors) in enumerate(tiers):
+        if seniors == 0:
+            continue
+        rest = tiers[:t] + [(unit, count - 1, seniors - 1)] + tiers[t + 1:]
+        picked = _pick_cost(rest, k - 1)
+        if picked is not None and (best is None or unit + picked[0] < best):
+            best = unit + picked[0]
+    return best
+
+
+def cell_min_hard_penalty(doctor_tiers, nurse_tiers):
+    """Phạt cứng nhỏ nhất của 1 ô (ngày, ca, phòng)
+    
+    *_tiers: [(chi phí/người, số người, số senior)] theo thứ tự chi phí tăng dần, gồm người
+    của khoa còn rảnh (0), mượn khoa khác (W_WRONG_DEPT), người của khoa đang nghỉ
+    (W_DAY_OFF) và mượn người khoa khác đang nghỉ. Thử mọi số bác sĩ / điều dưỡng tới
+    mức đủ cả 3 ngưỡng và chọn cách rẻ nhất giữa để thiếu người và lấp bằng người đắt hơn.
+    """
+    limit = max(MIN_TOTAL_PER_SHIFT, MIN_DOCTOR_PER_SHIFT, MIN_NURSE_PER_SHIFT)
+    best = None
+    for x in range(limit + 1):
+        doc = _pick_cost(doctor_tiers, x)
+        if doc is None:
+            break
+        doc_senior = _pick_cost_with_senior(doctor_tiers, x) if x else None
+        for y in range(limit + 1):
+            nur = _pick_cost(nurse_tiers, y)
+            if nur is None:
+                break
+            shortfall = (max(0, MIN_DOCTOR_PER_SHIFT - x) * W_NO_DOCTOR +
+                         max(0, MIN_NURSE_PER_SHIFT - y) * W_NO_NURSE +
+                         max(0, MIN_TOTAL_PER_SHIFT - x - y) * W_LESS_5)
+            options = [doc[0] + nur[0] + (0 if doc[1] or nur[1] else W_NO_SENIOR)]
+            if doc_senior is not None:
+                options.append(doc_senior + nur[0])
+            if y:
+                nur_senior = _pick_cost_with_senior(nurse_tiers, y)
+                if nur_senior is not None:
+                    options.append(doc[0] + nur_senior)
+            total = shortfall + min(options)
+            if best is None or total < best:
+                best = total
+    return best
+
+
+def analyze_feasibility(employees, dept_to_rooms, shifts, days):
+    """Phân tích nhanh danh sách nhân viên và ngày nghỉ trước khi chạy GA
+    
+    - Với mỗi (khoa, ngày): số bác sĩ, điều dưỡng, người có kinh nghiệm còn rảnh và
+      điểm phạt cứng không thể tránh được. Mỗi ô lấy cách rẻ nhất giữa để thiếu người,
+      mượn người khoa khác (W_WRONG_DEPT) hoặc xếp người đang nghỉ (W_DAY_OFF), xem
+      cell_min_hard_penalty. Ràng buộc cứng chỉ xét từng ô và 1 người có thể ở nhiều ô,
+      nên các ô đạt mức nhỏ nhất độc lập với nhau: tổng là giá trị nhỏ nhất GA có thể
+      đạt (cận dưới chặt).
+    - Năng lực theo MIN_REST_HOURS (số ca/người/ngày) và MAX_HOURS_PER_WEEK: các thiếu
+      hụt ở đây buộc lịch phải vi phạm ràng buộc mềm hoặc trực trùng ca.
+    """
+    max_shifts, max_hours = daily_rest_capacity(shifts)
+    day_list = list(days)
+    week_len = defaultdict(int)
+    for d in day_list:
+        week_len[d // 7] += 1
+    
+    staff = defaultdict(lambda: defaultdict(int))      # dept -> nhóm -> tổng số
+    off = defaultdict(lambda: defaultdict(int))        # (dept, day) -> nhóm -> số người nghỉ
+    week_off = defaultdict(int)                        # (emp_id, week) -> số ngày nghỉ
+    day_set = set(day_list)
+    
+    # Nhóm theo vai trò và senior: "doctor", "doctor_senior", ... để dựng bậc chi phí mỗi ô
+    for e in employees:
+        groups = [e.role] + (["senior", e.role + "_senior"] if e.years_exp >= MIN_EXPERIENCE_YEARS else [])
+        for g in groups:
+            staff[e.department][g] += 1
+            staff[None][g] += 1
+        for d in e.days_off:
+            if d in day_set:
+                for g in groups:
+                    off[(e.department, d)][g] += 1
+                    off[(None, d)][g] += 1
+                week_off[(e.id, d // 7)] += 1
+    
+    def tiers(dept, d, role):
+        """Bậc chi phí (chi phí/người, số người, số senior) cho 1 vai trò ở (khoa, ngày)"""
+        result = []
+        for cost, scope, on_leave in ((0, dept, False), (W_WRONG_DEPT, None, False),
+                                      (W_DAY_OFF, dept, True), (W_WRONG_DEPT + W_DAY_OFF, None, True)):
+            counts = []
+            for g in (role, role + "_senior"):
+                n = off[(scope, d)][g] if on_leave else staff[scope][g] - off[(scope, d)][g]
+                if scope is None:
+                    # Khoa khác = toàn viện trừ khoa này
+                    n -= off[(dept, d)][g] if on_leave else staff[dept][g] - off[(dept, d)][g]
+                counts.append(n)
+            if counts[0] > 0:
+                result.append((cost, *counts))
+        return sorted(result)
+    
+    cell_cache = {}
+    
+    report = {
+        'hard_lower_bound': 0,
+        'max_shifts_per_day': max_shifts,
+        'cells': [],
+        'capacity': []
+    }
+    
+    shift_hours = sum(s.hours for s in shifts)
+    for dept, rooms in dept_to_rooms.items():
+        n_cells = len(rooms) * len(shifts)
+        for d in day_list:
+            avail = {g: staff[dept][g] - off[(dept, d)][g] for g in ("doctor", "nurse", "senior")}
+            
+            if (avail["doctor"] >= MIN_DOCTOR_PER_SHIFT and avail["nurse"] >= MIN_NURSE_PER_SHIFT
+                    and avail["doctor"] + avail["nurse"] >= MIN_TOTAL_PER_SHIFT and avail["senior"]):
+                penalty = 0     # Khoa tự đủ người: không cần xét mượn người / người đang nghỉ
+            else:
+                key = (tuple(tiers(dept, d, "doctor")), tuple(tiers(dept, d, "nurse")))
+                if key not in cell_cache:
+                    cell_cache[key] = cell_min_hard_penalty(list(key[0]), list(key[1]))
+                penalty = cell_cache[key] * n_cells
+            if penalty:
+                report['hard_lower_bound'] += penalty
+                report['cells'].append({
+                    'dept': dept, 'day': d + 1, 'doctors': avail["doctor"],
+                    'nurses': avail["nurse"], 'seniors': avail["senior"],
+                    'penalty': penalty
+                })
+            
+            # Năng lực theo thời gian nghỉ giữa ca
+            for g, per_cell in (("doctor", MIN_DOCTOR_PER_SHIFT), ("nurse", MIN_NURSE_PER_SHIFT),
+                                ("senior", 1)):
+                required = per_cell * n_cells
+                capacity = avail[g] * max_shifts
+                if capacity < required:
+                    report['capacity'].append({
+                        'kind': 'rest', 'dept': dept, 'period': f"Ngày {d + 1}", 'role': g,
+                        'required': required, 'capacity': capacity, 'shortage': required - capacity
+                    })
+    
+    # Năng lực theo giờ làm tối đa mỗi tuần
+    week_capacity = defaultdict(int)
+    for e in employees:
+        for week, n in week_len.items():
+            free_days = n - week_off.get((e.id, week), 0)
+            week_capacity[(e.department, e.role, week)] += min(MAX_HOURS_PER_WEEK, free_days * max_hours)
+    
+    for dept, rooms in dept_to_rooms.items():
+        for week, n in sorted(week_len.items()):
+            for role, per_cell in (("doctor", MIN_DOCTOR_PER_SHIFT), ("nurse", MIN_NURSE_PER_SHIFT)):
+                required = per_cell * len(rooms) * shift_hours * n
+                capacity = week_capacity[(dept, role, week)]
+                if capacity < required:
+                    report['capacity'].append({
+                        'kind': 'week', 'dept': dept, 'period': f"Tuần {week + 1}", 'role': role,
+                        'required': required, 'capacity': capacity, 'shortage': required - capacity
+                    })
+    
+    report['feasible'] = report['hard_lower_bound'] == 0
+    return report
+
+
+def print_feasibility_report(report):
+    print("\n" + "="*80)
+    print("PHÂN TÍCH KHẢ THI")
+    print("="*80)
+    
+    if report['feasible']:
+        print("Có thể đạt 0 vi phạm ràng buộc cứng.")
+    else:
+        print(f"Không thể tránh vi phạm cứng: cận dưới = {report['hard_lower_bound']:,.0f} "
+              f"({len(report['cells'])} khoa-ngày thiếu người)")
+        for c in report['cells'][:5]:
+            print(f"   {c['dept']}, ngày {c['day']}: {c['doctors']} BS, {c['nurses']} DD, "
+                  f"{c['seniors']} senior còn rảnh")
+        if len(report['cells']) > 5:
+            print(f"   ... và {len(report['cells']) - 5} khoa-ngày khác")
+    
+    print(f"\nMỗi người trực tối đa {report['max_shifts_per_day']} ca/ngày để đủ {MIN_REST_HOURS}h nghỉ")
+    if report['capacity']:
+        print(f"Thiếu năng lực (sẽ phải vi phạm ràng buộc mềm): {len(report['capacity'])} mục")
+        for c in report['capacity'][:5]:
+            print(f"   {c['dept']}, {c['period']}, {c['role']}: cần {c['required']}, "
+                  f"tối đa {c['capacity']} ({'ca' if c['kind'] == 'rest' else 'giờ'})")
+        if len(report['capacity']) > 5:
+            print(f"   ... và {len(report['capacity']) - 5} mục khác")
+    else:
+        print("Đủ năng lực theo thời gian nghỉ và giờ làm tối đa mỗi tuần.")
+    print("="*80 + "\n")
+
+
+# =====================================================
+# LỊCH TRỰC DÙNG CHUNG (GA, DASHBOARD, XUẤT FILE)
+# =====================================================
+Assignment = namedtuple('Assignment', ['day', 'shift', 'room', 'employee'])
+
+
+class ScheduleStore:
+    """Lịch trực dùng chung cho GA, dashboard và xuất file
+    
+    Dữ liệu gốc là schedule[day][shift_name][room] = [emp_ids] (GA format), không sao chép.
+    Các view chỉ đọc theo ngày / nhân viên / phòng / khoa / ô (ngày, ca) được dựng riêng
+    từng loại khi dùng lần đầu và giữ tới khi version đổi; sau khi sửa trực tiếp schedule
+    (vd DeltaEvaluator.set_cell) gọi touch() để các view được dựng lại khi dùng.
+    Mỗi view là mapping {day: tuple(Assignment)} chỉ gồm các ngày có phân công.
+    """
+    # Khóa gom nhóm của các view theo nhân viên / phòng / khoa
+    GROUP_KEYS = {
+        'employee': lambda a: a.employee.id,
+        'room': lambda a: a.room,
+        'department': lambda a: a.employee.department,
+    }
+    
+    def __init__(self, schedule, employees, shifts, days):
+        self.schedule = schedule
+        self.emp = {e.id: e for e in employees}
+        self.shifts = list(shifts)
+        self.days = list(days)
+        self.version = 0
+        
+        self.ids_by_name = defaultdict(list)
+        for e in employees:
+            self.ids_by_name[e.name].append(e.id)
+        
+        self._views = {}    # loại view -> (version, view)
+    
+    def cell(self, day, shift_name, room):
+        return self.schedule[day][shift_name][room]
+    
+    def touch(self):
+        """Đánh dấu lịch đã thay đổi, các view sẽ được dựng lại khi dùng"""
+        self.version += 1
+    
+    def _assignments(self):
+        for d in self.days:
+            day_schedule = self.schedule.get(d, {})
+            for s in self.shifts:
+                for room, ids in day_schedule.get(s.name, {}).items():
+                    for i in ids:
+                        e = self.emp.get(i)
+                        if e is not None:
+                            yield Assignment(d, s, room, e)
+    
+    def _view(self, kind):
+        cached = self._views.get(kind)
+        if cached is not None and cached[0] == self.version:
+            return cached[1]
+        
+        freeze = lambda groups: MappingProxyType({k: tuple(v) for k, v in groups.items()})
+        if kind in self.GROUP_KEYS:
+            key = self.GROUP_KEYS[kind]
+            groups = defaultdict(lambda: defaultdict(list))
+            for a in self._assignments():
+                groups[key(a)][a.day].append(a)
+            view = {k: freeze(v) for k, v in groups.items()}
+        else:
+            groups = defaultdict(list)
+            for a in self._assignments():
+                groups[a.day if kind == 'day' else (a.day, a.shift.name)].append(a)
+            view = freeze(groups)
+        
+        self._views[kind] = (self.version, view)
+        return view
+    
+    def by_day(self):
+        return self._view('day')
+    
+    def by_cell(self):
+        """{(day, shift_name): tuple(Assignment)}"""
+        return self._view('cell')
+    
+    def by_employee(self, emp_id):
+        return self._view('employee').get(emp_id, _EMPTY_VIEW)
+    
+    def by_room(self, room):
+        return self._view('room').get(room, _EMPTY_VIEW)
+    
+    def by_department(self, dept):
+        return self._view('department').get(dept, _EMPTY_VIEW)
+    
+    def filter(self, dept=None, emp_name=None):
+        """View theo khoa và/hoặc tên nhân viên (None = không lọc)"""
+        if emp_name is None:
+            return self.by_day() if dept is None else self.by_department(dept)
+        
+        ids = [i for i in self.ids_by_name.get(emp_name, [])
+               if dept is None or self.emp[i].department == dept]
+        if len(ids) == 1:
+            return self.by_employee(ids[0])
+        
+        # Trùng tên: gộp view của các nhân viên cùng tên
+        merged = defaultdict(list)
+        for i in ids:
+            for d, items in self.by_employee(i).items():
+                merged[d].extend(items)
+        return MappingProxyType({d: tuple(v) for d, v in sorted(merged.items())})
+    
+    @staticmethod
+    def group_by_cell(view):
+        """Gom 1 view {day: Assignment} thành {(day, shift_name): [Assignment]}"""
+        groups = defaultdict(list)
+        for items in view.values():
+            for a in items:
+                groups[(a.day, a.shift.name)].append(a)
+        return groups
+
+
+_EMPTY_VIEW = MappingProxyType({})
+
+
+# =====================================================
+# CHẠY GA TRONG TIẾN TRÌNH CON
+# =====================================================
+def schedule_to_dict(schedule):
+    """Chuyển lịch (defaultdict lồng nhau, không pickle được) sang dict thường"""
+    return {
+        d: {s_name: {room: list(ids) for room, ids in rooms.items()}
+            for s_name, rooms in day_schedule.items()}
+        for d, day_schedule in schedule.items()
+    }
+
+
+def schedule_from_dict(data):
+    """Ngược lại với schedule_to_dict"""
+    schedule = _empty_schedule()
+    for d, day_schedule in data.items():
+        for s_name, rooms in day_schedule.items():
+            for room, ids in rooms.items():
+                schedule[d][s_name][room] = list(ids)
+    return schedule
+
+
+def ga_worker(conn, stop_event, employees, dept_to_rooms, shifts, days, config=None,
+              termination=None, warm_start_file=None, profile=None):
+    """Chạy GA trong tiến trình con, gửi tiến độ về qua multiprocessing Pipe
+    
+    Thông điệp gửi đi:
+    - ('population', đã tạo, tổng số) (xem run_ga)
+    - ('generation', record) sau mỗi thế hệ (xem run_ga)
+    - ('profile', danh sách file) khi truyền profile (tham số của RunProfiler)
+    - ('result', schedule_dict, best_fit, history, reason, carry_in, elapsed)
+    - ('error', mô tả lỗi)
+    stop_event (multiprocessing.Event) được kiểm tra sau mỗi cá thể.
+    """
+    run_profiler = RunProfiler(**profile) if profile is not None else None
+    if run_profiler:
+        run_profiler.start()
+    
+    def on_generation(record):
+        if run_profiler:
+            run_profiler.on_generation(record)
+        conn.send(('generation', record))
+    
+    try:
+        policy = TerminationPolicy(**(termination or {}))
+        pop_size = int(_ga_param(config, 'POPULATION_SIZE'))
+        profiler = GAProfiler() if _ga_param(config, 'PROFILE_GA') else None
+        
+        population, carry_in = [], None
+        if warm_start_file:
+            t0 = time.perf_counter()
+            population, carry_in = warm_start_population(warm_start_file, employees, dept_to_rooms,
+                                                          shifts, days, pop_size)
+            if profiler:
+                profiler.stop('initialization', t0)
+        
+        best_schedule, best_fit, history, reason = run_ga(
+            employees, dept_to_rooms, shifts, days, config=config,
+            population=population, carry_in=carry_in, policy=policy,
+            on_generation=on_generation,
+            should_stop=stop_event.is_set,
+            profiler=profiler,
+            on_population=lambda created, total: conn.send(('population', created, total)))
+        
+        if best_schedule is not None:
+            best_schedule = schedule_to_dict(best_schedule)
+        if run_profiler:
+            conn.send(('profile', run_profiler.stop()))
+            run_profiler = None
+        conn.send(('result', best_schedule, best_fit, history, reason, carry_in,
+                   time.time() - policy.start_time))
+    except Exception as e:
+        conn.send(('error', f"{type(e).__name__}: {e}"))
+    finally:
+        if run_profiler:
+            run_profiler.stop()
+        conn.close()
+
+
 def export_calendar_to_excel(schedule, employees, dept_to_rooms, shifts, days, filename="lich_truc.xlsx"):
     """Xuất lịch trực theo khoa và phòng"""
+    import pandas as pd
+    
     emp_dict = {e.id: e for e in employees}
     
     with pd.ExcelWriter(filename, engine='openpyxl') as writer:
@@ -753,7 +2452,7 @@ def export_calendar_to_excel(schedule, employees, dept_to_rooms, shifts, days, f
                 
                 df = pd.DataFrame(data)
                 
-                sheet_name = f"{dept[:10]}_{room[:15]}".replace("/", "-")[:31]
+                sheet_name = _room_sheet_name(dept, room)
                 df.to_excel(writer, sheet_name=sheet_name, index=False)
                 
                 worksheet = writer.sheets[sheet_name]
@@ -784,8 +2483,95 @@ def export_calendar_to_excel(schedule, employees, dept_to_rooms, shifts, days, f
     print(f"\nĐã xuất lịch trực ra file: {filename}")
 
 
+def _excel_named_styles(wb):
+    """Đăng ký các style dùng chung cho file xuất (header, dòng chẵn/lẻ) và trả về tên style"""
+    from openpyxl.styles import Alignment, PatternFill, Font, NamedStyle
+    
+    styles = {
+        'header': NamedStyle(name="lt_header",
+                             font=Font(bold=True, color="FFFFFF"),
+                             fill=PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid"),
+                             alignment=Alignment(horizontal='center', vertical='center', wrap_text=True)),
+        'even': NamedStyle(name="lt_even",
+                           fill=PatternFill(start_color="E7E6E6", end_color="E7E6E6", fill_type="solid"),
+                           alignment=Alignment(horizontal='center', vertical='center', wrap_text=True)),
+        'odd': NamedStyle(name="lt_odd",
+                          fill=PatternFill(start_color="FFFFFF", end_color="FFFFFF", fill_type="solid"),
+                          alignment=Alignment(horizontal='center', vertical='center', wrap_text=True))
+    }
+    for style in styles.values():
+        wb.add_named_style(style)
+    return {key: style.name for key, style in styles.items()}
+
+
+def _styled_row(ws, values, style):
+    from openpyxl.cell import WriteOnlyCell
+    
+    row = []
+    for value in values:
+        cell = WriteOnlyCell(ws, value=value)
+        cell.style = style
+        row.append(cell)
+    return row
+
+
+def export_calendar_to_excel_fast(schedule, employees, dept_to_rooms, shifts, days,
+                                  filename="lich_truc.xlsx", on_sheet=None):
+    """Xuất lịch trực theo khoa và phòng, cùng bố cục với export_calendar_to_excel
+    
+    Dùng openpyxl write-only: các dòng được ghi ngay khi sinh ra từ lịch (không qua
+    DataFrame) nên bộ nhớ không tăng theo số ngày/phòng; style dùng chung qua NamedStyle.
+    on_sheet(đã ghi, tổng số sheet) được gọi sau mỗi sheet.
+    """
+    import openpyxl
+    from openpyxl.utils import get_column_letter
+    
+    # Nhãn và chức vụ của từng nhân viên tính 1 lần
+    label = {e.id: f"{e.name} ({e.years_exp}y)" for e in employees}
+    is_doctor = {e.id: e.role == "doctor" for e in employees}
+    
+    header = ["Ngày"]
+    for shift in shifts:
+        header += [f"{shift.name}\nBác sĩ", f"{shift.name}\nĐiều dưỡng"]
+    
+    wb = openpyxl.Workbook(write_only=True)
+    style = _excel_named_styles(wb)
+    
+    total = sum(len(rooms) for rooms in dept_to_rooms.values())
+    written = 0
+    for dept, rooms in dept_to_rooms.items():
+        for room in rooms:
+            ws = wb.create_sheet(title=_room_sheet_name(dept, room))
+            ws.column_dimensions['A'].width = 12
+            for col in range(2, len(header) + 1):
+                ws.column_dimensions[get_column_letter(col)].width = 20
+            
+            ws.append(_styled_row(ws, header, style['header']))
+            
+            for idx, day in enumerate(days, start=2):
+                day_schedule = schedule.get(day, {})
+                row = [f"Ngày {day + 1}"]
+                for shift in shifts:
+                    assignment = day_schedule.get(shift.name, {}).get(room, ())
+                    doctors = [label[i] for i in assignment if is_doctor[i]]
+                    nurses = [label[i] for i in assignment if not is_doctor[i]]
+                    row.append("\n".join(doctors) if doctors else "THIẾU")
+                    row.append("\n".join(nurses) if nurses else "THIẾU")
+                
+                ws.append(_styled_row(ws, row, style['even'] if idx % 2 == 0 else style['odd']))
+            
+            written += 1
+            if on_sheet:
+                on_sheet(written, total)
+    
+    wb.save(filename)
+    print(f"\nĐã xuất lịch trực ra file: {filename}")
+
+
 def export_employee_hours_to_excel(schedule, employees, dept_to_rooms, shifts, days, filename="gio_lam_nhan_vien.xlsx"):
     """Xuất thời gian làm việc của từng nhân viên"""
+    import pandas as pd
+    
     emp_dict = {e.id: e for e in employees}
     
     employee_hours = defaultdict(lambda: {
@@ -905,8 +2691,135 @@ def export_employee_hours_to_excel(schedule, employees, dept_to_rooms, shifts, d
     print(f"\nĐã xuất thời gian làm việc nhân viên ra file: {filename}")
 
 
+def assignment_table(schedule, employees, dept_to_rooms, shifts, days):
+    """Bảng phẳng các phân công: day, shift, room, dept, employee_id, role, hours
+    
+    Duyệt lịch 1 lần theo thứ tự ngày -> ca -> phòng; day tính từ 0, dept là khoa của phòng.
+    """
+    import pandas as pd
+    
+    role = {e.id: e.role for e in employees}
+    rooms = [(dept, room) for dept, dept_rooms in dept_to_rooms.items() for room in dept_rooms]
+    
+    cols = {'day': [], 'shift': [], 'room': [], 'dept': [], 'employee_id': [], 'hours': []}
+    for d in days:
+        day_schedule = schedule.get(d, {})
+        for s in shifts:
+            shift_schedule = day_schedule.get(s.name, {})
+            for dept, room in rooms:
+                ids = shift_schedule.get(room, ())
+                n = len(ids)
+                if not n:
+                    continue
+                cols['day'] += [d] * n
+                cols['shift'] += [s.name] * n
+                cols['room'] += [room] * n
+                cols['dept'] += [dept] * n
+                cols['employee_id'] += list(ids)
+                cols['hours'] += [s.hours] * n
+    
+    df = pd.DataFrame(cols)
+    df.insert(5, 'role', df['employee_id'].map(role))
+    return df
+
+
+def _column_widths(df, limit=20):
+    """Độ rộng cột Excel tính từ dữ liệu cột (không duyệt từng ô)"""
+    widths = []
+    for col in df.columns:
+        longest = df[col].astype(str).str.len().max() if len(df) else 0
+        widths.append(min(max(len(str(col)), int(longest)) + 2, limit))
+    return widths
+
+
+def _write_frame(wb, title, df, style, widths=None):
+    """Ghi 1 DataFrame vào sheet write-only mới, style header/dòng chẵn lẻ dùng chung"""
+    from openpyxl.utils import get_column_letter
+    
+    ws = wb.create_sheet(title=title)
+    for col, width in enumerate(widths or _column_widths(df), start=1):
+        ws.column_dimensions[get_column_letter(col)].width = width
+    
+    ws.append(_styled_row(ws, list(df.columns), style['header']))
+    for idx, values in enumerate(df.itertuples(index=False, name=None), start=2):
+        ws.append(_styled_row(ws, values, style['even'] if idx % 2 == 0 else style['odd']))
+    return ws
+
+
+def export_employee_hours_to_excel_fast(schedule, employees, dept_to_rooms, shifts, days,
+                                        filename="gio_lam_nhan_vien.xlsx", details="sheets",
+                                        on_sheet=None):
+    """Xuất thời gian làm việc của từng nhân viên (bản nhanh của export_employee_hours_to_excel)
+    
+    Tổng giờ, số ca và giờ theo tuần được tính bằng group-by trên assignment_table.
+    details: "sheets" = mỗi nhân viên 1 sheet như bản cũ, "long" = 1 sheet "Chi tiết"
+    gộp tất cả, None = chỉ sheet tổng hợp. on_sheet(đã ghi, tổng số sheet) sau mỗi sheet.
+    """
+    import openpyxl
+    import numpy as np
+    import pandas as pd
+    
+    emp_dict = {e.id: e for e in employees}
+    table = assignment_table(schedule, employees, dept_to_rooms, shifts, days)
+    table['week'] = table['day'] // 7
+    
+    grouped = table.groupby('employee_id', sort=False)['hours']
+    weekly = table.pivot_table(index='employee_id', columns='week', values='hours',
+                               aggfunc='sum', fill_value=0)
+    weekly = weekly.reindex(columns=range(max(days) // 7 + 1), fill_value=0)
+    
+    ids = list(grouped.groups.keys())
+    summary = pd.DataFrame({
+        'ID': ids,
+        'Tên': [emp_dict[i].name for i in ids],
+        'Chức vụ': ['Bác sĩ' if emp_dict[i].role == 'doctor' else 'Điều dưỡng' for i in ids],
+        'Khoa': [emp_dict[i].department for i in ids],
+        'Kinh nghiệm (năm)': [emp_dict[i].years_exp for i in ids],
+        'Tổng giờ': grouped.sum().reindex(ids).values,
+        'Số ca trực': grouped.count().reindex(ids).values,
+    })
+    weeks_worked = (weekly > 0).sum(axis=1).reindex(ids).values
+    summary['TB giờ/tuần'] = (summary['Tổng giờ'] / np.maximum(weeks_worked, 1)).round(1)
+    for week in weekly.columns:
+        summary[f'Tuần {week + 1}'] = weekly[week].reindex(ids).values
+    summary = summary.sort_values(['Khoa', 'Chức vụ', 'Tổng giờ'], ascending=[True, True, False])
+    
+    detail = table.rename(columns={'shift': 'Ca', 'room': 'Phòng', 'hours': 'Giờ làm'})
+    detail['Ngày'] = detail['day'] + 1
+    
+    total = 1 + (len(ids) if details == "sheets" else 1 if details == "long" else 0)
+    wb = openpyxl.Workbook(write_only=True)
+    style = _excel_named_styles(wb)
+    
+    _write_frame(wb, 'Tổng hợp', summary, style)
+    written = 1
+    if on_sheet:
+        on_sheet(written, total)
+    
+    if details == "long":
+        detail['ID'] = detail['employee_id']
+        detail['Tên'] = detail['employee_id'].map({i: e.name for i, e in emp_dict.items()})
+        _write_frame(wb, 'Chi tiết', detail[['ID', 'Tên', 'Ngày', 'Ca', 'Phòng', 'Giờ làm']], style)
+        written += 1
+        if on_sheet:
+            on_sheet(written, total)
+    
+    elif details == "sheets":
+        columns = ['Ngày', 'Ca', 'Phòng', 'Giờ làm']
+        for emp_id, rows in detail.groupby('employee_id', sort=False):
+            _write_frame(wb, emp_dict[emp_id].name[:31], rows[columns], style, widths=[15] * 4)
+            written += 1
+            if on_sheet:
+                on_sheet(written, total)
+    
+    wb.save(filename)
+    print(f"\nĐã xuất thời gian làm việc nhân viên ra file: {filename}")
+
+
 def export_violations_to_excel(hard_violations, soft_violations, soft_metrics, filename="bao_cao_vi_pham.xlsx"):
     """Xuất báo cáo vi phạm ra Excel"""
+    import pandas as pd
+    
     with pd.ExcelWriter(filename, engine='openpyxl') as writer:
         from openpyxl.styles import Alignment, PatternFill, Font
         
@@ -976,6 +2889,251 @@ def export_violations_to_excel(hard_violations, soft_violations, soft_metrics, f
     print(f"\nĐã xuất báo cáo vi phạm ra file: {filename}")
 
 
+def _write_schedule_sheet(ws, view, shifts, days, title):
+    """Ghi 1 view lịch trực (ScheduleStore) vào sheet dạng lưới ca x ngày"""
+    from openpyxl.styles import Alignment, PatternFill, Font, Border, Side
+    from openpyxl.utils import get_column_letter
+    
+    by_day_shift = ScheduleStore.group_by_cell(view)
+    
+    header_font = Font(bold=True, color="FFFFFF")
+    header_fill = PatternFill(start_color="1976D2", end_color="1976D2", fill_type="solid")
+    shift_fill = PatternFill(start_color="90CAF9", end_color="90CAF9", fill_type="solid")
+    center_align = Alignment(horizontal="center", vertical="center", wrap_text=True)
+    top_align = Alignment(horizontal="left", vertical="top", wrap_text=True)
+    thin = Side(style='thin')
+    border = Border(left=thin, right=thin, top=thin, bottom=thin)
+    
+    ws.merge_cells('A1:H1')
+    title_cell = ws['A1']
+    title_cell.value = f"LỊCH TRỰC - {title.upper()}"
+    title_cell.font = Font(bold=True, size=16)
+    title_cell.alignment = center_align
+    ws.row_dimensions[1].height = 30
+    
+    for col, value in enumerate(["Ca trực"] + list(days), 1):
+        cell = ws.cell(row=3, column=col, value=value)
+        cell.font = header_font
+        cell.fill = header_fill
+        cell.alignment = center_align
+        cell.border = border
+    
+    row = 4
+    shift_font = Font(bold=True)
+    for shift in shifts:
+        shift_cell = ws.cell(row=row, column=1, value=f"{shift.name}\n({shift.start}-{shift.end})")
+        shift_cell.font = shift_font
+        shift_cell.fill = shift_fill
+        shift_cell.alignment = center_align
+        shift_cell.border = border
+        
+        for col, day in enumerate(days, 2):
+            in_shift = by_day_shift.get((day, shift.name))
+            content = "\n".join(f"{a.employee.name} ({a.room})" for a in in_shift) if in_shift else "-"
+            cell = ws.cell(row=row, column=col, value=content)
+            cell.alignment = top_align
+            cell.border = border
+        
+        ws.row_dimensions[row].height = 60
+        row += 1
+    
+    ws.column_dimensions['A'].width = 20
+    for col in range(2, len(days) + 2):
+        ws.column_dimensions[get_column_letter(col)].width = 30
+    
+    row += 2
+    ws.cell(row=row, column=1, value="THỐNG KÊ:").font = Font(bold=True)
+    ws.cell(row=row + 1, column=1, value=f"Tổng số ca trực: {sum(len(v) for v in view.values())}")
+    names = {a.employee.name for items in view.values() for a in items}
+    ws.cell(row=row + 2, column=1, value=f"Số nhân viên: {len(names)}")
+
+
+def export_schedule_to_excel(schedule, employees, dept_to_rooms, shifts, days,
+                             filename="lich_truc.xlsx", export_type="all", on_sheet=None):
+    """Xuất lịch trực dạng lưới ca x ngày
+    
+    export_type: "all" = 1 sheet toàn bộ, "department" = mỗi khoa 1 sheet,
+    "employee" = mỗi nhân viên 1 sheet. on_sheet(đã ghi, tổng số sheet) sau mỗi sheet.
+    """
+    import openpyxl
+    
+    store = ScheduleStore(schedule, employees, shifts, days)
+    if export_type == "department":
+        sheets = [(dept, store.by_department(dept)) for dept in dept_to_rooms]
+    elif export_type == "employee":
+        sheets = [(emp.name, store.by_employee(emp.id)) for emp in employees]
+    else:
+        sheets = [("Toàn bộ", store.by_day())]
+    
+    wb = openpyxl.Workbook()
+    wb.remove(wb.active)
+    for written, (title, view) in enumerate(sheets, start=1):
+        _write_schedule_sheet(wb.create_sheet(title=title[:31]), view, shifts, days, title)
+        if on_sheet:
+            on_sheet(written, len(sheets))
+    
+    wb.save(filename)
+
+
+def _add_month(df, start_date=None):
+    """Thêm cột month từ cột day (tính từ 0): day // 30, hoặc 'YYYY-MM' (kèm cột date) khi có start_date"""
+    import pandas as pd
+    
+    if start_date is None:
+        df['month'] = df['day'] // 30
+    else:
+        df['date'] = pd.Timestamp(start_date) + pd.to_timedelta(df['day'], unit='D')
+        df['month'] = df['date'].dt.strftime('%Y-%m')
+    return df
+
+
+def violations_table(hard_violations, soft_violations):
+    """Gộp các danh sách vi phạm của check_constraints_detailed thành 1 bảng dài
+    
+    Cột level ('hard'/'soft') và type, các cột còn lại là hợp các trường của từng loại.
+    day được đổi về tính từ 0 như assignment_table; cột danh sách (staff) nối thành chuỗi.
+    """
+    import pandas as pd
+    
+    frames = []
+    for level, groups in (('hard', hard_violations), ('soft', soft_violations)):
+        for vtype, items in groups.items():
+            if not items:
+                continue
+            frame = pd.DataFrame(items)
+            frame.insert(0, 'type', vtype)
+            frame.insert(0, 'level', level)
+            frames.append(frame)
+    
+    if not frames:
+        return pd.DataFrame(columns=['level', 'type'])
+    
+    df = pd.concat(frames, ignore_index=True)
+    if 'day' in df:
+        df['day'] = df['day'] - 1
+    if 'staff' in df:
+        df['staff'] = df['staff'].map(lambda v: ", ".join(v) if isinstance(v, list) else v)
+    return df
+
+
+def parquet_engine():
+    """Tên thư viện ghi Parquet đã cài ("pyarrow" / "fastparquet"), None nếu chưa có (không import)"""
+    import importlib.util
+    
+    for name in ("pyarrow", "fastparquet"):
+        if importlib.util.find_spec(name) is not None:
+            return name
+    return None
+
+
+PARQUET_MISSING = "Xuất Parquet cần pyarrow hoặc fastparquet (pip install pyarrow), hoặc dùng --columnar csv"
+
+
+def _write_columnar(df, path, fmt, partition_by=None):
+    """Ghi 1 bảng ra path.csv / path.parquet, hoặc thư mục path/cot=gia_tri/... khi chia partition"""
+    if fmt == "parquet":
+        target = path if partition_by else path + ".parquet"
+        df.to_parquet(target, index=False, partition_cols=list(partition_by) if partition_by else None)
+        return target
+    
+    if not partition_by:
+        df.to_csv(path + ".csv", index=False)
+        return path + ".csv"
+    
+    for keys, part in df.groupby(list(partition_by), sort=False):
+        folder = os.path.join(path, *[f"{col}={key}" for col, key in zip(partition_by, keys)])
+        os.makedirs(folder, exist_ok=True)
+        part.drop(columns=list(partition_by)).to_csv(os.path.join(folder, "part-0.csv"), index=False)
+    return path
+
+
+def export_columnar(schedule, employees, dept_to_rooms, shifts, days, out_dir="du_lieu_lich_truc",
+                    fmt="csv", partition_by=None, start_date=None,
+                    hard_violations=None, soft_violations=None):
+    """Xuất lịch trực dạng bảng cột (CSV hoặc Parquet) cho payroll/BI
+    
+    Ghi vào out_dir:
+    - assignments: assignment_table + month (+ date)
+    - employee_hours: tổng giờ và số ca theo (nhân viên, tháng); dept là khoa của nhân viên
+    - violations: violations_table, khi truyền kết quả check_constraints_detailed
+    partition_by: tập con của ("dept", "month") cho assignments và employee_hours (kiểu Hive
+    cot=gia_tri/); violations không chia. Parquet cần pyarrow hoặc fastparquet.
+    Trả về danh sách đường dẫn đã ghi.
+    """
+    import pandas as pd
+    
+    if fmt == "parquet" and parquet_engine() is None:
+        raise ImportError(PARQUET_MISSING)
+    
+    os.makedirs(out_dir, exist_ok=True)
+    partition_by = tuple(partition_by) if partition_by else None
+    
+    table = _add_month(assignment_table(schedule, employees, dept_to_rooms, shifts, days), start_date)
+    
+    staff = pd.DataFrame({
+        'employee_id': [e.id for e in employees],
+        'name': [e.name for e in employees],
+        'role': [e.role for e in employees],
+        'dept': [e.department for e in employees],
+    })
+    hours = (table.groupby(['employee_id', 'month'], sort=False)['hours']
+             .agg(hours='sum', shifts='count').reset_index())
+    hours = staff.merge(hours, on='employee_id')
+    
+    written = [
+        _write_columnar(table, os.path.join(out_dir, "assignments"), fmt, partition_by),
+        _write_columnar(hours, os.path.join(out_dir, "employee_hours"), fmt, partition_by),
+    ]
+    if hard_violations is not None or soft_violations is not None:
+        violations = violations_table(hard_violations or {}, soft_violations or {})
+        written.append(_write_columnar(violations, os.path.join(out_dir, "violations"), fmt))
+    
+    print(f"\nĐã xuất dữ liệu dạng cột ({fmt}) ra thư mục: {out_dir}")
+    return written
+
+
+# =====================================================
+# XUẤT FILE CHẠY NỀN
+# =====================================================
+class ExportCancelled(Exception):
+    """Công việc xuất file bị hủy giữa chừng"""
+
+
+EXPORTERS = {
+    'schedule': export_schedule_to_excel,
+    'calendar': export_calendar_to_excel_fast,
+    'hours': export_employee_hours_to_excel_fast,
+}
+
+
+def export_worker(conn, cancel_event, kind, filename, schedule_dict, employees, dept_to_rooms,
+                  shifts, days, options=None):
+    """Chạy 1 hàm trong EXPORTERS ở tiến trình con (hoặc thread), gửi tiến độ qua Pipe
+    
+    Thông điệp gửi đi:
+    - ('sheet', đã ghi, tổng số sheet)
+    - ('done', filename) / ('cancelled',) / ('error', mô tả lỗi)
+    cancel_event được kiểm tra sau mỗi sheet; khi hủy, workbook không được lưu.
+    """
+    def on_sheet(written, total):
+        conn.send(('sheet', written, total))
+        if cancel_event.is_set():
+            raise ExportCancelled()
+    
+    try:
+        if cancel_event.is_set():
+            raise ExportCancelled()
+        EXPORTERS[kind](schedule_from_dict(schedule_dict), employees, dept_to_rooms, shifts, days,
+                        filename, on_sheet=on_sheet, **(options or {}))
+        conn.send(('done', filename))
+    except ExportCancelled:
+        conn.send(('cancelled',))
+    except Exception as e:
+        conn.send(('error', f"{type(e).__name__}: {e}"))
+    finally:
+        conn.close()
+
+
 def print_calendar_console(schedule, employees, dept_to_rooms, shifts, days, dept_name):
     """In lịch trực của 1 khoa ra console"""
     emp_dict = {e.id: e for e in employees}
@@ -1024,86 +3182,330 @@ def print_calendar_console(schedule, employees, dept_to_rooms, shifts, days, dep
     print("=" * 100)
 
 
-def main():
-    employees, dept_to_rooms, shifts, days = generate_sample_data()
-    
-    population = [create_individual(employees, dept_to_rooms, shifts, days)
-                  for _ in range(POPULATION_SIZE)]
+# =====================================================
+# DÒNG LỆNH: run / evaluate / export
+# =====================================================
+# pandas, openpyxl và matplotlib chỉ được import khi có xuất file hoặc vẽ đồ thị,
+# nên lần chạy chỉ tối ưu (cron hằng đêm, tiến trình con) khởi động nhanh
+DEFAULT_SCHEDULE_FILE = "lich_truc_benh_vien.json"
+
+
+def _print_import_errors(source, errors, limit=20):
+    if not errors:
+        return
+    print(f"⚠️ {source}: {len(errors)} dòng lỗi đã bị bỏ qua")
+    for row, message in errors[:limit]:
+        print(f"   Dòng {row}: {message}")
+    if len(errors) > limit:
+        print(f"   ... và {len(errors) - limit} lỗi khác")
+
+
+def load_problem(roster=None, leave=None, start_date=None):
+    """Dữ liệu bài toán cho dòng lệnh: nhân viên (và ngày nghỉ) nhập từ file, hoặc dữ liệu mẫu
+    
+    Trả về (employees, dept_to_rooms, shifts, days) như generate_sample_data.
+    """
+    if roster:
+        dept_to_rooms, shifts, days = base_structure()
+        employees, errors = import_roster(roster, dept_to_rooms)
+        _print_import_errors(roster, errors)
+        if not employees:
+            raise SystemExit(f"❌ Không có nhân viên hợp lệ trong {roster}")
+        print_instance_summary(employees, dept_to_rooms)
+    else:
+        employees, dept_to_rooms, shifts, days = generate_sample_data()
     
-    best_fit = float("inf")
-    stagnation = 0
-    history = []
+    if leave:
+        count, errors = import_leave(leave, employees, days, start_date=start_date)
+        _print_import_errors(leave, errors)
+        print(f"Đã nhập {count} ngày nghỉ từ {leave}")
     
-    for gen in range(GENERATIONS): #scocred = fitness, individual -> tuple 
-        scored = [(fitness(ind, employees, dept_to_rooms, shifts, days), ind)
-                  for ind in population]
-        scored.sort(key=lambda x: x[0])
-        
-        best = scored[0][1]
-        fit, hard, soft, fairness = fitness(best, employees, dept_to_rooms, shifts, days, log=True)
-        
-        print(f"Gen {gen:3d} | Best={fit:.0f} | HARD={hard} | SOFT={soft}")
-        history.append(fit)
-        
-        if fit < best_fit:
-            best_fit = fit
-            stagnation = 0
-        else:
-            stagnation += 1
-        
-        if stagnation >= STAGNATION_LIMIT:
+    return employees, dept_to_rooms, shifts, days
+
+
+def load_schedule_file(filename, employees, dept_to_rooms, shifts):
+    """Đọc lịch từ .json (save_schedule_json) hoặc .xlsx (export_calendar_to_excel), trả về (schedule, days)"""
+    if filename.lower().endswith(('.xlsx', '.xls')):
+        return load_schedule_from_excel(filename, employees, dept_to_rooms, shifts)
+    return load_schedule_json(filename)
+
+
+def plot_convergence(history, filename="ga_convergence.png"):
+    """Lưu đồ thị hội tụ ra PNG, không mở cửa sổ (dùng Figure trực tiếp, không qua pyplot)"""
+    from matplotlib.figure import Figure
+    
+    fig = Figure(figsize=(10, 6))
+    ax = fig.add_subplot(111)
+    ax.plot(history)
+    ax.set_xlabel("Generation")
+    ax.set_ylabel("Best Fitness")
+    ax.set_title("GA Convergence - Soft Constraints Enhanced")
+    ax.grid()
+    fig.tight_layout()
+    fig.savefig(filename, dpi=150)
+    return filename
+
+
+def export_outputs(schedule, employees, dept_to_rooms, shifts, days, hard_violations, soft_violations,
+                   soft_metrics, out_dir=".", excel=False, columnar=None, partition_by=None,
+                   start_date=None):
+    """Ghi các file xuất được yêu cầu vào out_dir, trả về danh sách đường dẫn
+    
+    excel: lịch theo phòng, giờ làm nhân viên và báo cáo vi phạm (3 file .xlsx)
+    columnar: "csv" / "parquet" cho export_columnar, None = không xuất
+    """
+    if columnar == "parquet" and parquet_engine() is None:
+        raise ImportError(PARQUET_MISSING)      # Báo trước khi ghi Excel
+    
+    files = []
+    os.makedirs(out_dir, exist_ok=True)
+    if excel:
+        files.append(os.path.join(out_dir, "lich_truc_benh_vien.xlsx"))
+        export_calendar_to_excel_fast(schedule, employees, dept_to_rooms, shifts, days, files[-1])
+        files.append(os.path.join(out_dir, "gio_lam_nhan_vien.xlsx"))
+        export_employee_hours_to_excel_fast(schedule, employees, dept_to_rooms, shifts, days, files[-1])
+        files.append(os.path.join(out_dir, "bao_cao_vi_pham.xlsx"))
+        export_violations_to_excel(hard_violations, soft_violations, soft_metrics, files[-1])
+    if columnar:
+        files.append(os.path.join(out_dir, COLUMNAR_DIR))
+        export_columnar(schedule, employees, dept_to_rooms, shifts, days, files[-1],
+                        fmt=columnar, partition_by=partition_by, start_date=start_date,
+                        hard_violations=hard_violations, soft_violations=soft_violations)
+    return files
+
+
+def cmd_run(args):
+    """Chạy GA, lưu lịch tốt nhất ra JSON; Excel / bảng cột / đồ thị chỉ khi được yêu cầu"""
+    employees, dept_to_rooms, shifts, days = load_problem(args.roster, args.leave, args.start_date)
+    
+    config = {}
+    if args.generations is not None:
+        config['GENERATIONS'] = args.generations
+    if args.population is not None:
+        config['POPULATION_SIZE'] = args.population
+    if args.time_limit is not None:
+        config['TIME_LIMIT_SECONDS'] = args.time_limit
+    
+    feasibility = analyze_feasibility(employees, dept_to_rooms, shifts, days)
+    print_feasibility_report(feasibility)
+    policy = TerminationPolicy.from_config(config)
+    policy.hard_floor = feasibility['hard_lower_bound']
+    
+    # GAProfiler tạo trước khi dựng quần thể để tính cả thời gian và số lần sửa lúc khởi tạo
+    profiler = GAProfiler() if args.phase_timing else None
+    run_start = time.time()
+    pop_size = int(_ga_param(config, 'POPULATION_SIZE'))
+    population, carry_in = [], None
+    warm_start = args.warm_start or WARM_START_FILE
+    if warm_start:
+        print(f"Khởi tạo quần thể từ lịch kỳ trước: {warm_start}")
+        t0 = time.perf_counter()
+        population, carry_in = warm_start_population(warm_start, employees, dept_to_rooms,
+                                                     shifts, days, pop_size)
+        if profiler:
+            profiler.stop('initialization', t0)
+    
+    run_profiler = (RunProfiler(out_dir=args.out_dir, snapshot_generations=args.snapshot_gens)
+                    if args.profile else None)
+    
+    def report(record):
+        print(f"Gen {record['gen']:3d} | Best={record['fit']:.0f} | "
+              f"HARD={record['hard']} | SOFT={record['soft']}")
+        if record['hill_climb']:
             print("  ↳ Hill Climbing triggered")
-            best = hill_climb(best, employees, dept_to_rooms, shifts, days, HILL_CLIMB_STEPS)
-            stagnation = 0
-        
-        new_pop = [copy.deepcopy(scored[i][1]) for i in range(ELITE_SIZE)]
-        
-        while len(new_pop) < POPULATION_SIZE:
-            p1 = tournament_selection(scored)
-            p2 = tournament_selection(scored)
-            child = crossover_uniform(p1, p2, employees, dept_to_rooms)
-            child = mutate_scramble(child, employees, dept_to_rooms, shifts, days, MUTATION_RATE)
-            child = mutate_balance_hours(child, employees, dept_to_rooms, shifts, days, 0.3)
-            new_pop.append(child)
-        
-        population = new_pop
-    
-    # Vẽ đồ thị convergence
-    plt.figure(figsize=(10, 6))
-    plt.plot(history)
-    plt.xlabel("Generation")
-    plt.ylabel("Best Fitness")
-    plt.title("GA Convergence - Soft Constraints Enhanced")
-    plt.grid()
-    plt.tight_layout()
-    plt.savefig("ga_convergence.png", dpi=150)
-    plt.show()
-    
-    # Lấy solution tốt nhất
-    best_schedule = scored[0][1]
+        if run_profiler:
+            run_profiler.on_generation(record)
+    
+    if run_profiler:
+        run_profiler.start()
+    try:
+        best_schedule, best_fit, history, reason = run_ga(
+            employees, dept_to_rooms, shifts, days, config=config,
+            population=population, carry_in=carry_in, policy=policy, on_generation=report,
+            profiler=profiler
+        )
+    finally:
+        if run_profiler:
+            print("\nĐã ghi profile:\n   " + "\n   ".join(run_profiler.stop()))
+    ga_elapsed = time.time() - run_start
+    if best_schedule is None:
+        raise SystemExit(f"❌ GA dừng trước khi đánh giá xong thế hệ đầu tiên ({STOP_REASONS[reason]}), "
+                         f"không có lịch để lưu")
+    print(f"\nDừng sau {len(history)} thế hệ: {STOP_REASONS[reason]} (fitness tốt nhất = {best_fit:,.0f})")
     
     # Kiểm tra ràng buộc chi tiết
     hard_violations, soft_violations, soft_metrics, soft_stats = check_constraints_detailed(
-        best_schedule, employees, dept_to_rooms, shifts, days
+        best_schedule, employees, dept_to_rooms, shifts, days, carry_in
     )
-    
-    # In báo cáo
     print_constraint_report(hard_violations, soft_violations, soft_metrics, soft_stats)
     
-    # Export các file
-    export_calendar_to_excel(best_schedule, employees, dept_to_rooms, shifts, days, "lich_truc_benh_vien.xlsx")
-    export_employee_hours_to_excel(best_schedule, employees, dept_to_rooms, shifts, days, "gio_lam_nhan_vien.xlsx")
-    export_violations_to_excel(hard_violations, soft_violations, soft_metrics, "bao_cao_vi_pham.xlsx")
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    save_schedule_json(best_schedule, shifts, days, args.output)
+    files = export_outputs(best_schedule, employees, dept_to_rooms, shifts, days,
+                           hard_violations, soft_violations, soft_metrics, args.out_dir,
+                           excel=args.excel, columnar=args.columnar,
+                           partition_by=args.partition_by, start_date=args.start_date)
+    if args.plot:
+        files.append(plot_convergence(history, os.path.join(args.out_dir, "ga_convergence.png")))
+    
+    if args.show_calendar:
+        first_dept = list(dept_to_rooms.keys())[0]
+        print_calendar_console(best_schedule, employees, dept_to_rooms, shifts, days, first_dept)
+    
+    print("\nHoàn tất! Đã tạo:")
+    print(f"   {args.output} (dùng làm lịch khởi tạo cho kỳ sau)")
+    for path in files:
+        print(f"   {path}")
+    
+    if profiler is not None:
+        print("\n" + profiler.report(ga_elapsed))
+
+
+def cmd_evaluate(args):
+    """Chấm điểm 1 lịch đã lưu: fitness, phạt cứng và báo cáo vi phạm"""
+    employees, dept_to_rooms, shifts, days = load_problem(args.roster, args.leave, args.start_date)
+    schedule, _ = load_schedule_file(args.schedule, employees, dept_to_rooms, shifts)
     
-    # In lịch console cho khoa đầu tiên
-    first_dept = list(dept_to_rooms.keys())[0]
-    print_calendar_console(best_schedule, employees, dept_to_rooms, shifts, days, first_dept)
+    fit, hard, soft, fairness = fitness(schedule, employees, dept_to_rooms, shifts, days, log=True)
+    hard_violations, soft_violations, soft_metrics, soft_stats = check_constraints_detailed(
+        schedule, employees, dept_to_rooms, shifts, days
+    )
+    print_constraint_report(hard_violations, soft_violations, soft_metrics, soft_stats)
+    print(f"\nFitness = {fit:,.0f} | Phạt cứng = {hard_penalty(hard):,.0f} | "
+          f"Phạt mềm = {fit - hard_penalty(hard):,.0f} | Độ lệch giờ = {fairness:,.0f}")
+    
+    if args.json:
+        result = {
+            'schedule': args.schedule,
+            'fitness': float(fit),
+            'hard_penalty': float(hard_penalty(hard)),
+            'fairness': float(fairness),
+            'hard': dict(hard),
+            'soft': dict(soft),
+        }
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"Đã lưu kết quả: {args.json}")
     
-    print("\nHoàn tất! Đã tạo 3 file:")
-    print("   lich_truc_benh_vien.xlsx")
-    print("   gio_lam_nhan_vien.xlsx")
-    print("   bao_cao_vi_pham.xlsx")
+    if args.fail_on_hard and hard_penalty(hard) > 0:
+        raise SystemExit(1)
+
+
+def cmd_export(args):
+    """Xuất 1 lịch đã lưu ra Excel và/hoặc bảng cột mà không chạy lại GA"""
+    employees, dept_to_rooms, shifts, days = load_problem(args.roster, args.leave, args.start_date)
+    schedule, _ = load_schedule_file(args.schedule, employees, dept_to_rooms, shifts)
+    
+    hard_violations, soft_violations, soft_metrics, _ = check_constraints_detailed(
+        schedule, employees, dept_to_rooms, shifts, days
+    )
+    files = export_outputs(schedule, employees, dept_to_rooms, shifts, days,
+                           hard_violations, soft_violations, soft_metrics, args.out_dir,
+                           excel=args.excel or not args.columnar, columnar=args.columnar,
+                           partition_by=args.partition_by, start_date=args.start_date)
+    print("\nĐã xuất:")
+    for path in files:
+        print(f"   {path}")
+
+
+COMMANDS = {'run': cmd_run, 'evaluate': cmd_evaluate, 'export': cmd_export}
+
+
+def _int_list(text):
+    return [int(v) for v in text.split(",") if v.strip()]
+
+
+def _str_list(text):
+    return [v.strip() for v in text.split(",") if v.strip()] or None
+
+
+def min_population_size():
+    """Quần thể nhỏ nhất để nhóm cha mẹ (PARENT_POOL_RATIO) đủ TOURNAMENT_K cá thể"""
+    size = math.ceil(TOURNAMENT_K / PARENT_POOL_RATIO)
+    while int(size * PARENT_POOL_RATIO) < TOURNAMENT_K:
+        size += 1
+    return size
+
+
+def _at_least(low, what):
+    """Kiểu số nguyên cho argparse, báo lỗi khi nhỏ hơn low"""
+    import argparse
+    
+    def parse(text):
+        value = int(text)
+        if value < low:
+            raise argparse.ArgumentTypeError(f"{what} phải ≥ {low} (nhận {value})")
+        return value
+    parse.__name__ = "int"
+    return parse
+
+
+def build_parser():
+    import argparse
+    
+    data = argparse.ArgumentParser(add_help=False)
+    data.add_argument("--roster", help="Danh sách nhân viên CSV/Excel (mặc định: dữ liệu mẫu)")
+    data.add_argument("--leave", help="Bảng ngày nghỉ CSV/Excel")
+    data.add_argument("--start-date", default=SCHEDULE_START_DATE,
+                      help="Ngày thực của ngày đầu kỳ (YYYY-MM-DD) cho ngày nghỉ và cột month")
+    
+    outputs = argparse.ArgumentParser(add_help=False)
+    outputs.add_argument("--out-dir", default=".", help="Thư mục ghi file xuất")
+    outputs.add_argument("--excel", action="store_true",
+                         help="Xuất lịch, giờ làm và báo cáo vi phạm ra Excel")
+    outputs.add_argument("--columnar", choices=("csv", "parquet"), default=COLUMNAR_FORMAT,
+                         help="Xuất bảng cột cho payroll/BI")
+    outputs.add_argument("--partition-by", type=_str_list,
+                         default=list(COLUMNAR_PARTITION_BY) if COLUMNAR_PARTITION_BY else None,
+                         help="Cột chia thư mục cho bảng cột, vd dept,month")
+    
+    parser = argparse.ArgumentParser(description="Lập lịch trực bệnh viện bằng GA")
+    sub = parser.add_subparsers(dest="command", required=True)
+    
+    run = sub.add_parser("run", parents=[data, outputs], help="Chạy GA (mặc định)")
+    run.add_argument("--generations", type=_at_least(1, "Số thế hệ"),
+                     help=f"Số thế hệ (mặc định {GENERATIONS})")
+    run.add_argument("--population", type=_at_least(min_population_size(), "Kích thước quần thể"),
+                     help=f"Kích thước quần thể, tối thiểu {min_population_size()} với "
+                          f"TOURNAMENT_K={TOURNAMENT_K} (mặc định {POPULATION_SIZE})")
+    run.add_argument("--time-limit", type=float, help="Giới hạn thời gian chạy (giây)")
+    run.add_argument("--warm-start", help="Lịch kỳ trước (.json/.xlsx) để khởi tạo quần thể")
+    run.add_argument("--output", default=DEFAULT_SCHEDULE_FILE, help="File JSON lưu lịch tốt nhất")
+    run.add_argument("--plot", action="store_true", help="Lưu đồ thị hội tụ ga_convergence.png")
+    run.add_argument("--show-calendar", action="store_true", help="In lịch của khoa đầu tiên ra console")
+    run.add_argument("--profile", action="store_true", default=PROFILE_RUN,
+                     help="Profile lần chạy (cProfile .pstats + stack .collapsed, ghi vào --out-dir)")
+    run.add_argument("--phase-timing", action="store_true", default=PROFILE_GA,
+                     help="In bảng thời gian từng pha GA và số lần đánh giá/sửa (GAProfiler)")
+    run.add_argument("--snapshot-gens", type=_int_list, default=list(PROFILE_SNAPSHOT_GENERATIONS),
+                     help="Thế hệ chụp snapshot tracemalloc, vd 1,50,100")
+    
+    evaluate = sub.add_parser("evaluate", parents=[data], help="Chấm điểm 1 lịch đã lưu")
+    evaluate.add_argument("schedule", help="Lịch .json hoặc .xlsx")
+    evaluate.add_argument("--json", help="Ghi kết quả ra file JSON")
+    evaluate.add_argument("--fail-on-hard", action="store_true",
+                          help="Thoát với mã 1 nếu còn vi phạm cứng")
+    
+    export = sub.add_parser("export", parents=[data, outputs],
+                            help="Xuất 1 lịch đã lưu (mặc định ra Excel)")
+    export.add_argument("schedule", help="Lịch .json hoặc .xlsx")
+    return parser
+
+
+def main(argv=None):
+    """Điểm vào dòng lệnh; không có lệnh con thì chạy 'run' (python schedule-v7.py --profile vẫn dùng được)"""
+    import sys
+    
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or argv[0] not in COMMANDS and argv[0] not in ("-h", "--help"):
+        argv = ["run"] + argv
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    # Kiểm tra trước khi chạy GA / xuất Excel để không mất kết quả vì thiếu thư viện
+    if getattr(args, 'columnar', None) == "parquet" and parquet_engine() is None:
+        parser.error(PARQUET_MISSING)
+    COMMANDS[args.command](args)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()